@@ -0,0 +1,117 @@
+"""
+On-disk cache of pre-rendered speech for frequently spoken phrases.
+
+Entries are WAV files named by a hash of (text, voice, rate, volume), so a
+change to any speech setting simply misses the cache. The cache is bounded
+by total size and evicts the least recently played files first; recency is
+kept in file modification times so it survives restarts.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class AudioCache:
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        """
+        Open (or create) a cache directory
+
+        :param directory: Directory holding the cached WAV files
+        :param max_bytes: Total size above which old entries are evicted
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # file name -> size, least recent first
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+
+        files = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".wav"):
+                files.append((os.path.getmtime(path), name, os.path.getsize(path)))
+            elif name.endswith(".tmp"):
+                # Left over from an interrupted render
+                os.remove(path)
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._size += size
+
+    @staticmethod
+    def key(text, voice, rate, volume):
+        """Return the cache file name for a phrase spoken with given settings"""
+        data = "\0".join([text, str(voice), str(rate), f"{volume:.2f}"])
+        return hashlib.sha1(data.encode("utf-8")).hexdigest() + ".wav"
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self._entries
+
+    def get(self, key):
+        """
+        Look up a rendered phrase and mark it as recently used
+
+        :return: Path of the WAV file, or None on a miss
+        """
+        with self.lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            # Removed behind our back
+            with self.lock:
+                self._size -= self._entries.pop(key, 0)
+            return None
+        return path
+
+    def discard(self, key):
+        """Remove an entry, e.g. one whose file turned out to be unplayable"""
+        with self.lock:
+            self._size -= self._entries.pop(key, 0)
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def temp_path(self, key):
+        """Path to render into before calling store"""
+        return self.path(key) + ".tmp"
+
+    def store(self, key):
+        """Move a finished render from temp_path(key) into the cache"""
+        temp = self.temp_path(key)
+        try:
+            size = os.path.getsize(temp)
+            if size == 0:
+                os.remove(temp)
+                return
+            os.replace(temp, self.path(key))
+        except OSError as e:
+            print(f"Error storing rendered speech: {e}")
+            return
+
+        with self.lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = []
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                name, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                evicted.append(name)
+        for name in evicted:
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                pass
@@ -0,0 +1,252 @@
+"""
+Benchmark suite for the per-frame hot path and word prediction.
+
+Reports throughput and p50/p95/p99 latency for each stage of
+Camera.get_frame and BlinkDetector.process_frame, and for WordPredictor
+queries against vocabularies of increasing size. Runs headless and writes
+machine-readable JSON so results can be compared across releases.
+
+Examples:
+    python benchmark.py --out bench.json
+    python benchmark.py --video session.mp4 --frames 600
+    python benchmark.py --skip-frames --vocab 100,10000,100000
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import string
+import sys
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import cv2
+import numpy as np
+from PyQt5.QtGui import QGuiApplication, QImage, QPixmap
+from blink_detector import BlinkDetector, eye_aspect_ratio, eye_landmarks
+from telemetry import summarize
+from word_prediction import WordPredictor
+
+# QPixmap needs a QGuiApplication alive for the whole run
+_APP = None
+
+FRAME_STAGES = ["flip", "bgr_to_rgb", "face_detection", "face_mesh", "landmark_extraction",
+                "ear", "debug_drawing", "qimage_qpixmap"]
+
+
+def synthetic_frames(count, width, height, seed=0):
+    """Yield noise frames with a bright ellipse standing in for a face"""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    cv2.ellipse(base, (width // 2, height // 2), (width // 6, height // 4), 0, 0, 360,
+                (180, 200, 230), -1)
+    for _ in range(count):
+        yield base.copy()
+
+
+def video_frames(path, count):
+    """Yield up to count frames from a recording, looping if it is shorter"""
+    capture = cv2.VideoCapture(path)
+    produced = 0
+    try:
+        while produced < count:
+            ret, frame = capture.read()
+            if not ret:
+                if produced == 0:
+                    raise ValueError(f"Could not read frames from {path}")
+                capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+            produced += 1
+            yield frame
+    finally:
+        capture.release()
+
+
+def synthetic_landmarks(seed=0):
+    """Build a stand-in for a FaceMesh result with 468 normalized landmarks"""
+    rng = random.Random(seed)
+    points = [SimpleNamespace(x=rng.uniform(0.3, 0.7), y=rng.uniform(0.3, 0.7)) for _ in range(468)]
+    return SimpleNamespace(landmark=points)
+
+
+def timed(samples, stage, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    samples[stage].append(time.perf_counter() - start)
+    return result
+
+
+def benchmark_frames(frames, inference_size=320):
+    """
+    Time each stage of the capture -> detect -> display path
+
+    Stages run in the same order as Camera.read_frame and
+    BlinkDetector.process_frame. copy_path_baseline times the conversions
+    of the previous, copying frame path for comparison. When no face is
+    found in a frame, landmark extraction, EAR and drawing run on synthetic
+    landmarks so they are still measured. End-to-end process_frame is timed
+    separately for the "mesh" and "full" detection modes, and for mesh mode
+    with ROI tracking, a downscaled inference image, and both. ROI tracking
+    only saves time on frames with a face, so it needs recorded footage to
+    show.
+
+    :param inference_size: Longer side of the downscaled inference image
+    """
+    variants = {
+        "process_frame_full": {"detection_mode": "full"},
+        "process_frame_mesh": {"detection_mode": "mesh"},
+        "process_frame_roi": {"detection_mode": "mesh", "roi_mode": True},
+        "process_frame_downscaled": {"detection_mode": "mesh", "inference_size": inference_size},
+        "process_frame_roi_downscaled": {"detection_mode": "mesh", "roi_mode": True,
+                                         "inference_size": inference_size},
+    }
+    detectors = {}
+    for stage, options in variants.items():
+        detectors[stage] = BlinkDetector(lambda event: None, **options)
+        detectors[stage].verbose = False
+        detectors[stage].load_models()
+    detector = detectors["process_frame_full"]
+    fallback = synthetic_landmarks()
+
+    samples = {stage: [] for stage in FRAME_STAGES}
+    samples["copy_path_baseline"] = []
+    for stage in variants:
+        samples[stage] = []
+    faces_found = 0
+
+    rgb = None
+    for frame in frames:
+        h, w = frame.shape[:2]
+        # Same buffer handling as Camera.read_frame: flip in place, convert
+        # once into a reused RGB buffer that is also drawn on and displayed
+        if rgb is None or rgb.shape != frame.shape:
+            rgb = np.empty_like(frame)
+        timed(samples, "flip", cv2.flip, frame, 1, frame)
+        timed(samples, "bgr_to_rgb", cv2.cvtColor, frame, cv2.COLOR_BGR2RGB, rgb)
+        timed(samples, "face_detection", detector.face_detector.process, rgb)
+        mesh_results = timed(samples, "face_mesh", detector.face_mesh.process, rgb)
+
+        face = fallback
+        if mesh_results.multi_face_landmarks:
+            face = mesh_results.multi_face_landmarks[0]
+            faces_found += 1
+        eyes = timed(samples, "landmark_extraction", eye_landmarks, face, (w, h))
+        timed(samples, "ear", eye_aspect_ratio, eyes)
+
+        def draw():
+            x0, y0, x1, y1 = detector.face_box(face, (w, h))
+            cv2.rectangle(rgb, (x0, y0), (x1, y1), (0, 255, 0), 2)
+            for (x, y) in eyes.reshape(-1, 2).astype(int):
+                cv2.circle(rgb, (int(x), int(y)), 2, (0, 0, 255), -1)
+        timed(samples, "debug_drawing", draw)
+
+        def to_pixmap():
+            image = QImage(rgb.data, w, h, 3 * w, QImage.Format_RGB888)
+            return QPixmap.fromImage(image)
+        timed(samples, "qimage_qpixmap", to_pixmap)
+
+        # The earlier path: flip copy, inference copy, display copy, QImage copy
+        def copy_path():
+            flipped = cv2.flip(frame, 1)
+            cv2.cvtColor(flipped, cv2.COLOR_BGR2RGB)
+            display = cv2.cvtColor(flipped, cv2.COLOR_BGR2RGB)
+            return QImage(display.data, w, h, 3 * w, QImage.Format_RGB888).copy()
+        timed(samples, "copy_path_baseline", copy_path)
+
+        for stage, variant in detectors.items():
+            timed(samples, stage, variant.process_frame, frame.copy())
+
+    return {stage: summarize(values) for stage, values in samples.items()}, faces_found
+
+
+def synthetic_vocabulary(size, seed=0):
+    """Generate size distinct lowercase words with Zipf-like frequencies"""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        length = rng.randint(2, 10)
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(length)))
+    ranked = sorted(words)
+    rng.shuffle(ranked)
+    return {word: max(1, int(100000 / rank)) for rank, word in enumerate(ranked, 1)}
+
+
+def benchmark_word_predictor(sizes, queries, seed=0):
+    """Time WordPredictor queries against synthetic vocabularies"""
+    rng = random.Random(seed)
+    results = {}
+    for size in sizes:
+        vocabulary = synthetic_vocabulary(size, seed)
+        predictor = WordPredictor()
+        for word, frequency in vocabulary.items():
+            predictor.set_word_frequency(word, frequency)
+
+        words = list(vocabulary)
+        prefixes = [rng.choice(words)[:rng.randint(1, 3)] for _ in range(queries)]
+        samples = {"get_word_completions": [], "get_suggestions": [], "get_suggestions_memoized": []}
+        for prefix in prefixes:
+            # Cold queries measure the indexes; the repeat hits the memo tables
+            predictor.clear_memos()
+            timed(samples, "get_word_completions", predictor.get_word_completions, prefix)
+            timed(samples, "get_suggestions", predictor.get_suggestions, "i need " + prefix)
+            timed(samples, "get_suggestions_memoized", predictor.get_suggestions, "i need " + prefix)
+        results[str(size)] = {name: summarize(values) for name, values in samples.items()}
+        results[str(size)]["cache_stats"] = predictor.cache_stats()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the EyeSpeak hot paths")
+    parser.add_argument("--frames", type=int, default=300, help="Number of frames to time")
+    parser.add_argument("--resolution", default="640x480", help="Synthetic frame size, WIDTHxHEIGHT")
+    parser.add_argument("--video", help="Use frames from this recording instead of synthetic frames")
+    parser.add_argument("--vocab", default="100,10000,100000",
+                        help="Comma-separated vocabulary sizes for WordPredictor")
+    parser.add_argument("--inference-size", type=int, default=320,
+                        help="Longer side of the inference image for the downscaled variants")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries per vocabulary size")
+    parser.add_argument("--skip-frames", action="store_true", help="Skip the frame pipeline benchmark")
+    parser.add_argument("--skip-words", action="store_true", help="Skip the WordPredictor benchmark")
+    parser.add_argument("--out", help="Write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+        }
+    }
+
+    if not args.skip_frames:
+        global _APP
+        _APP = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+        if args.video:
+            frames = video_frames(args.video, args.frames)
+            source = args.video
+        else:
+            width, height = (int(v) for v in args.resolution.lower().split("x"))
+            frames = synthetic_frames(args.frames, width, height)
+            source = f"synthetic {width}x{height}"
+        stages, faces_found = benchmark_frames(frames, args.inference_size)
+        report["frame_pipeline"] = {"source": source, "faces_found": faces_found, "stages": stages}
+
+    if not args.skip_words:
+        sizes = [int(v) for v in args.vocab.split(",") if v]
+        report["word_predictor"] = benchmark_word_predictor(sizes, args.queries)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,212 @@
+import time
+from collections import deque
 import cv2
 import mediapipe as mp
 import numpy as np
-from scipy.spatial import distance as dist
+from telemetry import Telemetry
+
+# Face mesh landmarks for the left and right eye, in EAR order:
+# outer corner, top-left, top-right, inner corner, bottom-right, bottom-left
+EYE_INDICES = np.array([[33, 160, 158, 133, 153, 144],
+                        [362, 385, 387, 263, 373, 380]])
+
+# Face mesh landmarks on the face oval, used to derive the face box
+FACE_OVAL_INDICES = [10, 338, 297, 332, 284, 251, 389, 356, 454, 323, 361, 288,
+                     397, 365, 379, 378, 400, 377, 152, 148, 176, 149, 150, 136,
+                     172, 58, 132, 93, 234, 127, 162, 21, 54, 103, 67, 109]
+
+def eye_aspect_ratio(eyes):
+    """
+    Calculate the Eye Aspect Ratio (EAR) for one or more eyes at once
+
+    :param eyes: Array of shape (..., 6, 2) holding eye landmarks in EAR order,
+        e.g. (6, 2) for one eye, (2, 6, 2) for both eyes of a frame or
+        (N, 2, 6, 2) for a batch of frames
+    :return: EAR array of shape (...)
+    """
+    eyes = np.asarray(eyes, dtype=np.float64)
+
+    # Vertical distances (top-left to bottom-left, top-right to bottom-right)
+    vertical = np.linalg.norm(eyes[..., [1, 2], :] - eyes[..., [5, 4], :], axis=-1)
+
+    # Horizontal distance (left to right corner)
+    horizontal = np.linalg.norm(eyes[..., 3, :] - eyes[..., 0, :], axis=-1)
+
+    return vertical.sum(axis=-1) / (2.0 * horizontal)
+
+def eye_landmarks(face_landmarks, scale, offset=(0, 0)):
+    """
+    Extract both eyes' landmarks in pixel coordinates
+
+    :param scale: (width, height) of the image the landmarks are normalized to
+    :param offset: (x, y) of that image within the full frame
+    :return: Array of shape (2, 6, 2), left eye first
+    """
+    landmark = face_landmarks.landmark
+    points = np.array([(landmark[i].x, landmark[i].y) for i in EYE_INDICES.flat])
+    return points.reshape(EYE_INDICES.shape + (2,)) * scale + offset
+
+class BlinkEvent:
+    """
+    A detected blink, as passed to the BlinkDetector callback
+
+    Times are time.perf_counter() values of the frames involved, so
+    consumers can tell how stale an event is and what was on screen when
+    the eye closed.
+    """
+
+    def __init__(self, captured_at, frame_index, closed_at, closed_frame, ear_trace, total_blinks):
+        """
+        :param captured_at: Capture time of the frame the blink was reported on
+        :param frame_index: Index of that frame
+        :param closed_at: Capture time of the first frame with the eye closed
+        :param closed_frame: Index of that frame
+        :param ear_trace: Recent average EARs, oldest first, ending with this frame
+        :param total_blinks: Blink count including this one
+        """
+        self.captured_at = captured_at
+        self.frame_index = frame_index
+        self.closed_at = closed_at
+        self.closed_frame = closed_frame
+        self.ear_trace = ear_trace
+        self.total_blinks = total_blinks
+
+    @property
+    def ear(self):
+        return self.ear_trace[-1]
+
+    @property
+    def duration(self):
+        """Seconds the eye had been closed when the blink was reported"""
+        return self.captured_at - self.closed_at
+
+    @property
+    def duration_frames(self):
+        return self.frame_index - self.closed_frame + 1
+
+    def age(self, now=None):
+        """Seconds since the eye closed"""
+        return (time.perf_counter() if now is None else now) - self.closed_at
+
+    def to_dict(self):
+        return {
+            "frame": self.frame_index,
+            "time": round(self.captured_at, 4),
+            "closed_frame": self.closed_frame,
+            "closed_at": round(self.closed_at, 4),
+            "duration_ms": round(self.duration * 1000, 1),
+            "ear": self.ear,
+            "ear_trace": [round(ear, 4) for ear in self.ear_trace],
+            "total_blinks": self.total_blinks,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an event from to_dict() output, e.g. received from the detection service"""
+        return cls(data["time"], data["frame"], data["closed_at"], data["closed_frame"],
+                   data["ear_trace"], data["total_blinks"])
+
+    def __repr__(self):
+        return (f"BlinkEvent(frame={self.frame_index}, duration={self.duration * 1000:.0f}ms, "
+                f"ear={self.ear:.3f})")
 
 class BlinkDetector:
-    def __init__(self, callback):
+    def __init__(self, callback, detection_mode="mesh", reacquire_with_detector=False,
+                 roi_mode=False, roi_padding=0.25, inference_size=None, telemetry=None,
+                 scheduler=None):
+        """
+        Initialize the blink detector
+
+        :param callback: Called with a BlinkEvent once per detected blink
+        :param detection_mode: "mesh" runs only FaceMesh and derives the face box
+            from its landmarks; "full" also runs FaceDetection on every frame
+        :param reacquire_with_detector: In "mesh" mode, run FaceDetection on frames
+            where the mesh has lost the face, to keep drawing a face box
+        :param roi_mode: Run FaceMesh on a crop around the previous frame's face
+            instead of the full frame
+        :param roi_padding: Padding added around the face box, as a fraction of
+            its width and height
+        :param inference_size: If set, downscale the inference image so its
+            longer side is at most this many pixels
+        :param telemetry: Telemetry instance receiving per-stage timings
+        :param scheduler: InferenceScheduler deciding which frames run
+            inference; every frame does if None
+        """
+        if detection_mode not in ("mesh", "full"):
+            raise ValueError(f"Unknown detection mode: {detection_mode}")
+
         self.callback = callback
+        self.telemetry = telemetry or Telemetry()
+        self.detection_mode = detection_mode
+        self.reacquire_with_detector = reacquire_with_detector
+        self.roi_mode = roi_mode
+        self.roi_padding = roi_padding
+        self.inference_size = inference_size
+        self.roi = None  # (x0, y0, x1, y1) crop used for the next frame
+        self.scheduler = scheduler
         self.mp_face_mesh = mp.solutions.face_mesh
         self.mp_face_detection = mp.solutions.face_detection
         
-        # Initialize face mesh and face detection
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            min_detection_confidence=0.5, 
-            min_tracking_confidence=0.5
-        )
-        self.face_detector = self.mp_face_detection.FaceDetection(
-            min_detection_confidence=0.5
-        )
+        # MediaPipe graphs are built on first use, so the blink logic can be
+        # driven through update() without loading any models
+        self.face_mesh = None
+        self.face_detector = None
         
-        # More sophisticated blink detection parameters
-        self.EAR_THRESHOLD = 0.2  # Lowered threshold for more sensitivity
-        self.CONSEC_FRAMES_THRESHOLD = 1  # Minimum frames to consider a blink
-        self.MAX_BLINK_FRAMES = 3  # Maximum frames for a blink to prevent false positives
+        # Blink detection parameters. The EAR is median filtered, the eye
+        # counts as closed below CLOSE_THRESHOLD until it rises above
+        # OPEN_THRESHOLD, and durations are in milliseconds so behaviour
+        # doesn't depend on the frame rate
+        self.FILTER_WINDOW = 3  # frames in the median filter; 1 disables it
+        self.CLOSE_THRESHOLD = 0.2
+        self.OPEN_THRESHOLD = 0.23
+        self.MIN_BLINK_MS = 0  # closure needed before a blink is reported
+        self.MAX_BLINK_MS = 150  # closures first qualifying later than this are not reported
         
         # Tracking variables
-        self.blink_counter = 0
+        self.eye_closed = False
+        self.blink_counter = 0  # frames the eye has been closed
         self.total_blinks = 0
         self.current_blink_state = False
+        self.last_ear = None
+        self.last_eyes = None  # (2, 6, 2) eye landmarks of the last processed frame
+        self.overlay_boxes = []  # face boxes drawn on the last processed frame
+        self.verbose = True
+        
+        # Timing of the current eye closure, reported in BlinkEvents
+        self.frame_index = -1
+        self.closed_at = None
+        self.closed_frame = None
+        self.ear_history = deque(maxlen=16)
+        self.filter_window = deque(maxlen=self.FILTER_WINDOW)  # (ear, timestamp, frame_index)
+        self.filtered_ear = None
+
+        # EarCalibration collecting samples; blinks are not reported meanwhile
+        self.calibration = None
+
+    def load_models(self):
+        """Build the MediaPipe graphs if they haven't been built yet"""
+        if self.face_mesh is None:
+            self.face_mesh = self.mp_face_mesh.FaceMesh(
+                min_detection_confidence=0.5, 
+                min_tracking_confidence=0.5
+            )
+        # Face detection is only built when it can be used
+        if self.face_detector is None and (self.detection_mode == "full" or self.reacquire_with_detector):
+            self.face_detector = self.mp_face_detection.FaceDetection(
+                min_detection_confidence=0.5
+            )
 
     def eye_aspect_ratio(self, eye):
         """
         Calculate the Eye Aspect Ratio (EAR) with improved vertical landmark measurement
         """
-        # Vertical eye landmarks (both top and bottom points)
-        A = dist.euclidean(eye[1], eye[5])  # Top-left to bottom-left
-        B = dist.euclidean(eye[2], eye[4])  # Top-right to bottom-right
-        
-        # Horizontal eye landmark (width)
-        C = dist.euclidean(eye[0], eye[3])  # Left to right corner
-        
-        # Calculate EAR
-        ear = (A + B) / (2.0 * C)
-        return ear
+        return float(eye_aspect_ratio(eye))
 
-    def process_frame(self, frame):
-        # Convert frame to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Detect faces
+    def draw_detections(self, frame, rgb_frame):
+        """
+        Run FaceDetection and draw a rectangle around each detected face
+        """
         face_results = self.face_detector.process(rgb_frame)
-        
-        # Detect face mesh landmarks
-        mesh_results = self.face_mesh.process(rgb_frame)
-        
-        # Draw face rectangle if face is detected
         if face_results.detections:
             for detection in face_results.detections:
                 # Get bounding box
@@ -69,48 +222,259 @@ class BlinkDetector:
                 # Draw rectangle around face
                 cv2.rectangle(frame, (x, y), (x + width, y + height), 
                               (0, 255, 0), 2)  # Green rectangle
+                self.overlay_boxes.append((x, y, x + width, y + height))
+
+    def draw_overlay(self, frame, is_rgb=False):
+        """
+        Redraw the face boxes and eye landmarks of the last processed frame,
+        for frames the scheduler skipped
+        """
+        for x0, y0, x1, y1 in self.overlay_boxes:
+            cv2.rectangle(frame, (x0, y0), (x1, y1), (0, 255, 0), 2)
+        if self.last_eyes is not None:
+            left_eye, right_eye = self.last_eyes.astype(int)
+            for (x, y) in left_eye:
+                cv2.circle(frame, (int(x), int(y)), 2, (0, 0, 255) if is_rgb else (255, 0, 0), -1)
+            for (x, y) in right_eye:
+                cv2.circle(frame, (int(x), int(y)), 2, (0, 255, 0), -1)
+
+    def face_box(self, face_landmarks, scale, offset=(0, 0)):
+        """
+        Derive a face bounding box from the face oval landmark extents
+
+        :param scale: (width, height) of the image the landmarks are normalized to
+        :param offset: (x, y) of that image within the full frame
+        :return: (x0, y0, x1, y1) in pixel coordinates
+        """
+        landmark = face_landmarks.landmark
+        xs = [landmark[i].x for i in FACE_OVAL_INDICES]
+        ys = [landmark[i].y for i in FACE_OVAL_INDICES]
+        return (int(min(xs) * scale[0] + offset[0]), int(min(ys) * scale[1] + offset[1]),
+                int(max(xs) * scale[0] + offset[0]), int(max(ys) * scale[1] + offset[1]))
+
+    def inference_input(self, rgb_frame):
+        """
+        Select the image FaceMesh runs on: the tracked ROI if there is one,
+        otherwise the full frame, downscaled to inference_size if configured
+
+        :return: (image, scale, offset) where scale and offset map the mesh's
+            normalized landmarks back to full-frame pixel coordinates
+        """
+        x0, y0 = 0, 0
+        image = rgb_frame
+        if self.roi_mode and self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            image = rgb_frame[y0:y1, x0:x1]
+
+        # Normalized landmarks are relative to the crop, so downscaling the
+        # inference image doesn't change the mapping back
+        h, w = image.shape[:2]
+        if self.inference_size and max(h, w) > self.inference_size:
+            factor = self.inference_size / max(h, w)
+            image = cv2.resize(image, (max(1, int(w * factor)), max(1, int(h * factor))),
+                               interpolation=cv2.INTER_AREA)
+        return np.ascontiguousarray(image), (w, h), (x0, y0)
+
+    def update_roi(self, box, frame_shape):
+        """
+        Set the ROI for the next frame to the padded face box, or reset it
+
+        :param box: Face box in full-frame pixels, or None if tracking was lost
+        """
+        if box is None:
+            self.roi = None
+            return
+
+        h, w = frame_shape[:2]
+        x0, y0, x1, y1 = box
+        pad_x = (x1 - x0) * self.roi_padding
+        pad_y = (y1 - y0) * self.roi_padding
+        roi = (max(0, int(x0 - pad_x)), max(0, int(y0 - pad_y)),
+               min(w, int(x1 + pad_x)), min(h, int(y1 + pad_y)))
+
+        # A degenerate box means the mesh is unreliable; fall back to the full frame
+        if roi[2] - roi[0] < 32 or roi[3] - roi[1] < 32:
+            roi = None
+        self.roi = roi
+
+    def calibrate(self, calibration):
+        """
+        Start collecting EAR samples for calibration
+
+        The thresholds are taken from the calibration once it completes.
+
+        :param calibration: EarCalibration to feed
+        """
+        calibration.start()
+        self.calibration = calibration
+
+    def filter_ear(self, avg_ear, timestamp):
+        """
+        Add a sample to the median filter
+
+        :return: The filtered EAR
+        """
+        if self.filter_window.maxlen != self.FILTER_WINDOW:
+            self.filter_window = deque(self.filter_window, maxlen=max(1, self.FILTER_WINDOW))
+        self.filter_window.append((avg_ear, timestamp, self.frame_index))
+        ordered = sorted(sample[0] for sample in self.filter_window)
+        self.filtered_ear = ordered[len(ordered) // 2]
+        return self.filtered_ear
+
+    def update(self, avg_ear, timestamp=None, frame_index=None):
+        """
+        Advance the blink state machine by one frame
+
+        :param avg_ear: Average EAR of both eyes for this frame
+        :param timestamp: Capture time of the frame (time.perf_counter()); now if None
+        :param frame_index: Index of the frame; counts updates if None
+        :return: True if a blink was reported on this frame
+        """
+        self.last_ear = avg_ear
+        self.frame_index = self.frame_index + 1 if frame_index is None else frame_index
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        self.ear_history.append(avg_ear)
+
+        calibration = self.calibration
+        if calibration is not None:
+            if calibration.add(avg_ear, timestamp):
+                return False
+            self.calibration = None
+            calibration.apply(self)
+            # Calibration ends with the eyes closed: start from a clean filter
+            # in the closed state, so blinks only re-arm once the eye reopens
+            self.filter_window.clear()
+            self.ear_history.clear()
+            self.eye_closed = True
+            self.current_blink_state = True
+            self.blink_counter = 0
+            self.closed_at, self.closed_frame = timestamp, self.frame_index
+            return False
+
+        filtered = self.filter_ear(avg_ear, timestamp)
+        if not self.eye_closed:
+            if filtered >= self.CLOSE_THRESHOLD:
+                return False
+            # The eye just closed; selections are resolved against the first
+            # raw sample of the closure still in the filter window
+            self.eye_closed = True
+            self.blink_counter = 0
+            self.current_blink_state = False
+            self.closed_at, self.closed_frame = timestamp, self.frame_index
+            for ear, sample_time, sample_frame in self.filter_window:
+                if ear < self.CLOSE_THRESHOLD:
+                    self.closed_at, self.closed_frame = sample_time, sample_frame
+                    break
+        elif filtered > self.OPEN_THRESHOLD:
+            self.eye_closed = False
+            self.blink_counter = 0
+            self.current_blink_state = False
+            return False
+
+        self.blink_counter += 1
+        duration_ms = (timestamp - self.closed_at) * 1000
+        if self.current_blink_state or not self.MIN_BLINK_MS <= duration_ms <= self.MAX_BLINK_MS:
+            return False
+
+        self.total_blinks += 1
+        if self.verbose:
+            print(f"Blink detected! Total blinks: {self.total_blinks}")
+        self.current_blink_state = True
+        self.callback(BlinkEvent(timestamp, self.frame_index, self.closed_at,
+                                 self.closed_frame, list(self.ear_history),
+                                 self.total_blinks))
+        return True
+
+    def process_frame(self, frame, timestamp=None, frame_index=None, is_rgb=False):
+        """
+        Detect the face and eyes in a frame, draw them and update the blink state
+
+        :param frame: BGR frame, or RGB if is_rgb is set
+        :param timestamp: Capture time of the frame, passed on to BlinkEvents
+        :param frame_index: Index of the frame, passed on to BlinkEvents
+        :param is_rgb: The frame is already RGB; it is then used for inference
+            as is and drawn on in place after inference, avoiding any copy
+        :return: The frame, with detections drawn on it
+        """
+        telemetry = self.telemetry
+        scheduler = self.scheduler
+        if scheduler is not None:
+            if timestamp is None:
+                timestamp = time.perf_counter()
+            if not scheduler.should_infer(timestamp, self):
+                # Keep the last detections on screen; last_eyes stays as it was
+                started = telemetry.start()
+                self.draw_overlay(frame, is_rgb)
+                telemetry.stop("drawing", started)
+                telemetry.count("skipped_inference")
+                return frame
+            inference_started = time.perf_counter()
+
+        self.load_models()
+        self.last_eyes = None
+        self.overlay_boxes = []
+        
+        # Convert frame to RGB
+        if is_rgb:
+            rgb_frame = frame
+        else:
+            started = telemetry.start()
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            telemetry.stop("bgr_to_rgb", started)
+        left_eye_color = (0, 0, 255) if is_rgb else (255, 0, 0)  # Blue either way
+        
+        # Detect face mesh landmarks
+        started = telemetry.start()
+        inference_frame, scale, offset = self.inference_input(rgb_frame)
+        mesh_results = self.face_mesh.process(inference_frame)
+        telemetry.stop("face_mesh", started)
+        
+        # Losing the face resets the ROI so the next frame searches the full image
+        if self.roi_mode and not mesh_results.multi_face_landmarks:
+            self.update_roi(None, frame.shape)
+        
+        started = telemetry.start()
+        if self.detection_mode == "full":
+            self.draw_detections(frame, rgb_frame)
+        elif not mesh_results.multi_face_landmarks:
+            # Tracking lost: optionally fall back to the full detector
+            if self.face_detector is not None:
+                self.draw_detections(frame, rgb_frame)
+        telemetry.stop("face_detection", started)
         
         # Process face landmarks and blink detection
         if mesh_results.multi_face_landmarks:
             for face_landmarks in mesh_results.multi_face_landmarks:
+                if self.detection_mode == "mesh" or self.roi_mode:
+                    box = self.face_box(face_landmarks, scale, offset)
+                    if self.roi_mode:
+                        self.update_roi(box, frame.shape)
+                    if self.detection_mode == "mesh":
+                        x0, y0, x1, y1 = box
+                        cv2.rectangle(frame, (x0, y0), (x1, y1), (0, 255, 0), 2)  # Green rectangle
+                        self.overlay_boxes.append(box)
+
                 # Extract precise eye landmarks for left and right eyes
-                left_eye = np.array([(face_landmarks.landmark[i].x * frame.shape[1], 
-                                      face_landmarks.landmark[i].y * frame.shape[0]) 
-                                     for i in [33, 160, 158, 133, 153, 144]])
-                right_eye = np.array([(face_landmarks.landmark[i].x * frame.shape[1], 
-                                       face_landmarks.landmark[i].y * frame.shape[0]) 
-                                      for i in [362, 385, 387, 263, 373, 380]])
-                
-                # Calculate Eye Aspect Ratio for both eyes
-                left_ear = self.eye_aspect_ratio(left_eye)
-                right_ear = self.eye_aspect_ratio(right_eye)
+                started = telemetry.start()
+                eyes = eye_landmarks(face_landmarks, scale, offset)
                 
-                # Average EAR of both eyes
-                avg_ear = (left_ear + right_ear) / 2.0
+                # Average Eye Aspect Ratio of both eyes
+                avg_ear = float(eye_aspect_ratio(eyes).mean())
+                telemetry.stop("landmarks_ear", started)
                 
                 # Draw eye landmarks for debugging
+                started = telemetry.start()
+                left_eye, right_eye = eyes.astype(int)
                 for (x, y) in left_eye:
-                    cv2.circle(frame, (int(x), int(y)), 2, (255, 0, 0), -1)
+                    cv2.circle(frame, (int(x), int(y)), 2, left_eye_color, -1)
                 for (x, y) in right_eye:
                     cv2.circle(frame, (int(x), int(y)), 2, (0, 255, 0), -1)
+                telemetry.stop("drawing", started)
                 
-                # Blink detection logic with improved accuracy
-                if avg_ear < self.EAR_THRESHOLD:
-                    self.blink_counter += 1
-                    
-                    # Detect blink with more robust conditions
-                    if (self.blink_counter >= self.CONSEC_FRAMES_THRESHOLD and 
-                        self.blink_counter <= self.MAX_BLINK_FRAMES):
-                        
-                        if not self.current_blink_state:
-                            # Ensure it's a new blink
-                            self.total_blinks += 1
-                            print(f"Blink detected! Total blinks: {self.total_blinks}")
-                            self.callback()
-                            self.current_blink_state = True
-                else:
-                    # Reset blink counter when eyes are open
-                    self.blink_counter = 0
-                    self.current_blink_state = False
+                self.last_eyes = eyes
+                self.update(avg_ear, timestamp, frame_index)
         
+        if scheduler is not None:
+            scheduler.record(time.perf_counter() - inference_started, timestamp)
         return frame
\ No newline at end of file
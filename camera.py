@@ -1,27 +1,174 @@
+import os
+import threading
+import time
 import cv2
+import numpy as np
 from PyQt5.QtGui import QImage, QPixmap
 from blink_detector import BlinkDetector
+from capture import CaptureConfig, open_capture, probe
+from inference_scheduler import InferenceScheduler
+from telemetry import Telemetry
+
+
+class BufferPool:
+    """
+    Reusable RGB frame buffers shared by inference and display.
+
+    A buffer is acquired for each captured frame, wrapped in a QImage without
+    copying, and released once the GUI has uploaded it to a QPixmap (or the
+    frame was dropped). Buffers of a stale size are discarded when the
+    capture resolution changes.
+    """
+
+    def __init__(self, size=3):
+        self._lock = threading.Lock()
+        self._free = []
+        self._shape = None
+        self.size = size
+        self.allocations = 0
+
+    def acquire(self, shape):
+        with self._lock:
+            if shape != self._shape:
+                self._shape = shape
+                self._free = []
+            if self._free:
+                return self._free.pop()
+        # Only happens while the pool warms up, or if consumers hold on to buffers
+        self.allocations += 1
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, buffer):
+        with self._lock:
+            if buffer.shape == self._shape and len(self._free) < self.size:
+                self._free.append(buffer)
+
+
+def detector_options():
+    """
+    BlinkDetector options from the environment
+
+    EYESPEAK_ROI=1 runs FaceMesh on a crop around the tracked face, and
+    EYESPEAK_INFERENCE_SIZE=320 downscales the inference image so its longer
+    side is at most that many pixels.
+
+    :return: Keyword arguments for BlinkDetector
+    """
+    options = {"roi_mode": os.environ.get("EYESPEAK_ROI") == "1", "inference_size": None}
+    size = os.environ.get("EYESPEAK_INFERENCE_SIZE")
+    if size:
+        try:
+            options["inference_size"] = int(size)
+        except ValueError as e:
+            print(f"Error reading inference size: {e}")
+    return options
+
 
 class Camera:
-    def __init__(self, label, blink_callback):
-        self.capture = cv2.VideoCapture(0)
+    def __init__(self, label, blink_callback, telemetry=None, config=None):
+        """
+        Open the capture source and set up blink detection
+
+        :param config: CaptureConfig; the default camera with driver settings if None
+
+        EYESPEAK_INFERENCE_BUDGET sets the fraction of the frame interval
+        inference may use before frames are skipped (default 0.5); 0 runs
+        inference on every frame.
+        """
+        self.config = config or CaptureConfig()
+        self.capture = None
+        self.settings = {}
+        try:
+            self.capture = open_capture(self.config)
+            self.settings = probe(self.capture)
+            print(f"Capture: {self.settings}")
+            if self.settings["mismatches"]:
+                print(f"Capture device ignored requested {', '.join(self.settings['mismatches'])}")
+        except Exception as e:
+            print(f"Error opening capture source: {e}")
         self.label = label
-        self.blink_detector = BlinkDetector(blink_callback)
-    
-    def get_frame(self):
-        ret, frame = self.capture.read()
+        self.telemetry = telemetry or Telemetry()
+        self.blink_detector = BlinkDetector(blink_callback, telemetry=self.telemetry,
+                                            scheduler=self.inference_scheduler(),
+                                            **detector_options())
+        self.last_capture_time = None
+        self.frame_index = -1
+
+        # The capture buffer is reused by every read; RGB buffers come from
+        # the pool and travel with their QImage until displayed
+        self.capture_buffer = None
+        self.buffers = BufferPool()
+        self.last_buffer = None
+
+    def inference_scheduler(self):
+        """Build the InferenceScheduler for the negotiated frame rate, or None if disabled"""
+        try:
+            budget = float(os.environ.get("EYESPEAK_INFERENCE_BUDGET", 0.5))
+        except ValueError as e:
+            print(f"Error reading inference budget: {e}")
+            budget = 0.5
+        if budget <= 0:
+            return None
+        fps = self.settings.get("fps") or self.config.fps or 30.0
+        return InferenceScheduler(budget=budget, frame_interval=1.0 / fps)
+
+    def read_frame(self):
+        """
+        Capture and process one frame
+
+        The frame is decoded into a reused buffer, mirrored in place and
+        converted once into a pooled RGB buffer. That buffer feeds MediaPipe,
+        receives the debug drawing and backs the returned QImage, so the
+        steady state allocates no frame memory. The QImage does not own its
+        pixels: the buffer is left in last_buffer and must be handed back with
+        buffers.release() once the image has been converted to a QPixmap on
+        the GUI thread.
+
+        :return: Processed RGB QImage, or None if no frame was available
+        """
+        telemetry = self.telemetry
+        if self.capture is None:
+            return None
+        started = telemetry.start()
+        ret, frame = self.capture.read(self.capture_buffer)
+        telemetry.stop("capture", started)
         if not ret:
             return None
-        
-        # Mirror the image and process with blink detector
-        frame = cv2.flip(frame, 1)
-        frame = self.blink_detector.process_frame(frame)
-        
-        # Convert to RGB for display
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = frame.shape
-        bytes_per_line = ch * w
-        return QPixmap.fromImage(QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888))
-    
+        self.capture_buffer = frame
+        self.last_capture_time = time.perf_counter()
+        self.frame_index += 1
+
+        # Mirror the image in place
+        started = telemetry.start()
+        cv2.flip(frame, 1, frame)
+        telemetry.stop("flip", started)
+
+        # The only colour conversion: straight into a display buffer
+        started = telemetry.start()
+        rgb = self.buffers.acquire(frame.shape)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, rgb)
+        telemetry.stop("bgr_to_rgb", started)
+
+        started = telemetry.start()
+        self.blink_detector.process_frame(rgb, self.last_capture_time, self.frame_index, is_rgb=True)
+        telemetry.stop("inference", started)
+
+        # Wrap the buffer for display without copying
+        started = telemetry.start()
+        h, w, ch = rgb.shape
+        image = QImage(rgb.data, w, h, ch * w, QImage.Format_RGB888)
+        self.last_buffer = rgb
+        telemetry.stop("display_convert", started)
+        return image
+
+    def get_frame(self):
+        image = self.read_frame()
+        if image is None:
+            return None
+        pixmap = QPixmap.fromImage(image)
+        self.buffers.release(self.last_buffer)
+        return pixmap
+
     def release_camera(self):
-        self.capture.release()
\ No newline at end of file
+        if self.capture is not None:
+            self.capture.capture.release()
@@ -0,0 +1,250 @@
+"""
+Capture configuration for Camera.
+
+A CaptureConfig names a source (a device index, a video file or any
+iterable of BGR frames) and the settings to negotiate with it: backend,
+resolution, frame rate, FOURCC and driver buffer size. open_capture()
+returns an object with the cv2.VideoCapture interface for any of them, and
+probe() reports what the driver actually agreed to.
+"""
+import time
+import cv2
+
+BACKENDS = {
+    "any": cv2.CAP_ANY,
+    "v4l2": cv2.CAP_V4L2,
+    "ffmpeg": cv2.CAP_FFMPEG,
+    "gstreamer": cv2.CAP_GSTREAMER,
+    "dshow": cv2.CAP_DSHOW,
+    "msmf": cv2.CAP_MSMF,
+    "avfoundation": cv2.CAP_AVFOUNDATION,
+    "file": cv2.CAP_FFMPEG,
+}
+
+
+class CaptureConfig:
+    def __init__(self, source=0, backend="any", width=None, height=None, fps=None,
+                 fourcc=None, buffer_size=1, latest_frame=True, realtime=True, loop=False):
+        """
+        Describe a capture source
+
+        :param source: Device index, path of a video file, or an iterable of BGR frames
+        :param backend: Key of BACKENDS; "file" reads video files through FFmpeg
+        :param width: Requested frame width, or None for the driver default
+        :param height: Requested frame height, or None for the driver default
+        :param fps: Requested frame rate; for files and iterables, the playback rate
+        :param fourcc: Requested pixel format, e.g. "MJPG" or "YUYV"
+        :param buffer_size: Frames the driver may queue (CAP_PROP_BUFFERSIZE)
+        :param latest_frame: Drain frames queued by the driver and return the
+            freshest one, for devices that ignore buffer_size
+        :param realtime: Pace files and iterables at their frame rate instead
+            of reading as fast as possible
+        :param loop: Restart files and re-iterate sources when they end
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown capture backend: {backend}")
+        self.source = source
+        self.backend = backend
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.fourcc = fourcc
+        self.buffer_size = buffer_size
+        self.latest_frame = latest_frame
+        self.realtime = realtime
+        self.loop = loop
+
+    @property
+    def is_device(self):
+        return isinstance(self.source, int)
+
+
+class FrameSourceCapture:
+    """
+    cv2.VideoCapture lookalike over an iterable of BGR frames
+
+    :param frames: Iterable of frames, or a callable returning a fresh
+        iterable (needed for looping)
+    """
+
+    def __init__(self, frames, fps=30.0, loop=False):
+        self._factory = frames if callable(frames) else None
+        self._frames = iter(frames() if callable(frames) else frames)
+        self.fps = fps or 30.0
+        self.loop = loop and self._factory is not None
+        self._pending = None
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def grab(self):
+        try:
+            self._pending = next(self._frames)
+        except StopIteration:
+            if not self.loop:
+                self._opened = False
+                return False
+            self._frames = iter(self._factory())
+            return self.grab()
+        return True
+
+    def retrieve(self, image=None):
+        frame, self._pending = self._pending, None
+        if frame is None:
+            return False, None
+        if image is not None and image.shape == frame.shape:
+            image[...] = frame
+            return True, image
+        return True, frame.copy()
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def getBackendName(self):
+        return "frames"
+
+    def release(self):
+        self._opened = False
+
+
+class CaptureReader:
+    """
+    Reads frames from an opened capture according to a CaptureConfig
+
+    Files and frame sources are paced to their frame rate when realtime is
+    set; devices optionally have stale queued frames drained so every read
+    returns the newest frame.
+    """
+
+    # A grab that returns faster than this came from the driver's queue
+    QUEUED_GRAB_SECONDS = 0.004
+    MAX_DRAIN = 8
+
+    def __init__(self, capture, config):
+        self.capture = capture
+        self.config = config
+        self.drained = 0  # stale frames skipped so far
+        self._next_due = None
+        fps = capture.get(cv2.CAP_PROP_FPS) if not config.is_device else 0
+        self._interval = 1.0 / (config.fps or fps or 30.0)
+
+    def read(self, image=None):
+        if self.config.is_device:
+            if self.config.latest_frame:
+                return self._read_latest(image)
+            return self.capture.read(image)
+
+        if self.config.realtime:
+            self._pace()
+        ok, frame = self.capture.read(image)
+        if not ok and self.config.loop and isinstance(self.config.source, str):
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read(image)
+        return ok, frame
+
+    def _pace(self):
+        now = time.perf_counter()
+        if self._next_due is None or now - self._next_due > self._interval:
+            # First frame, or we fell behind: restart the clock instead of bursting
+            self._next_due = now
+        elif self._next_due > now:
+            time.sleep(self._next_due - now)
+        self._next_due += self._interval
+
+    def _read_latest(self, image):
+        # Queued frames are grabbed without decoding until a grab has to wait
+        # for the camera, which means it delivered a fresh frame. A grab that
+        # waited is kept: grabbing again would throw that frame away.
+        grabbed = False
+        for _ in range(self.MAX_DRAIN + 1):
+            started = time.perf_counter()
+            if not self.capture.grab():
+                break
+            if grabbed:
+                self.drained += 1  # the previously grabbed frame was stale
+            grabbed = True
+            if time.perf_counter() - started > self.QUEUED_GRAB_SECONDS:
+                break
+        if not grabbed:
+            return False, None
+        return self.capture.retrieve(image)
+
+
+def _fourcc_code(fourcc):
+    return cv2.VideoWriter_fourcc(*fourcc)
+
+
+def _fourcc_text(code):
+    code = int(code)
+    text = "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+    return text if text.isprintable() and text.strip() else str(code)
+
+
+def open_capture(config):
+    """
+    Open the source described by config and request its settings
+
+    :return: CaptureReader over the opened capture
+    :raises IOError: if the source can't be opened
+    """
+    source = config.source
+    if isinstance(source, (int, str)):
+        capture = cv2.VideoCapture(source, BACKENDS[config.backend])
+    else:
+        capture = FrameSourceCapture(source, config.fps, config.loop)
+    if not capture.isOpened():
+        raise IOError(f"Could not open capture source {source!r} with backend {config.backend}")
+
+    if config.is_device:
+        # FOURCC first: many drivers only offer high resolutions at full rate in MJPG
+        if config.fourcc:
+            capture.set(cv2.CAP_PROP_FOURCC, _fourcc_code(config.fourcc))
+        if config.width:
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, config.width)
+        if config.height:
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, config.height)
+        if config.fps:
+            capture.set(cv2.CAP_PROP_FPS, config.fps)
+        if config.buffer_size is not None:
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, config.buffer_size)
+    return CaptureReader(capture, config)
+
+
+def probe(reader):
+    """
+    Report the settings the capture actually negotiated
+
+    :return: Dict of backend, width, height, fps, fourcc and buffer_size,
+        plus "mismatches" listing requested settings that were not honoured
+    """
+    capture, config = reader.capture, reader.config
+    settings = {
+        "backend": capture.getBackendName(),
+        "width": int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": round(capture.get(cv2.CAP_PROP_FPS), 2),
+        "fourcc": _fourcc_text(capture.get(cv2.CAP_PROP_FOURCC)),
+        "buffer_size": int(capture.get(cv2.CAP_PROP_BUFFERSIZE)),
+    }
+
+    mismatches = []
+    if config.is_device:
+        requested = {"width": config.width, "height": config.height, "fps": config.fps,
+                     "fourcc": config.fourcc, "buffer_size": config.buffer_size}
+        for name, value in requested.items():
+            # Drivers that don't report a property return 0
+            if value and settings[name] and settings[name] != value:
+                mismatches.append(name)
+    settings["mismatches"] = mismatches
+    return settings
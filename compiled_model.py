@@ -0,0 +1,304 @@
+"""
+Compiled, memory-mappable language model for WordPredictor.
+
+The model is written once from a WordPredictor (for example one loaded
+from a save_custom_data JSON file) and then opened with mmap. Queries read
+the arrays in place, so opening a large model costs no parsing time and
+entries are only paged in when they are touched.
+
+File layout (native byte order, checked on open; every section starts on
+an 8-byte boundary):
+
+    header      magic, version, byte-order mark, counts and section offsets
+    vocabulary  V+1 string offsets and a UTF-8 blob, sorted by word
+    frequency   V word frequencies, indexed by word id
+    by_freq     V word ids, most frequent first
+    bigrams     CSR: V+1 row offsets, E next-word ids, E counts
+    trigrams    T packed (id1 << 32 | id2) keys, sorted, then CSR rows
+    phrases     P+1 string offsets, a UTF-8 blob and P usage counts
+
+Every CSR row is sorted by count, highest first.
+
+Convert a JSON model with:
+    python compiled_model.py custom_data.json model.eylm
+"""
+import heapq
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+MAGIC = b"EYLM"
+VERSION = 1
+BYTE_ORDER_MARK = 0x01020304
+_HEADER = struct.Struct("=4sIIIIII16Q")
+_MAX_CHAR = "\U0010ffff"
+
+# Prefix ranges larger than this are searched by walking words in frequency
+# order instead of scanning the whole range
+_WIDE_RANGE = 2048
+
+
+def _strings_section(strings):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = array("I", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    return offsets, b"".join(encoded)
+
+
+def _csr(rows):
+    """Build CSR arrays from a list of {next id: count} dicts"""
+    row_ptr = array("I", [0])
+    cols = array("I")
+    counts = array("I")
+    for row in rows:
+        for next_id, count in sorted(row.items(), key=lambda item: (-item[1], item[0])):
+            cols.append(next_id)
+            counts.append(count)
+        row_ptr.append(len(cols))
+    return row_ptr, cols, counts
+
+
+def compile_model(predictor, filename):
+    """
+    Write a WordPredictor's words, n-grams and phrases as a compiled model
+
+    :param predictor: WordPredictor to export
+    :param filename: Output file
+    """
+    ngram_items = list(predictor.ngrams.items())
+    vocabulary = set(predictor.word_frequencies)
+    for context, counts in ngram_items:
+        vocabulary.update(context)
+        vocabulary.update(counts)
+    words = sorted(vocabulary)
+    ids = {word: i for i, word in enumerate(words)}
+
+    frequencies = array("I", (max(0, predictor.word_frequencies.get(word, 0)) for word in words))
+    by_freq = array("I", sorted(range(len(words)), key=lambda i: (-frequencies[i], i)))
+
+    bigram_rows = [{} for _ in words]
+    trigram_rows = {}
+    for context, counts in ngram_items:
+        row = {ids[word]: count for word, count in counts.items()}
+        if len(context) == 1:
+            bigram_rows[ids[context[0]]] = row
+        else:
+            trigram_rows[(ids[context[0]] << 32) | ids[context[1]]] = row
+    trigram_keys = array("Q", sorted(trigram_rows))
+
+    vocab_offsets, vocab_blob = _strings_section(words)
+    phrases = predictor.phrases
+    phrase_offsets, phrase_blob = _strings_section(phrases)
+    usage = array("I", (predictor.phrase_index.usage(phrase) for phrase in phrases))
+
+    sections = [vocab_offsets, vocab_blob, frequencies, by_freq]
+    sections.extend(_csr(bigram_rows))
+    sections.append(trigram_keys)
+    sections.extend(_csr([trigram_rows[key] for key in trigram_keys]))
+    sections.extend([phrase_offsets, phrase_blob, usage])
+
+    offsets = []
+    position = _HEADER.size
+    for section in sections:
+        position += -position % 8
+        offsets.append(position)
+        position += len(section) * getattr(section, "itemsize", 1)
+
+    header = _HEADER.pack(MAGIC, VERSION, BYTE_ORDER_MARK, len(words), len(trigram_keys),
+                          len(phrases), 0, *offsets, *[0] * (16 - len(offsets)))
+    with open(filename, "wb") as file:
+        file.write(header)
+        for offset, section in zip(offsets, sections):
+            file.write(b"\0" * (offset - file.tell()))
+            file.write(section if isinstance(section, bytes) else section.tobytes())
+
+
+class CompiledModel:
+    def __init__(self, filename):
+        """
+        Open a compiled model
+
+        :param filename: File written by compile_model
+        """
+        self._file = open(filename, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, mark, vocab_size, trigram_count, phrase_count, _, *offsets = \
+            _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not a compiled model (version {VERSION})")
+        if mark != BYTE_ORDER_MARK:
+            raise ValueError(f"{filename} was compiled on a machine with a different byte order")
+
+        self.vocab_size = vocab_size
+        view = memoryview(self._mmap)
+
+        def section(index, fmt, count):
+            start = offsets[index]
+            if fmt == "B":
+                return view[start:start + count]
+            return view[start:start + count * struct.calcsize(fmt)].cast(fmt)
+
+        self._vocab_offsets = section(0, "I", vocab_size + 1)
+        self._vocab_blob = section(1, "B", self._vocab_offsets[-1])
+        self._frequencies = section(2, "I", vocab_size)
+        self._by_freq = section(3, "I", vocab_size)
+        self._bigram_ptr = section(4, "I", vocab_size + 1)
+        entry_count = self._bigram_ptr[-1]
+        self._bigram_cols = section(5, "I", entry_count)
+        self._bigram_counts = section(6, "I", entry_count)
+        self._trigram_keys = section(7, "Q", trigram_count)
+        self._trigram_ptr = section(8, "I", trigram_count + 1)
+        entry_count = self._trigram_ptr[-1]
+        self._trigram_cols = section(9, "I", entry_count)
+        self._trigram_counts = section(10, "I", entry_count)
+        self._phrase_offsets = section(11, "I", phrase_count + 1)
+        self._phrase_blob = section(12, "B", self._phrase_offsets[-1])
+        self._phrase_usage = section(13, "I", phrase_count)
+
+    def close(self):
+        # Views must be released before the mmap can close
+        for value in list(vars(self).values()):
+            if isinstance(value, memoryview):
+                value.release()
+        self._mmap.close()
+        self._file.close()
+
+    def word(self, word_id):
+        start, end = self._vocab_offsets[word_id], self._vocab_offsets[word_id + 1]
+        return bytes(self._vocab_blob[start:end]).decode("utf-8")
+
+    def _bisect(self, word):
+        """Index of the first vocabulary word not less than word"""
+        lo, hi = 0, self.vocab_size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.word(mid) < word:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, word):
+        """Return the id of word, or None if it isn't in the vocabulary"""
+        index = self._bisect(word)
+        if index < self.vocab_size and self.word(index) == word:
+            return index
+        return None
+
+    def frequency(self, word):
+        word_id = self.find(word)
+        return 0 if word_id is None else self._frequencies[word_id]
+
+    def most_common(self, skip=None):
+        """
+        Iterate over (frequency, word), most frequent first
+
+        Words with frequency 0 only appear in n-grams and are never offered.
+
+        :param skip: Optional predicate; words for which it is true are left out
+        """
+        for word_id in self._by_freq:
+            if not self._frequencies[word_id]:
+                break  # by_freq is sorted, so only n-gram-only words follow
+            word = self.word(word_id)
+            if skip is None or not skip(word):
+                yield self._frequencies[word_id], word
+
+    def complete(self, prefix, count, skip=None):
+        """
+        Return the most frequent words starting with prefix
+
+        Words with frequency 0 only appear in n-grams and are left out, as
+        they are not in the vocabulary a JSON model completes from.
+
+        :param skip: Optional predicate; words for which it is true are left out
+        :return: List of (frequency, word), most frequent first
+        """
+        lo = self._bisect(prefix)
+        hi = self._bisect(prefix + _MAX_CHAR)
+        if hi - lo > _WIDE_RANGE:
+            # Wide ranges: common words come first, so this stops early
+            results = []
+            for word_id in self._by_freq:
+                if not self._frequencies[word_id]:
+                    break
+                if lo <= word_id < hi:
+                    word = self.word(word_id)
+                    if skip is None or not skip(word):
+                        results.append((self._frequencies[word_id], word))
+                        if len(results) >= count:
+                            break
+            return results
+
+        frequencies = self._frequencies
+        candidates = (i for i in range(lo, hi)
+                      if frequencies[i] and (skip is None or not skip(self.word(i))))
+        best = heapq.nsmallest(count, candidates, key=lambda i: (-frequencies[i], i))
+        return [(frequencies[i], self.word(i)) for i in best]
+
+    def _row(self, context):
+        """Return (cols, counts, start, end) for a context, or None if unseen"""
+        ids = [self.find(word) for word in context]
+        if None in ids:
+            return None
+        if len(ids) == 1:
+            return (self._bigram_cols, self._bigram_counts,
+                    self._bigram_ptr[ids[0]], self._bigram_ptr[ids[0] + 1])
+
+        key = (ids[0] << 32) | ids[1]
+        index = bisect_left(self._trigram_keys, key)
+        if index >= len(self._trigram_keys) or self._trigram_keys[index] != key:
+            return None
+        return (self._trigram_cols, self._trigram_counts,
+                self._trigram_ptr[index], self._trigram_ptr[index + 1])
+
+    def continuations(self, context):
+        """
+        Iterate over (count, next word) seen after context, highest count first
+
+        :param context: Tuple of one or two words
+        """
+        row = self._row(context)
+        if row is None:
+            return
+        cols, counts, start, end = row
+        for i in range(start, end):
+            yield counts[i], self.word(cols[i])
+
+    def ngram_count(self, context, next_word):
+        for count, word in self.continuations(context):
+            if word == next_word:
+                return count
+        return 0
+
+    def phrases(self):
+        """Return every phrase with its usage count, in stored order"""
+        results = []
+        for i in range(len(self._phrase_usage)):
+            start, end = self._phrase_offsets[i], self._phrase_offsets[i + 1]
+            results.append((bytes(self._phrase_blob[start:end]).decode("utf-8"),
+                            self._phrase_usage[i]))
+        return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Usage: python compiled_model.py custom_data.json model.eylm")
+        return 1
+
+    # The JSON file is read the same way the app reads it, so both the
+    # current and older schemas are accepted and built-in words are included
+    from word_prediction import WordPredictor
+    predictor = WordPredictor(argv[0])
+    compile_model(predictor, argv[1])
+    print(f"Compiled {len(predictor.word_frequencies)} words and "
+          f"{len(predictor.phrases)} phrases into {argv[1]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
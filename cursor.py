@@ -1,7 +1,55 @@
+import time
+from collections import deque
 from PyQt5.QtCore import QTimer
+from scan_timing import ScanScheduler
+from telemetry import Telemetry
+
+# Scan highlighting is driven by the dynamic "scan" property ("", "row" or
+# "item") instead of per-step stylesheet strings. Buttons get one of these
+# stylesheets once; changing the property only re-polishes that widget, and
+# base colours such as keyType="action" survive highlighting.
+KEY_STYLE = """
+    QPushButton {
+        background-color: #3498db;
+        color: white;
+        font-size: 20px;
+        border-radius: 10px;
+    }
+    QPushButton[keyType="action"] { background-color: #e74c3c; }
+    QPushButton[scan="row"] { background-color: yellow; color: black; }
+    QPushButton[scan="item"] { background-color: green; }
+"""
+
+SUGGESTION_STYLE = """
+    QPushButton {
+        background-color: #3498db;
+        color: white;
+        padding: 10px;
+        font-size: 16px;
+    }
+    QPushButton:disabled { background-color: #95a5a6; }
+    QPushButton[scan="item"] { background-color: purple; }
+"""
+
+
+def set_scan_state(widget, state):
+    """Set a widget's scan property and re-polish it so the style applies"""
+    widget.setProperty("scan", state)
+    style = widget.style()
+    style.unpolish(widget)
+    style.polish(widget)
+    widget.update()
+
 
 class CursorManager:
-    def __init__(self, buttons, suggestion_buttons, update_text_callback):
+    def __init__(self, buttons, suggestion_buttons, update_text_callback, scheduler=None,
+                 telemetry=None):
+        """
+        Start scanning
+
+        :param scheduler: ScanScheduler deciding how long each step is shown
+        :param telemetry: Telemetry counting blinks resolved to an earlier highlight
+        """
         self.buttons = buttons
         self.suggestion_buttons = suggestion_buttons
         self.update_text_callback = update_text_callback
@@ -9,18 +57,32 @@ class CursorManager:
         self.col_index = 0
         self.mode = "row"  # First select a row, then a column
         self.scanning_area = "keyboard"  # Track which area is being scanned
+        # Set when a chosen suggestion returned the cursor to the keyboard;
+        # new suggestions don't pull it back until a key is typed
+        self.stay_on_keyboard = False
+        self.highlighted = {}  # widget -> scan state currently shown
         
+        # (time shown, cursor state) of recent highlights, so a blink can be
+        # resolved against what was highlighted when the eye closed
+        self.history = deque(maxlen=32)
+        self.max_event_age = 3.0  # Older blinks are resolved against the current highlight
+        
+        # Each step is scheduled on its own, with a dwell from the scheduler
+        self.scheduler = scheduler or ScanScheduler()
+        self.telemetry = telemetry or Telemetry()
         self.timer = QTimer()
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.move_cursor)
-        self.timer.start(1500)  # Move every 2 seconds
         self.highlight_button()
         self.paused = False
+        self.suspended = False  # scanning held, e.g. during calibration
+        self.schedule_next(first=True)
         self.pause_timer = QTimer()
         self.pause_timer.setSingleShot(True)
         self.pause_timer.timeout.connect(self.resume_scanning)
 
     def move_cursor(self):
-        if self.paused:
+        if self.paused or self.suspended:
             return
             
         print(f"Cursor moving: area {self.scanning_area}, row {self.row_index}, col {self.col_index}, mode {self.mode}")  # Debugging line
@@ -35,42 +97,101 @@ class CursorManager:
             self.col_index = (self.col_index + 1) % len(self.suggestion_buttons)
         
         self.highlight_button()
+        self.schedule_next()
+
+    def step_kind(self):
+        """Kind of the current step for the scheduler: row, item or suggestion"""
+        if self.scanning_area == "suggestions":
+            return "suggestion"
+        return "row" if self.mode == "row" else "item"
+
+    def schedule_next(self, first=False):
+        self.timer.start(self.scheduler.dwell_ms(self.step_kind(), first))
+
+    def restart(self):
+        """Apply changed scheduler settings from the current step on"""
+        self.timer.stop()
+        if not self.paused and not self.suspended:
+            self.schedule_next()
+
+    def suspend(self):
+        """Stop scanning and ignore blinks until resume()"""
+        self.suspended = True
+        self.timer.stop()
+        self.pause_timer.stop()
+        self.paused = False
+
+    def resume(self):
+        """Continue scanning after suspend(), dwelling longer on the current step"""
+        if not self.suspended:
+            return
+        self.suspended = False
+        self.history.clear()
+        self.highlight_button()
+        self.schedule_next(first=True)
 
     def highlight_button(self):
-        # Reset all button styles first
-        for row in self.buttons:
-            for button in row:
-                button.setStyleSheet("")
-        
-        for button in self.suggestion_buttons:
-            button.setStyleSheet("""
-                background-color: #3498db;
-                color: white;
-                padding: 10px;
-                font-size: 16px;
-            """)
-        
-        # Highlight based on current scanning area
+        # Work out which widgets should be highlighted now
+        target = {}
         if self.scanning_area == "keyboard":
-            for row_idx, row in enumerate(self.buttons):
-                for col_idx, button in enumerate(row):
-                    if self.mode == "row" and col_idx == 0 and row_idx == self.row_index:
-                        button.setStyleSheet("background-color: yellow;")  # Highlight first button of row
-                    elif self.mode == "column" and row_idx == self.row_index and col_idx == self.col_index:
-                        button.setStyleSheet("background-color: green;")  # Highlight selected column
+            if self.mode == "row":
+                target[self.buttons[self.row_index][0]] = "row"  # Highlight first button of row
+            else:
+                target[self.buttons[self.row_index][self.col_index]] = "item"  # Highlight selected column
         else:  # suggestions area
-            self.suggestion_buttons[self.col_index].setStyleSheet("""
-                background-color: purple;
-                color: white;
-                padding: 10px;
-                font-size: 16px;
-            """)
-
-    def blink_detected(self):
+            target[self.suggestion_buttons[self.col_index]] = "item"
+        
+        # Only restyle the widgets whose state changed, so a scan step
+        # re-polishes at most two widgets however big the layout is
+        for widget in self.highlighted:
+            if widget not in target:
+                set_scan_state(widget, "")
+        for widget, state in target.items():
+            if self.highlighted.get(widget) != state:
+                set_scan_state(widget, state)
+        self.highlighted = target
+        self.history.append((time.perf_counter(), self.cursor_state()))
+
+    def cursor_state(self):
+        return (self.scanning_area, self.mode, self.row_index, self.col_index)
+
+    def state_at(self, timestamp):
+        """
+        Find what was highlighted at a perf_counter time
+
+        :return: (time shown, cursor state), or None if it is no longer in the history
+        """
+        for shown_at, state in reversed(self.history):
+            if shown_at <= timestamp:
+                return shown_at, state
+        return None
+
+    def blink_detected(self, event=None):
+        """
+        Select the highlighted row, key or suggestion
+
+        :param event: BlinkEvent; the selection uses the highlight shown when
+            the eye closed, since the cursor may have moved while the blink
+            was being detected
+        """
+        if self.suspended:
+            return
+        reaction_time = None
+        if event is not None and event.age() <= self.max_event_age:
+            found = self.state_at(event.closed_at)
+            if found is not None:
+                shown_at, state = found
+                reaction_time = event.closed_at - shown_at
+                if state != self.cursor_state():
+                    self.telemetry.count("blinks_resolved_earlier")
+                    self.scanning_area, self.mode, self.row_index, self.col_index = state
+        
         print(f"Blink detected! Area: {self.scanning_area}, Mode: {self.mode}")  # Debugging line
         
         # Pause scanning temporarily after a blink
         self.paused = True
+        self.timer.stop()
+        corrected = False
         
         if self.scanning_area == "keyboard":
             if self.mode == "row":
@@ -78,12 +199,16 @@ class CursorManager:
                 self.col_index = 0  # Reset column to first button
             else:
                 letter = self.buttons[self.row_index][self.col_index].text()
+                corrected = letter == "⌫"  # The previous selection was a mistake
+                self.stay_on_keyboard = False
                 self.update_text_callback(letter)  # Add the letter to the generated text
                 self.mode = "row"  # Reset to row selection mode
+                self.row_index = 0  # Scan from the top, where layouts put frequent keys
         elif self.scanning_area == "suggestions":
             # In suggestion buttons mode
             suggested_word = self.suggestion_buttons[self.col_index].text()
             if suggested_word:
+                self.stay_on_keyboard = True
                 self.update_text_callback(suggested_word)
                 # Switch back to keyboard scanning
                 self.scanning_area = "keyboard"
@@ -91,10 +216,24 @@ class CursorManager:
                 self.row_index = 0
                 self.col_index = 0
         
+        self.scheduler.record_selection(reaction_time, corrected)
         self.highlight_button()
         
-        # Resume scanning after a pause (3 seconds)
-        self.pause_timer.start(3000)
+        # The pause is the longer first-step dwell of the new highlight
+        self.pause_timer.start(self.scheduler.dwell_ms(self.step_kind(), first=True))
+    
+    def set_buttons(self, buttons):
+        """Scan a new keyboard layout, starting from its first row"""
+        self.buttons = buttons
+        self.highlighted = {widget: state for widget, state in self.highlighted.items()
+                            if widget in self.suggestion_buttons}
+        self.history.clear()
+        if self.scanning_area == "keyboard":
+            self.mode = "row"
+            self.row_index = 0
+            self.col_index = 0
+        self.highlight_button()
+        self.restart()
     
     def start_suggestion_scanning(self):
         """
@@ -104,7 +243,11 @@ class CursorManager:
         self.scanning_area = "suggestions"
         self.col_index = 0
         self.highlight_button()
+        if not self.paused and not self.suspended:
+            self.schedule_next(first=True)
     
     def resume_scanning(self):
+        if self.suspended:
+            return
         self.paused = False
-        print("Scanning resumed")  # Debugging line
\ No newline at end of file
+        self.move_cursor()
\ No newline at end of file
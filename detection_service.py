@@ -0,0 +1,402 @@
+"""
+Headless blink detection service for several EyeSpeak stations.
+
+Each stream is a capture source (camera index or video file) with a name.
+Streams are split round-robin over a pool of worker processes, one per
+core at most; each worker captures every stream on its own thread,
+keeping only the newest frame, and runs a BlinkDetector per stream on
+whichever streams have a new frame. Workers share the inference budget of
+their core between their streams.
+
+Blink events are published as JSON lines over a local TCP socket. A client
+sends one line naming the stream it wants, e.g. {"stream": "bed-2"}, or
+"*" for all of them, and then receives lines like
+    {"type": "blink", "stream": "bed-2", "frame": 812, "closed_at": ..., ...}
+Times are time.perf_counter() values, which are comparable between
+processes on the same host. Streams that fail or end are reported as
+{"type": "error"} and {"type": "ended"} lines.
+
+Run it and point the UIs at it:
+    python detection_service.py --stream bed-1=0 --stream bed-2=1 --port 8765
+    python main.py --service 127.0.0.1:8765 --stream bed-2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+import cv2
+from blink_detector import BlinkDetector
+from capture import CaptureConfig, open_capture
+from inference_scheduler import InferenceScheduler
+
+DEFAULT_PORT = 8765
+
+
+def parse_address(text):
+    """
+    Parse "host:port", "port" or ":port"
+
+    :return: (host, port); the host defaults to 127.0.0.1
+    """
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def partition(names, workers):
+    """Split stream names round-robin into at most workers non-empty groups"""
+    workers = max(1, min(workers, len(names)))
+    return [names[i::workers] for i in range(workers)]
+
+
+class StreamReader(threading.Thread):
+    """
+    Reads one stream on its own thread, keeping only the newest frame
+
+    A slow or stalled camera then only delays its own stream. Frames
+    alternate between a few buffers: the newest one waits in a single slot,
+    and take() hands it over together with its capture time.
+    """
+
+    def __init__(self, name, reader, fresh):
+        """
+        :param reader: CaptureReader of the stream
+        :param fresh: Event set whenever a new frame is available or the stream ends
+        """
+        super().__init__(name=f"capture-{name}", daemon=True)
+        self.reader = reader
+        self.fresh = fresh
+        self.lock = threading.Lock()
+        self.frame = None
+        self.captured_at = None
+        self.spare = []
+        self.ended = False
+        self.error = None
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            with self.lock:
+                buffer = self.spare.pop() if self.spare else None
+            try:
+                ok, frame = self.reader.read(buffer)
+            except Exception as e:
+                self.error = str(e)
+                break
+            if not ok:
+                break
+            with self.lock:
+                if self.frame is not None:
+                    self.spare.append(self.frame)  # never processed; superseded
+                self.frame, self.captured_at = frame, time.perf_counter()
+            self.fresh.set()
+        self.ended = True
+        self.fresh.set()
+
+    def take(self):
+        """
+        :return: (frame, capture time), or (None, None) if no new frame arrived
+        """
+        with self.lock:
+            frame, captured_at = self.frame, self.captured_at
+            self.frame = None
+            return frame, captured_at
+
+    def give_back(self, frame):
+        """Return a processed frame's buffer for reuse"""
+        with self.lock:
+            if len(self.spare) < 2:
+                self.spare.append(frame)
+
+    def stop(self):
+        self.stopping.set()
+        self.join(timeout=2)
+        self.reader.capture.release()
+
+
+def run_streams(streams, events, stop, inference_budget=0.5, detector_options=None):
+    """
+    Worker process: run blink detection on a group of streams until stopped
+
+    Each stream is captured on its own thread; this thread runs inference
+    on whichever streams have a new frame.
+
+    :param streams: List of (name, CaptureConfig)
+    :param events: multiprocessing queue receiving event dicts
+    :param stop: multiprocessing Event ending the loop
+    :param inference_budget: Fraction of a core's frame interval inference may
+        use, shared by the streams of this worker; 0 processes every frame
+    :param detector_options: Extra BlinkDetector keyword arguments, e.g.
+        roi_mode and inference_size
+    """
+    fresh = threading.Event()
+    active = OrderedDict()
+    for name, config in streams:
+        try:
+            reader = open_capture(config)
+            scheduler = None
+            if inference_budget > 0:
+                fps = config.fps or reader.capture.get(cv2.CAP_PROP_FPS) or 30.0
+                scheduler = InferenceScheduler(budget=inference_budget / len(streams),
+                                               frame_interval=1.0 / fps)
+            detector = BlinkDetector(lambda event, name=name: events.put(
+                dict(type="blink", stream=name, **event.to_dict())), scheduler=scheduler,
+                **(detector_options or {}))
+            detector.verbose = False
+            active[name] = [StreamReader(name, reader, fresh), detector, -1]  # frame index last
+        except Exception as e:
+            events.put({"type": "error", "stream": name, "message": str(e)})
+    for stream_reader, _, _ in active.values():
+        stream_reader.start()
+
+    while active and not stop.is_set():
+        fresh.wait(timeout=0.1)
+        fresh.clear()
+        for name, state in list(active.items()):
+            stream_reader, detector, index = state
+            frame, captured_at = stream_reader.take()
+            try:
+                if frame is not None:
+                    state[2] = index + 1
+                    detector.process_frame(frame, captured_at, index + 1)
+                    stream_reader.give_back(frame)
+                elif stream_reader.ended:
+                    stream_reader.stop()
+                    del active[name]
+                    if stream_reader.error:
+                        events.put({"type": "error", "stream": name, "message": stream_reader.error})
+                    else:
+                        events.put({"type": "ended", "stream": name})
+            except Exception as e:
+                stream_reader.stop()
+                del active[name]
+                events.put({"type": "error", "stream": name, "message": str(e)})
+
+    for stream_reader, _, _ in active.values():
+        stream_reader.stop()
+
+
+class EventHandler(socketserver.BaseRequestHandler):
+    """Reads a client's subscription line, then keeps it registered until it disconnects"""
+
+    def handle(self):
+        service = self.server.service
+        self.request.settimeout(1.0)
+        data = b""
+        while b"\n" not in data and not service.stopping.is_set():
+            try:
+                chunk = self.request.recv(1024)
+            except socket.timeout:
+                continue
+            if not chunk or len(data) > 4096:
+                return
+            data += chunk
+        try:
+            stream = json.loads(data.split(b"\n", 1)[0]).get("stream") or "*"
+        except Exception as e:
+            print(f"Error reading subscription: {e}")
+            return
+
+        service.add_client(self.request, stream)
+        try:
+            while not service.stopping.is_set():
+                try:
+                    if not self.request.recv(1024):
+                        break
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+        finally:
+            service.remove_client(self.request)
+
+
+class EventServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class DetectionService:
+    def __init__(self, streams, host="127.0.0.1", port=DEFAULT_PORT, workers=None,
+                 inference_budget=0.5, detector_options=None):
+        """
+        :param streams: Mapping of stream name to CaptureConfig
+        :param host: Interface to listen on; keep it local
+        :param port: TCP port of the event socket
+        :param workers: Number of worker processes; the core count if None
+        :param inference_budget: Per-core inference budget, see InferenceScheduler
+        :param detector_options: Extra BlinkDetector keyword arguments
+        """
+        self.streams = OrderedDict(streams)
+        self.address = (host, port)
+        self.workers = workers or os.cpu_count() or 1
+        self.inference_budget = inference_budget
+        self.detector_options = detector_options or {}
+
+        # Spawned workers don't inherit the parent's threads or sockets
+        self.context = multiprocessing.get_context("spawn")
+        self.events = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.processes = []
+
+        self.stopping = threading.Event()
+        self.clients = {}  # socket -> (subscribed stream name or "*", send lock)
+        self.clients_lock = threading.Lock()
+        self.server = None
+        self.threads = []
+
+    def start(self):
+        """Start the worker processes, then the event socket"""
+        names = list(self.streams)
+        for group in partition(names, self.workers):
+            process = self.context.Process(
+                target=run_streams, name=f"eyespeak-{'+'.join(group)}",
+                args=([(name, self.streams[name]) for name in group], self.events,
+                      self.stop_event, self.inference_budget, self.detector_options),
+                daemon=True)
+            process.start()
+            self.processes.append(process)
+
+        self.server = EventServer(self.address, EventHandler)
+        self.server.service = self
+        self.threads = [threading.Thread(target=self.server.serve_forever, daemon=True),
+                        threading.Thread(target=self.forward_events, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        print(f"Detection service on {self.address[0]}:{self.address[1]}: "
+              f"{len(names)} streams in {len(self.processes)} processes")
+
+    def add_client(self, connection, stream):
+        send_lock = threading.Lock()
+        # hello goes out before the client is visible to forward_events
+        with send_lock:
+            with self.clients_lock:
+                self.clients[connection] = (stream, send_lock)
+            self.send(connection, {"type": "hello", "streams": list(self.streams)}, locked=True)
+
+    def remove_client(self, connection):
+        with self.clients_lock:
+            self.clients.pop(connection, None)
+
+    def send(self, connection, message, locked=False):
+        """
+        Send one JSON line to a client
+
+        Each connection has a lock, so lines from different threads never
+        interleave.
+
+        :param locked: The caller already holds the connection's send lock
+        """
+        line = (json.dumps(message) + "\n").encode("utf-8")
+        try:
+            if locked:
+                connection.sendall(line)
+            else:
+                with self.clients_lock:
+                    client = self.clients.get(connection)
+                if client is None:
+                    return False
+                with client[1]:
+                    connection.sendall(line)
+            return True
+        except OSError:
+            # Slow or vanished client; its handler notices and cleans up
+            self.remove_client(connection)
+            return False
+
+    def forward_events(self):
+        """Broadcast events from the workers to the clients subscribed to their stream"""
+        while not self.stopping.is_set():
+            try:
+                message = self.events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if message["type"] != "blink":
+                print(f"Stream {message['stream']} {message['type']}: {message.get('message', '')}")
+            with self.clients_lock:
+                targets = [connection for connection, (stream, _) in self.clients.items()
+                           if stream in ("*", message["stream"])]
+            for connection in targets:
+                self.send(connection, message)
+
+    def alive(self):
+        return any(process.is_alive() for process in self.processes)
+
+    def stop(self):
+        self.stop_event.set()
+        self.stopping.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def serve_forever(self):
+        """Run until every stream has ended or the process is interrupted"""
+        self.start()
+        try:
+            while self.alive():
+                time.sleep(0.5)
+            time.sleep(1.0)  # let the last events drain to the clients
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def parse_stream(text, args):
+    """
+    Parse "name=source", where source is a camera index or a video file
+
+    :return: (name, CaptureConfig)
+    """
+    name, _, source = text.partition("=")
+    if not source:
+        name, source = f"stream-{name}", name
+    is_device = source.isdigit()
+    config = CaptureConfig(
+        source=int(source) if is_device else source,
+        backend=args.backend if is_device or args.backend != "any" else "file",
+        width=args.width, height=args.height, fps=args.fps, loop=args.loop)
+    return name, config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve blink events for several camera streams")
+    parser.add_argument("--stream", action="append", required=True, metavar="NAME=SOURCE",
+                        help="Named camera index or video file; repeat for each station")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port of the event socket")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: core count)")
+    parser.add_argument("--inference-budget", type=float, default=0.5,
+                        help="Fraction of a core's frame interval inference may use; 0 for every frame")
+    parser.add_argument("--roi", action="store_true",
+                        help="Run FaceMesh on a crop around each tracked face")
+    parser.add_argument("--inference-size", type=int,
+                        help="Downscale inference images to at most this many pixels on the longer side")
+    parser.add_argument("--backend", default="any", help="Capture backend, see capture.BACKENDS")
+    parser.add_argument("--width", type=int, help="Requested frame width")
+    parser.add_argument("--height", type=int, help="Requested frame height")
+    parser.add_argument("--fps", type=float, help="Requested frame rate (playback rate for files)")
+    parser.add_argument("--loop", action="store_true", help="Restart video files when they end")
+    args = parser.parse_args(argv)
+
+    streams = OrderedDict(parse_stream(text, args) for text in args.stream)
+    if len(streams) != len(args.stream):
+        parser.error("Stream names must be unique")
+    options = {"roi_mode": args.roi, "inference_size": args.inference_size}
+    DetectionService(streams, args.host, args.port, args.workers, args.inference_budget,
+                     options).serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Per-user EAR calibration for BlinkDetector.
+
+Eye shapes differ a lot between users, so a fixed EAR threshold either
+misses blinks or fires on squints. Calibration asks the user to keep
+their eyes open for a few seconds and then closed for a couple of
+seconds, takes the median EAR of each phase as the open and closed
+baselines, and places the close and open thresholds between them.
+Phases only advance on frames where a face was found, so an attempt that
+runs much longer than planned, e.g. because the face was lost, is failed
+by expire().
+
+Results are stored per user as JSON, e.g. ~/.eyespeak/profiles/default_ear.json.
+"""
+import json
+import os
+import threading
+import time
+
+
+class EarCalibration:
+    # Thresholds as fractions of the way from the closed to the open baseline
+    CLOSE_FRACTION = 0.35
+    OPEN_FRACTION = 0.55
+    MIN_SEPARATION = 0.05  # baselines closer than this mean the user didn't follow along
+
+    def __init__(self, profile_file=None, open_seconds=3.0, closed_seconds=2.0, settle_seconds=0.5,
+                 timeout_seconds=15.0):
+        """
+        Initialize the calibration, loading the profile if it exists
+
+        :param profile_file: JSON file holding this user's baselines
+        :param open_seconds: Length of the eyes-open phase
+        :param closed_seconds: Length of the eyes-closed phase
+        :param settle_seconds: Samples at the start of each phase are ignored
+            for this long, while the user follows the prompt
+        :param timeout_seconds: Wall-clock time after which expire() fails
+            an unfinished calibration
+        """
+        self.profile_file = profile_file
+        self.open_seconds = open_seconds
+        self.closed_seconds = closed_seconds
+        self.settle_seconds = settle_seconds
+        self.timeout_seconds = timeout_seconds
+
+        # Samples arrive on the capture thread, expire() is called from the GUI
+        self.lock = threading.Lock()
+        self.phase = None  # None, "open", "closed", "done" or "failed"
+        self.phase_started = None
+        self.started_at = None
+        self.open_ears = []
+        self.closed_ears = []
+
+        self.open_level = None
+        self.closed_level = None
+
+        if profile_file and os.path.exists(profile_file):
+            self.load()
+
+    @property
+    def active(self):
+        return self.phase in ("open", "closed")
+
+    @property
+    def calibrated(self):
+        return self.open_level is not None and self.closed_level is not None
+
+    def start(self):
+        """Begin a new calibration; the first phase starts with the next sample"""
+        with self.lock:
+            self.phase = "open"
+            self.phase_started = None
+            self.started_at = time.perf_counter()
+            self.open_ears = []
+            self.closed_ears = []
+
+    def add(self, ear, timestamp):
+        """
+        Feed one frame's average EAR
+
+        :param timestamp: Capture time of the frame, in seconds
+        :return: True while the calibration still needs samples
+        """
+        with self.lock:
+            if not self.active:
+                return False
+            if self.phase_started is None:
+                self.phase_started = timestamp
+            elapsed = timestamp - self.phase_started
+            if elapsed < self.settle_seconds:
+                return True
+
+            if self.phase == "open":
+                if elapsed < self.settle_seconds + self.open_seconds:
+                    self.open_ears.append(ear)
+                else:
+                    self.phase = "closed"
+                    self.phase_started = timestamp
+            elif elapsed < self.settle_seconds + self.closed_seconds:
+                self.closed_ears.append(ear)
+            else:
+                self.finish()
+            return self.active
+
+    def expire(self, now=None):
+        """
+        Fail the calibration if it has been running for longer than timeout_seconds
+
+        :param now: Current time.perf_counter(); read if None
+        :return: True if the calibration was failed by this call
+        """
+        with self.lock:
+            if not self.active:
+                return False
+            if now is None:
+                now = time.perf_counter()
+            if now - self.started_at < self.timeout_seconds:
+                return False
+            print(f"EAR calibration timed out in the {self.phase} phase")
+            self.phase = "failed"
+            return True
+
+    def finish(self):
+        """Compute the baselines from the collected samples"""
+        if not self.open_ears or not self.closed_ears:
+            self.phase = "failed"
+            return
+        open_level = _median(self.open_ears)
+        closed_level = _median(self.closed_ears)
+        if open_level - closed_level < self.MIN_SEPARATION:
+            print(f"EAR calibration failed: open {open_level:.3f}, closed {closed_level:.3f}")
+            self.phase = "failed"
+            return
+        self.open_level = open_level
+        self.closed_level = closed_level
+        self.phase = "done"
+        self.save()
+
+    def thresholds(self):
+        """
+        :return: (close_threshold, open_threshold), or None if not calibrated
+        """
+        if not self.calibrated:
+            return None
+        gap = self.open_level - self.closed_level
+        return (self.closed_level + self.CLOSE_FRACTION * gap,
+                self.closed_level + self.OPEN_FRACTION * gap)
+
+    def apply(self, detector):
+        """Set the detector's thresholds from the baselines, if calibrated"""
+        thresholds = self.thresholds()
+        if thresholds is not None:
+            detector.CLOSE_THRESHOLD, detector.OPEN_THRESHOLD = thresholds
+
+    def profile(self):
+        return {
+            "open_level": round(self.open_level, 4),
+            "closed_level": round(self.closed_level, 4),
+            "open_samples": len(self.open_ears),
+            "closed_samples": len(self.closed_ears),
+        }
+
+    def load(self):
+        try:
+            with open(self.profile_file, "r") as file:
+                profile = json.load(file)
+            self.open_level = profile["open_level"]
+            self.closed_level = profile["closed_level"]
+        except Exception as e:
+            print(f"Error loading EAR calibration: {e}")
+
+    def save(self):
+        """Atomically write the baselines"""
+        if not self.profile_file or not self.calibrated:
+            return
+        temp_filename = self.profile_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.profile_file) or ".", exist_ok=True)
+            with open(temp_filename, "w") as file:
+                json.dump(self.profile(), file, indent=2)
+            os.replace(temp_filename, self.profile_file)
+        except Exception as e:
+            print(f"Error saving EAR calibration: {e}")
+
+
+def _median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
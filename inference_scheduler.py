@@ -0,0 +1,100 @@
+"""
+Adaptive inference rate for BlinkDetector.
+
+FaceMesh is by far the most expensive step per frame. The scheduler keeps
+an exponential average of its cost and compares it to a budget: a
+fraction of the camera's frame interval. While inference fits the budget
+every frame is processed. When it doesn't, the mesh only runs on every
+Nth frame, N being the smallest stride that brings the average back
+within budget, and never less often than max_gap seconds.
+
+A blink lasts 100-400 ms, so skipping is only allowed while the eye is
+clearly open: every frame is processed again as soon as the EAR comes
+near the threshold, falls quickly, or the eye is already closed.
+Skipped frames are still displayed, with the last overlay redrawn.
+"""
+import math
+
+
+class InferenceScheduler:
+    def __init__(self, budget=0.5, frame_interval=1 / 30, max_stride=4, max_gap=0.1,
+                 near_margin=0.05, closing_drop=0.02):
+        """
+        :param budget: Fraction of the frame interval inference may use on
+            average; 1.0 allows a full core at the camera's frame rate
+        :param frame_interval: Seconds between captured frames
+        :param max_stride: Process at least every this many frames
+        :param max_gap: Process at least every this many seconds
+        :param near_margin: EARs below the detector's close threshold plus
+            this margin force every frame
+        :param closing_drop: An EAR drop between processed frames larger than
+            this forces every frame
+        """
+        self.budget = budget
+        self.frame_interval = frame_interval
+        self.max_stride = max_stride
+        self.max_gap = max_gap
+        self.near_margin = near_margin
+        self.closing_drop = closing_drop
+
+        self.cost = None  # exponential average of inference seconds per processed frame
+        self.smoothing = 0.2
+        self.stride = 1
+        self.since_inference = 0  # frames skipped since the last processed one
+        self.last_inference = None
+        self.inferred = 0
+        self.skipped = 0
+
+    def urgent(self, detector):
+        """True if the detector's state requires processing every frame"""
+        if detector.last_ear is None or detector.eye_closed:
+            return True
+        if detector.last_ear < detector.CLOSE_THRESHOLD + self.near_margin:
+            return True
+        history = detector.ear_history
+        return len(history) >= 2 and history[-2] - history[-1] > self.closing_drop
+
+    def should_infer(self, timestamp, detector):
+        """
+        Decide whether to run inference on the frame captured at timestamp
+
+        :param detector: BlinkDetector whose state is consulted
+        """
+        if (self.stride == 1 or self.last_inference is None or self.urgent(detector)
+                or self.since_inference + 1 >= self.stride
+                or timestamp - self.last_inference >= self.max_gap):
+            return True
+        self.since_inference += 1
+        self.skipped += 1
+        return False
+
+    def record(self, cost, timestamp):
+        """
+        Record the cost of a processed frame and adapt the stride
+
+        :param cost: Seconds spent on inference for the frame
+        :param timestamp: Capture time of the frame
+        """
+        if self.cost is None:
+            self.cost = cost
+        else:
+            self.cost += self.smoothing * (cost - self.cost)
+        self.last_inference = timestamp
+        self.since_inference = 0
+        self.inferred += 1
+
+        allowed = self.budget * self.frame_interval
+        stride = math.ceil(self.cost / allowed) if allowed > 0 else 1
+        self.stride = min(self.max_stride, max(1, stride))
+
+    @property
+    def saturated(self):
+        return self.stride > 1
+
+    def stats(self):
+        return {
+            "cost_ms": round((self.cost or 0.0) * 1000, 2),
+            "stride": self.stride,
+            "inferred": self.inferred,
+            "skipped": self.skipped,
+        }
@@ -1,19 +1,54 @@
+import os
 import sys
+import time
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                             QGridLayout, QPushButton, QFrame, QSplitter)
 from PyQt5.QtCore import Qt, QTimer, QSize
-from PyQt5.QtGui import QFont, QPalette, QColor, QIcon
-from camera import Camera
-from cursor import CursorManager
+from PyQt5.QtGui import QFont, QPalette, QColor, QIcon, QPixmap
+from pipeline import PipelineWorker, RemoteBlinkWorker
+from telemetry import Telemetry
+from cursor import CursorManager, KEY_STYLE, SUGGESTION_STYLE
+from scan_timing import ScanScheduler, PRESETS
+from ear_calibration import EarCalibration
+from scan_layout import build_layouts, letter_frequencies
 from word_prediction import WordPredictor
+from learning_journal import LearningJournal
+from suggestion_worker import SuggestionWorker
 from text_to_speech import TextToSpeech  # New import
 
 class LockedInUI(QWidget):
-    def __init__(self):
+    def __init__(self, capture_config=None, service_address=None, service_stream="*"):
+        """
+        Build the UI and start capture
+
+        :param capture_config: CaptureConfig for the camera, see capture.py
+        :param service_address: (host, port) of a detection service to take
+            blinks from instead of running the camera here
+        :param service_stream: Stream of the detection service to follow
+        """
         super().__init__()
 
         self.word_predictor = WordPredictor()
-        self.text_to_speech = TextToSpeech()  # Initialize Text-to-Speech
+        
+        # Learned words and phrases persist across sessions in a crash-safe
+        # journal under EYESPEAK_DATA_DIR
+        self.data_dir = os.environ.get("EYESPEAK_DATA_DIR", os.path.expanduser("~/.eyespeak"))
+        self.learning_journal = LearningJournal(os.path.join(self.data_dir, "learning"))
+        self.learning_journal.restore(self.word_predictor)
+        
+        # Suggestions are computed on a background thread, see update_suggestions
+        self.suggestion_worker = SuggestionWorker(self.word_predictor)
+        self.suggestion_worker.suggestions_ready.connect(self.show_suggestions)
+        self.suggestion_worker.start()
+        # Speaks on its own thread; the most used phrases are pre-rendered
+        # so they play without synthesis delay
+        self.text_to_speech = TextToSpeech(cache_dir=os.path.join(self.data_dir, "audio"))
+        self.text_to_speech.prerender(self.word_predictor.get_phrase_suggestions("", 64))
+        
+        # Hot-path timing; EYESPEAK_TELEMETRY=1 enables it and the overlay,
+        # EYESPEAK_TELEMETRY_LOG names a file for periodic JSON dumps
+        self.telemetry = Telemetry(enabled=os.environ.get("EYESPEAK_TELEMETRY") == "1")
+        self.telemetry_log = os.environ.get("EYESPEAK_TELEMETRY_LOG")
 
         self.setWindowTitle("EyeSpeak - Eye-Controlled Communication")
         self.setGeometry(100, 100, 1000, 700)
@@ -55,7 +90,28 @@ class LockedInUI(QWidget):
             border-radius: 5px;
             font-size: 14px;
         """)
-        main_layout.addWidget(self.status_label, alignment=Qt.AlignRight)
+        
+        # Performance overlay, shown next to the status indicator
+        self.perf_label = QLabel("")
+        self.perf_label.setStyleSheet("""
+            background-color: #2c3e50;
+            color: white;
+            padding: 8px;
+            border-radius: 5px;
+            font-size: 14px;
+            font-family: monospace;
+        """)
+        self.perf_label.setVisible(self.telemetry.enabled)
+        
+        status_layout = QHBoxLayout()
+        status_layout.addStretch(1)
+        status_layout.addWidget(self.perf_label)
+        status_layout.addWidget(self.status_label)
+        main_layout.addLayout(status_layout)
+        
+        # Speech runs in the background; the status shows when it is talking
+        self.text_to_speech.started.connect(self.on_speech_started)
+        self.text_to_speech.finished.connect(self.on_speech_finished)
         
         # Split view for camera and text content
         content_splitter = QSplitter(Qt.Horizontal)
@@ -124,12 +180,7 @@ class LockedInUI(QWidget):
         
         for i in range(3):
             suggestion = QPushButton("")
-            suggestion.setStyleSheet("""
-                background-color: #3498db;
-                color: white;
-                padding: 10px;
-                font-size: 16px;
-            """)
+            suggestion.setStyleSheet(SUGGESTION_STYLE)
             suggestions_layout.addWidget(suggestion)
             self.suggestion_buttons.append(suggestion)
         
@@ -158,45 +209,18 @@ class LockedInUI(QWidget):
         """)
         keyboard_layout = QVBoxLayout(keyboard_frame)
         
-        # Create keyboard grid
-        grid_layout = QGridLayout()
-        grid_layout.setSpacing(10)
-        
-        self.keys = [
-            ['Q', 'W', 'E', 'R', 'T', 'Y', 'U', 'I', 'O', 'P'],
-            ['A', 'S', 'D', 'F', 'G', 'H', 'J', 'K', 'L'],
-            ['Z', 'X', 'C', 'V', 'B', 'N', 'M', '⌫', '␣']
-        ]
+        # Create keyboard grid; the layout can be switched at runtime
+        self.grid_layout = QGridLayout()
+        self.grid_layout.setSpacing(10)
         
+        self.layouts = build_layouts(letter_frequencies(self.word_predictor.word_frequencies))
+        self.layout_name = os.environ.get("EYESPEAK_LAYOUT", "QWERTY")
+        if self.layout_name not in self.layouts:
+            self.layout_name = "QWERTY"
         self.buttons = []
+        self.build_keyboard(self.layouts[self.layout_name])
         
-        for row_idx, row in enumerate(self.keys):
-            btn_row = []
-            for col_idx, key in enumerate(row):
-                btn = QPushButton(key)
-                btn.setFixedSize(65, 65)
-                
-                # Style based on key type
-                if key in ['⌫', '␣']:
-                    btn.setStyleSheet("""
-                        background-color: #e74c3c;
-                        color: white;
-                        font-size: 20px;
-                        border-radius: 10px;
-                    """)
-                else:
-                    btn.setStyleSheet("""
-                        background-color: #3498db;
-                        color: white;
-                        font-size: 20px;
-                        border-radius: 10px;
-                    """)
-                
-                grid_layout.addWidget(btn, row_idx, col_idx)
-                btn_row.append(btn)
-            self.buttons.append(btn_row)
-        
-        keyboard_layout.addLayout(grid_layout)
+        keyboard_layout.addLayout(self.grid_layout)
         main_layout.addWidget(keyboard_frame)
         
         # Controls area
@@ -237,8 +261,29 @@ class LockedInUI(QWidget):
         self.speed_fast_btn.clicked.connect(self.set_speed_fast)
         controls_layout.addWidget(self.speed_fast_btn)
         
+        self.speed_adaptive_btn = QPushButton("Adaptive")
+        self.speed_adaptive_btn.setStyleSheet("""
+            background-color: #2c3e50;
+            color: white;
+            padding: 8px 15px;
+            border-radius: 5px;
+        """)
+        self.speed_adaptive_btn.clicked.connect(self.set_speed_adaptive)
+        controls_layout.addWidget(self.speed_adaptive_btn)
+        
+        # Cycles through the keyboard layouts
+        self.layout_btn = QPushButton(f"Layout: {self.layout_name}")
+        self.layout_btn.setStyleSheet("""
+            background-color: #8e44ad;
+            color: white;
+            padding: 8px 15px;
+            border-radius: 5px;
+        """)
+        self.layout_btn.clicked.connect(self.next_layout)
+        controls_layout.addWidget(self.layout_btn)
+        
         # Add current speed indicator
-        self.speed_indicator = QLabel("Current Speed: 2s")
+        self.speed_indicator = QLabel("")
         self.speed_indicator.setStyleSheet("""
             background-color: #3498db;
             color: white;
@@ -294,51 +339,191 @@ class LockedInUI(QWidget):
         volume_up_btn.clicked.connect(self.increase_volume)
         controls_layout.addWidget(volume_up_btn)
         
+        # Learns the user's open and closed EAR; needs the local camera
+        self.calibrate_btn = QPushButton("Calibrate")
+        self.calibrate_btn.setStyleSheet("""
+            background-color: #8e44ad;
+            color: white;
+            padding: 8px 15px;
+            border-radius: 5px;
+        """)
+        self.calibrate_btn.clicked.connect(self.start_calibration)
+        controls_layout.addWidget(self.calibrate_btn)
+        
         main_layout.addLayout(controls_layout)
         
         self.setLayout(main_layout)
         
-        # Initialize camera and cursor manager
-        self.camera = Camera(self.camera_label, self.on_blink_detected)
-        self.cursor = CursorManager(self.buttons, self.suggestion_buttons, self.update_generated_text)
-        
-        # Set medium speed as default (highlighted)
-        self.update_speed_buttons("medium")
-        
-        # Camera timer for updating feed
-        self.camera_timer = QTimer()
-        self.camera_timer.timeout.connect(self.update_camera_feed)
-        self.camera_timer.start(30)  # Update at 30ms intervals for smooth video
+        # Initialize capture pipeline and cursor manager; with a detection
+        # service, only blink events are received and no frames are shown
+        if service_address is not None:
+            self.pipeline = RemoteBlinkWorker(service_address, service_stream, self.telemetry)
+            self.pipeline.connection_changed.connect(self.on_service_connection)
+            self.on_service_connection(False)
+        else:
+            self.pipeline = PipelineWorker(self.camera_label, self.telemetry, capture_config)
+        self.camera = self.pipeline.camera
+        # Scan timing is kept per user; EYESPEAK_USER selects the profile
+        user = os.environ.get("EYESPEAK_USER", "default")
+        self.scan_scheduler = ScanScheduler(os.path.join(self.data_dir, "profiles", f"{user}.json"))
+        # So are the blink thresholds, once the user has calibrated
+        self.ear_calibration = EarCalibration(os.path.join(self.data_dir, "profiles", f"{user}_ear.json"))
+        if self.camera is not None:
+            self.ear_calibration.apply(self.camera.blink_detector)
+        self.calibrate_btn.setEnabled(self.camera is not None)
+        self.calibration_phase = None
+        self.calibration_timer = QTimer()
+        self.calibration_timer.timeout.connect(self.check_calibration)
+        self.cursor = CursorManager(self.buttons, self.suggestion_buttons, self.update_generated_text,
+                                    self.scan_scheduler, self.telemetry)
+        
+        # Highlight the profile's speed (medium by default)
+        self.show_scan_speed()
+        
+        # Capture and blink inference run on the worker thread; frames and
+        # blinks arrive here as queued signals
+        self.pipeline.frame_ready.connect(self.update_camera_feed)
+        self.pipeline.blink_detected.connect(self.on_blink_detected)
+        self.pipeline.start()
+        
+        # Refresh the performance overlay and dump telemetry periodically
+        if self.telemetry.enabled:
+            self.perf_timer = QTimer()
+            self.perf_timer.timeout.connect(self.update_perf_overlay)
+            self.perf_timer.start(500)
+            self.telemetry_timer = QTimer()
+            self.telemetry_timer.timeout.connect(lambda: self.telemetry.dump(self.telemetry_log))
+            self.telemetry_timer.start(60000)
         
         # Word suggestion placeholders (would be replaced with actual algorithm)
         self.suggestion_buttons[0].setText("Hello")
         self.suggestion_buttons[1].setText("Thank you")
         self.suggestion_buttons[2].setText("I need")
 
+    def build_keyboard(self, layout):
+        """
+        Replace the keyboard buttons with a new layout
+
+        :param layout: Rows of key labels, see scan_layout.py
+        """
+        for row in self.buttons:
+            for btn in row:
+                self.grid_layout.removeWidget(btn)
+                btn.deleteLater()
+        
+        self.keys = layout
+        self.buttons = []
+        for row_idx, row in enumerate(self.keys):
+            btn_row = []
+            for col_idx, key in enumerate(row):
+                btn = QPushButton(key)
+                btn.setFixedSize(65, 65)
+                
+                # Style based on key type; the cursor highlights keys
+                # through the scan property, keeping these colours
+                if key in ['⌫', '␣']:
+                    btn.setProperty("keyType", "action")
+                btn.setStyleSheet(KEY_STYLE)
+                
+                self.grid_layout.addWidget(btn, row_idx, col_idx)
+                btn_row.append(btn)
+            self.buttons.append(btn_row)
+    
+    def next_layout(self):
+        """Switch to the next keyboard layout"""
+        names = list(self.layouts)
+        self.layout_name = names[(names.index(self.layout_name) + 1) % len(names)]
+        self.build_keyboard(self.layouts[self.layout_name])
+        self.cursor.set_buttons(self.buttons)
+        self.layout_btn.setText(f"Layout: {self.layout_name}")
+        print(f"Layout changed to {self.layout_name}")
+    
     def speak_generated_text(self):
         """Convert generated text to speech"""
         text = self.generated_text_label.text().strip()
         if text:
             self.text_to_speech.speak(text)
+            # Spoken text is learned, so it is suggested sooner next time
+            self.word_predictor.add_phrase(text)
+            # and rendered in the background, so repeating it is instant
+            self.text_to_speech.prerender([text])
+    
+    def on_speech_started(self, utterance_id, text):
+        self.status_label.setText("Blink Detection: Active | Speaking")
+    
+    def on_speech_finished(self, utterance_id, completed):
+        if not self.text_to_speech.speaking:
+            self.status_label.setText("Blink Detection: Active")
     
     def increase_volume(self):
         """Increase speech volume"""
-        current_volume = self.text_to_speech.engine.getProperty('volume')
+        current_volume = self.text_to_speech.volume
         new_volume = min(1.0, current_volume + 0.1)
         self.text_to_speech.set_volume(new_volume)
         print(f"Volume increased to {new_volume:.1f}")
     
     def decrease_volume(self):
         """Decrease speech volume"""
-        current_volume = self.text_to_speech.engine.getProperty('volume')
+        current_volume = self.text_to_speech.volume
         new_volume = max(0.0, current_volume - 0.1)
         self.text_to_speech.set_volume(new_volume)
         print(f"Volume decreased to {new_volume:.1f}")
 
     def update_camera_feed(self):
-        frame = self.camera.get_frame()
-        if frame:
-            self.camera_label.setPixmap(frame)
+        item = self.pipeline.frames.get()
+        if item is None:
+            return
+        image, captured_at, _ = item
+        started = self.telemetry.start()
+        # fromImage copies the pixels, so the buffer behind image can be reused
+        self.camera_label.setPixmap(QPixmap.fromImage(image))
+        self.pipeline.release_frame(item)
+        self.telemetry.stop("render", started)
+        if self.telemetry.enabled:
+            self.telemetry.record("capture_to_display", time.perf_counter() - captured_at)
+            self.telemetry.frame()
+
+    def on_service_connection(self, connected):
+        host, port = self.pipeline.address
+        state = "Connected to" if connected else "Waiting for"
+        self.camera_label.setText(f"{state} detection service\n{host}:{port}, stream {self.pipeline.stream}")
+
+    def start_calibration(self):
+        """Calibrate the blink thresholds; prompts are shown and spoken"""
+        if self.camera is None or self.ear_calibration.active:
+            return
+        self.calibration_phase = None
+        # Closing the eyes on purpose must not select anything
+        self.cursor.suspend()
+        self.camera.blink_detector.calibrate(self.ear_calibration)
+        self.calibration_timer.start(100)
+
+    def check_calibration(self):
+        """Follow the calibration running on the capture thread"""
+        if self.ear_calibration.expire():
+            # No face long enough to finish; stop feeding the detector's samples
+            self.camera.blink_detector.calibration = None
+        phase = self.ear_calibration.phase
+        if phase == self.calibration_phase:
+            return
+        self.calibration_phase = phase
+        prompts = {
+            "open": "Keep your eyes open",
+            "closed": "Now close your eyes",
+            "done": "Open your eyes. Calibration complete",
+            "failed": "Calibration failed, please try again",
+        }
+        self.blink_indicator.setText(prompts[phase])
+        self.text_to_speech.speak(prompts[phase], interrupt=True)
+        if not self.ear_calibration.active:
+            self.calibration_timer.stop()
+            self.cursor.resume()
+            thresholds = self.ear_calibration.thresholds()
+            if phase == "done" and thresholds is not None:
+                print(f"EAR thresholds: close {thresholds[0]:.3f}, open {thresholds[1]:.3f}")
+
+    def update_perf_overlay(self):
+        self.perf_label.setText(self.telemetry.overlay_text())
 
     def update_generated_text(self, letter):
         current_text = self.generated_text_label.text()
@@ -363,53 +548,41 @@ class LockedInUI(QWidget):
         # Reset after 1 second
         QTimer.singleShot(1000, self.reset_blink_indicator)
         
-        # Update suggestions (placeholder - would be replaced with actual prediction)
+        # Update suggestions: completions while a word is being typed,
+        # next-word predictions after a space
         if current_text:
-            words = current_text.split(" ")
-            last_word = words[-1] if words else ""
-            
-            # Simple placeholder suggestions
-            if last_word:
-                self.update_suggestions(last_word)
+            self.update_suggestions(current_text)
 
     def update_suggestions(self, current_text):
         if current_text:
-            words = current_text.split(" ")
-            last_word = words[-1] if words else ""
+            # Get word completion, next word, and phrase suggestions in the
+            # background; the full text gives the n-gram model its context
+            self.suggestion_worker.request(current_text)
 
-            # Get word completion, next word, and phrase suggestions
-            completions, next_words, phrases = self.word_predictor.get_suggestions(last_word)
+    def show_suggestions(self, generation, current_text, results):
+        # A newer request is pending; these suggestions are out of date
+        if not self.suggestion_worker.is_current(generation):
+            return
+        completions, next_words, phrases = results
+        # Choose up to 3 suggestions from the available lists
+        suggestions = completions + next_words + phrases
+        suggestions = suggestions[:3]  # Keep only the top 3 suggestions
 
-            # Choose up to 3 suggestions from the available lists
-            suggestions = completions + next_words + phrases
-            suggestions = suggestions[:3]  # Keep only the top 3 suggestions
-
-            suggestion_available = False
-            for i, suggestion in enumerate(self.suggestion_buttons):
-                if i < len(suggestions):
-                    suggestion.setText(suggestions[i])
-                    suggestion.setEnabled(True)
-                    suggestion.setStyleSheet("""
-                        background-color: #3498db;
-                        color: white;
-                        padding: 10px;
-                        font-size: 16px;
-                    """)
-                    suggestion_available = True
-                else:
-                    suggestion.setText("")
-                    suggestion.setEnabled(False)
-                    suggestion.setStyleSheet("""
-                        background-color: #95a5a6;
-                        color: white;
-                        padding: 10px;
-                        font-size: 16px;
-                    """)
+        suggestion_available = False
+        for i, suggestion in enumerate(self.suggestion_buttons):
+            if i < len(suggestions):
+                suggestion.setText(suggestions[i])
+                suggestion.setEnabled(True)  # SUGGESTION_STYLE greys out disabled buttons
+                suggestion_available = True
+            else:
+                suggestion.setText("")
+                suggestion.setEnabled(False)
+        
+        # If suggestions are available, start suggestion scanning, unless
+        # the user just chose one and was sent back to the keyboard
+        if suggestion_available and not self.cursor.stay_on_keyboard:
+            self.cursor.start_suggestion_scanning()
             
-            # If suggestions are available, start suggestion scanning
-            if suggestion_available:
-                self.cursor.start_suggestion_scanning()
-                
     def reset_blink_indicator(self):
         self.blink_indicator.setText("Waiting for blink...")
         self.blink_indicator.setStyleSheet("""
@@ -420,33 +593,48 @@ class LockedInUI(QWidget):
             font-size: 14px;
         """)
 
-    def on_blink_detected(self):
-        self.cursor.blink_detected()
+    def on_blink_detected(self, event=None):
+        if event is not None and self.telemetry.enabled:
+            self.telemetry.record("blink_to_ui", time.perf_counter() - event.captured_at)
+            self.telemetry.record("closure_to_ui", event.age())
+        self.cursor.blink_detected(event)
+        if self.scan_scheduler.adaptive:
+            self.show_scan_speed()
         
     def clear_text(self):
         self.generated_text_label.setText("")
         
     # Speed control methods
     def set_speed_slow(self):
-        self.cursor.timer.stop()
-        self.cursor.timer.start(3000)  # 3 seconds
-        self.update_speed_buttons("slow")
-        self.speed_indicator.setText("Current Speed: 3s")
-        print("Speed changed to slow (3s)")
+        self.set_fixed_speed("slow")
         
     def set_speed_medium(self):
-        self.cursor.timer.stop()
-        self.cursor.timer.start(2000)  # 2 seconds
-        self.update_speed_buttons("medium")
-        self.speed_indicator.setText("Current Speed: 2s")
-        print("Speed changed to medium (2s)")
+        self.set_fixed_speed("medium")
         
     def set_speed_fast(self):
-        self.cursor.timer.stop()
-        self.cursor.timer.start(1000)  # 1 second
-        self.update_speed_buttons("fast")
-        self.speed_indicator.setText("Current Speed: 1s")
-        print("Speed changed to fast (1s)")
+        self.set_fixed_speed("fast")
+    
+    def set_fixed_speed(self, preset):
+        self.scan_scheduler.set_fixed(PRESETS[preset])
+        self.cursor.restart()
+        self.show_scan_speed()
+        print(f"Speed changed to {preset} ({PRESETS[preset]:g}s)")
+    
+    def set_speed_adaptive(self):
+        self.scan_scheduler.set_adaptive()
+        self.show_scan_speed()
+        print("Speed changed to adaptive")
+    
+    def show_scan_speed(self):
+        """Update the speed buttons and indicator from the scan scheduler"""
+        dwell = self.scan_scheduler.base_dwell
+        if self.scan_scheduler.adaptive:
+            self.update_speed_buttons("adaptive")
+            self.speed_indicator.setText(f"Current Speed: {dwell:.1f}s (adaptive)")
+        else:
+            preset = next((name for name, seconds in PRESETS.items() if seconds == dwell), None)
+            self.update_speed_buttons(preset)
+            self.speed_indicator.setText(f"Current Speed: {dwell:g}s")
         
     def update_speed_buttons(self, active):
         # Reset all button styles
@@ -468,6 +656,7 @@ class LockedInUI(QWidget):
         self.speed_slow_btn.setStyleSheet(base_style)
         self.speed_medium_btn.setStyleSheet(base_style)
         self.speed_fast_btn.setStyleSheet(base_style)
+        self.speed_adaptive_btn.setStyleSheet(base_style)
         
         # Highlight active button
         if active == "slow":
@@ -476,6 +665,8 @@ class LockedInUI(QWidget):
             self.speed_medium_btn.setStyleSheet(active_style)
         elif active == "fast":
             self.speed_fast_btn.setStyleSheet(active_style)
+        elif active == "adaptive":
+            self.speed_adaptive_btn.setStyleSheet(active_style)
 
     def apply_suggestion(self):
         sender = self.sender()  # Get the button that was clicked
@@ -507,8 +698,13 @@ class LockedInUI(QWidget):
             self.update_suggestions(new_text)
             
     def closeEvent(self, event):
-        self.camera.release_camera()
-        self.camera_timer.stop()
+        self.pipeline.stop()
+        self.suggestion_worker.stop()
+        self.learning_journal.close()
+        self.scan_scheduler.save()
+        self.text_to_speech.shutdown()
+        if self.telemetry.enabled:
+            self.telemetry.dump(self.telemetry_log)
         event.accept()
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+"""
+Crash-safe, incremental persistence for WordPredictor learning.
+
+Every learn_from_text/add_phrase call is appended to a newline-delimited
+JSON journal instead of rewriting the whole model. Appends are flushed
+immediately and fsync'd in batches. Once enough entries accumulate, the model
+is frozen (a cheap copy-on-write capture), and a background thread builds
+and writes a full snapshot from it and drops the journal segments it
+covers. On startup the snapshot is loaded and any newer segments are
+replayed.
+
+Directory layout:
+    snapshot.json          last compacted model, with the segment it covers
+    journal-000001.ndjson  journal segments, replayed in order
+"""
+import json
+import os
+import re
+import threading
+import time
+from word_prediction import write_custom_data
+
+_SEGMENT_PATTERN = re.compile(r"journal-(\d+)\.ndjson$")
+
+
+class LearningJournal:
+    def __init__(self, directory, sync_every=8, sync_interval=5.0, compact_every=500):
+        """
+        Initialize the journal
+
+        :param directory: Directory holding the snapshot and journal segments
+        :param sync_every: fsync after this many unsynced entries
+        :param sync_interval: fsync when the oldest unsynced entry is this many
+            seconds old
+        :param compact_every: Start a background snapshot after this many entries
+        """
+        self.directory = directory
+        self.snapshot_file = os.path.join(directory, "snapshot.json")
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+
+        self.predictor = None
+        self._file = None
+        self._segment = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._since_compaction = 0
+        self._compaction = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"journal-{number:06d}.ndjson")
+
+    def _segments(self):
+        """Return the existing segment numbers, in order"""
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_PATTERN.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def restore(self, predictor):
+        """
+        Load the snapshot and replay newer journal segments into predictor,
+        then start journaling its changes
+
+        :param predictor: WordPredictor to restore into
+        """
+        covered = 0
+        if os.path.exists(self.snapshot_file):
+            try:
+                with open(self.snapshot_file, "r") as file:
+                    data = json.load(file)
+                predictor.load_custom_data(data)
+                covered = data.get("journal_segment", 0)
+            except Exception as e:
+                print(f"Error loading learning snapshot: {e}")
+
+        segments = []
+        replayed = 0
+        for number in self._segments():
+            path = self._segment_path(number)
+            if number > covered and os.path.getsize(path) == 0:
+                # Left by a session that learned nothing; its number is reused
+                os.remove(path)
+                continue
+            segments.append(number)
+            if number > covered:
+                replayed += self._replay(path, predictor)
+
+        # Always start a fresh segment, so appends never follow a torn line
+        self._segment = max(segments + [covered]) + 1
+        self._file = open(self._segment_path(self._segment), "a")
+        self._since_compaction = replayed
+        self.predictor = predictor
+        predictor.journal = self
+        if replayed:
+            print(f"Replayed {replayed} learning journal entries")
+
+    def _replay(self, path, predictor):
+        count = 0
+        with open(path, "r") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append; nothing follows it
+                    break
+                if entry.get("op") == "learn":
+                    predictor.learn_from_text(entry["text"])
+                elif entry.get("op") == "phrase":
+                    predictor.add_phrase(entry["text"])
+                count += 1
+        return count
+
+    def record(self, op, text):
+        """
+        Append one entry; called by WordPredictor with its lock held
+
+        :param op: "learn" or "phrase"
+        :param text: Text passed to learn_from_text or add_phrase
+        """
+        if self._file is None:
+            return
+        try:
+            self._file.write(json.dumps({"op": op, "text": text, "time": time.time()}) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if (self._unsynced >= self.sync_every or
+                    time.monotonic() - self._last_sync >= self.sync_interval):
+                self.sync()
+        except Exception as e:
+            print(f"Error writing learning journal: {e}")
+
+        self._since_compaction += 1
+        if self._since_compaction >= self.compact_every:
+            self.compact()
+
+    def sync(self):
+        """fsync pending journal entries"""
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def compact(self, wait=False):
+        """
+        Snapshot the model in the background and drop the segments it covers
+
+        :param wait: Block until the snapshot is written
+        """
+        if self.predictor is None or (self._compaction is not None and self._compaction.is_alive()):
+            return
+
+        # Rotate under the model lock so the snapshot covers exactly the
+        # closed segments; building and serializing happen off this thread
+        with self.predictor.lock:
+            self.sync()
+            self._file.close()
+            covered = self._segment
+            self._segment += 1
+            self._file = open(self._segment_path(self._segment), "a")
+            self._since_compaction = 0
+            frozen = self.predictor.freeze()
+
+        self._compaction = threading.Thread(target=self._write_snapshot, args=(frozen, covered),
+                                            daemon=True)
+        self._compaction.start()
+        if wait:
+            self._compaction.join()
+
+    def _write_snapshot(self, frozen, covered):
+        data = self.predictor.custom_data(frozen)
+        data["journal_segment"] = covered
+        if not write_custom_data(data, self.snapshot_file):
+            return
+        for number in self._segments():
+            if number <= covered:
+                try:
+                    os.remove(self._segment_path(number))
+                except OSError as e:
+                    print(f"Error removing journal segment: {e}")
+
+    def close(self):
+        """Sync and close the journal, waiting for any running snapshot"""
+        if self._compaction is not None:
+            self._compaction.join()
+        if self.predictor is not None:
+            with self.predictor.lock:
+                self.predictor.journal = None
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
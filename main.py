@@ -1,9 +1,47 @@
+import argparse
 import sys
 from PyQt5.QtWidgets import QApplication
+from capture import BACKENDS, CaptureConfig
+from detection_service import parse_address
 from interface import LockedInUI
 
+
+def parse_capture_args(argv):
+    """
+    Parse capture and detection service options; anything else is left for Qt
+
+    :return: (CaptureConfig, service (host, port) or None, service stream,
+        remaining arguments)
+    """
+    parser = argparse.ArgumentParser(description="EyeSpeak - eye-controlled communication")
+    parser.add_argument("--device", type=int, default=0, help="Camera index")
+    parser.add_argument("--source", help="Video file to run on instead of a camera")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="any", help="Capture backend")
+    parser.add_argument("--width", type=int, help="Requested frame width")
+    parser.add_argument("--height", type=int, help="Requested frame height")
+    parser.add_argument("--fps", type=float, help="Requested frame rate (playback rate for files)")
+    parser.add_argument("--fourcc", help="Requested pixel format, e.g. MJPG or YUYV")
+    parser.add_argument("--buffer-size", type=int, default=1, help="Frames the driver may queue")
+    parser.add_argument("--no-latest-frame", action="store_true",
+                        help="Don't drain queued frames to always process the newest one")
+    parser.add_argument("--loop", action="store_true", help="Restart the video file when it ends")
+    parser.add_argument("--service", metavar="HOST:PORT",
+                        help="Take blinks from detection_service.py instead of a local camera")
+    parser.add_argument("--stream", default="*", help="Detection service stream to follow")
+    args, remaining = parser.parse_known_args(argv[1:])
+
+    config = CaptureConfig(
+        source=args.source if args.source else args.device,
+        backend="file" if args.source and args.backend == "any" else args.backend,
+        width=args.width, height=args.height, fps=args.fps, fourcc=args.fourcc,
+        buffer_size=args.buffer_size, latest_frame=not args.no_latest_frame, loop=args.loop)
+    service = parse_address(args.service) if args.service else None
+    return config, service, args.stream, argv[:1] + remaining
+
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = LockedInUI()
+    capture_config, service_address, service_stream, qt_args = parse_capture_args(sys.argv)
+    app = QApplication(qt_args)
+    window = LockedInUI(capture_config, service_address, service_stream)
     window.show()
     sys.exit(app.exec_())
@@ -0,0 +1,83 @@
+"""
+Small LRU/TTL memo table for WordPredictor queries.
+
+Entries are grouped by what they depend on, e.g. the prefix of a word
+completion query, so a change to the model can drop exactly the groups it
+affects. Each group holds results for one or more variants of the query,
+such as different max_suggestions values.
+"""
+import time
+from collections import OrderedDict
+
+
+class MemoCache:
+    def __init__(self, max_groups=512, ttl=600.0):
+        """
+        Initialize an empty cache
+
+        :param max_groups: Number of groups kept before the least recently used is dropped
+        :param ttl: Seconds a group stays valid, or None to keep groups until invalidated
+        """
+        self.max_groups = max_groups
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._groups = OrderedDict()  # group -> (created, {variant: value})
+
+    def __len__(self):
+        return len(self._groups)
+
+    def __iter__(self):
+        return iter(list(self._groups))
+
+    def get(self, group, variant=None):
+        """
+        Look up a memoized value
+
+        :return: The value, or None on a miss
+        """
+        entry = self._groups.get(group)
+        if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+            del self._groups[group]
+            entry = None
+        if entry is None or variant not in entry[1]:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._groups.move_to_end(group)
+        return entry[1][variant]
+
+    def put(self, group, variant, value):
+        entry = self._groups.get(group)
+        if entry is None:
+            entry = self._groups[group] = (time.monotonic(), {})
+            if len(self._groups) > self.max_groups:
+                self._groups.popitem(last=False)
+        else:
+            self._groups.move_to_end(group)
+        entry[1][variant] = value
+
+    def invalidate(self, group):
+        if self._groups.pop(group, None) is not None:
+            self.invalidations += 1
+
+    def invalidate_where(self, predicate):
+        """Drop every group for which predicate(group) is true"""
+        for group in [group for group in self._groups if predicate(group)]:
+            del self._groups[group]
+            self.invalidations += 1
+
+    def clear(self):
+        self.invalidations += len(self._groups)
+        self._groups.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'invalidations': self.invalidations,
+            'groups': len(self._groups),
+        }
@@ -0,0 +1,152 @@
+"""
+Count-based bigram/trigram store for next-word prediction.
+
+Words are interned to integer ids and every context keeps a counter of the
+words that followed it. Trigram contexts are packed into a single integer
+key. The top-k continuations of a context are computed on first use and
+cached until that context changes. freeze() hands a consistent copy to
+another thread without copying every counter: counters are shared until
+they next change.
+"""
+import heapq
+
+
+class NgramModel:
+    def __init__(self, top_k=8):
+        """
+        Initialize an empty model
+
+        :param top_k: Number of continuations cached per context
+        """
+        self.top_k = top_k
+        self._ids = {}
+        self._words = []
+        self._bigrams = {}   # context id -> {next id: count}
+        self._trigrams = {}  # packed (id1, id2) -> {next id: count}
+        self._top = {}       # (order, context key) -> cached [next id, ...]
+        self._owned = None   # (order, context key) of counters not shared with a frozen copy;
+                             # None if the model was never frozen
+
+    def intern(self, word):
+        """Return the integer id for a word, assigning one if needed"""
+        word_id = self._ids.get(word)
+        if word_id is None:
+            word_id = self._ids[word] = len(self._words)
+            self._words.append(word)
+        return word_id
+
+    def _key(self, context):
+        """Map a context tuple to (table, key), or (None, None) if unseen"""
+        ids = []
+        for word in context:
+            word_id = self._ids.get(word)
+            if word_id is None:
+                return None, None
+            ids.append(word_id)
+        if len(ids) == 1:
+            return self._bigrams, ids[0]
+        return self._trigrams, (ids[0] << 32) | ids[1]
+
+    def _counts_for(self, context):
+        """Return the mutable counter for a context, creating it if needed"""
+        ids = [self.intern(word) for word in context]
+        if len(ids) == 1:
+            table, key = self._bigrams, ids[0]
+        else:
+            table, key = self._trigrams, (ids[0] << 32) | ids[1]
+
+        # Any change to the counter invalidates its cached top-k
+        cache_key = (len(ids), key)
+        self._top.pop(cache_key, None)
+        counts = table.get(key)
+        if counts is None:
+            counts = table[key] = {}
+        elif self._owned is not None and cache_key not in self._owned:
+            # Still shared with a frozen copy; copy it before changing it
+            counts = table[key] = dict(counts)
+        if self._owned is not None:
+            self._owned.add(cache_key)
+        return counts
+
+    def add(self, context, next_word, count=1):
+        """
+        Add to the count of next_word following context
+
+        :param context: Tuple of one (bigram) or two (trigram) words
+        :param next_word: Word that followed the context
+        :param count: Amount to add
+        """
+        counts = self._counts_for(context)
+        next_id = self.intern(next_word)
+        counts[next_id] = counts.get(next_id, 0) + count
+
+    def set_count(self, context, next_word, count):
+        """Set the count of next_word following context"""
+        counts = self._counts_for(context)
+        counts[self.intern(next_word)] = count
+
+    def add_sequence(self, words):
+        """Count every bigram and trigram in a sequence of words"""
+        for i in range(1, len(words)):
+            self.add((words[i - 1],), words[i])
+            if i >= 2:
+                self.add((words[i - 2], words[i - 1]), words[i])
+
+    def count(self, context, next_word):
+        table, key = self._key(context)
+        next_id = self._ids.get(next_word)
+        if table is None or next_id is None:
+            return 0
+        return table.get(key, {}).get(next_id, 0)
+
+    def continuations(self, context, max_results):
+        """
+        Return the most frequent words seen after context
+
+        :param context: Tuple of one or two words
+        :param max_results: Maximum number of words to return
+        :return: Words, most frequent first, ties broken alphabetically
+        """
+        table, key = self._key(context)
+        if table is None or key not in table:
+            return []
+
+        cache_key = (len(context), key)
+        top = self._top.get(cache_key)
+        if top is None or (len(top) < max_results and len(top) < len(table[key])):
+            size = max(self.top_k, max_results)
+            counts, words = table[key], self._words
+            top = heapq.nsmallest(size, counts, key=lambda next_id: (-counts[next_id], words[next_id]))
+            self._top[cache_key] = top
+        return [self._words[next_id] for next_id in top[:max_results]]
+
+    def freeze(self):
+        """
+        Return a copy that later changes to this model don't affect
+
+        Only the tables are copied; the counters stay shared until this model
+        next changes them, so freezing is cheap even for large models. The
+        copy may be read from another thread but must not be modified.
+
+        :return: Frozen NgramModel
+        """
+        frozen = NgramModel(self.top_k)
+        frozen._ids = dict(self._ids)
+        frozen._words = list(self._words)
+        frozen._bigrams = dict(self._bigrams)
+        frozen._trigrams = dict(self._trigrams)
+        self._owned = set()
+        return frozen
+
+    def items(self):
+        """
+        Iterate over every context and its continuation counts
+
+        :return: Iterator of (context tuple, {next word: count})
+        """
+        words = self._words
+        for key, counts in self._bigrams.items():
+            yield (words[key],), {words[i]: c for i, c in counts.items()}
+        for key, counts in self._trigrams.items():
+            yield ((words[key >> 32], words[key & 0xFFFFFFFF]),
+                   {words[i]: c for i, c in counts.items()})
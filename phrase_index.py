@@ -0,0 +1,146 @@
+"""
+Indexed phrase matcher for phrase suggestions.
+
+Lowercase forms are computed once when a phrase is added. Starts-with
+matches come from a sorted list searched with bisect, word-start matches
+from a sorted token list mapped to phrase ids, and other substring matches
+from a character-trigram inverted index. Within each kind of match,
+phrases are ranked by how often they were used, then by insertion order.
+"""
+import heapq
+from bisect import bisect_left, insort
+
+_MAX_CHAR = "\U0010ffff"
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PhraseIndex:
+    def __init__(self):
+        self.phrases = []      # original phrases, in insertion order
+        self._lower = []       # lowercase form of each phrase
+        self._usage = []       # usage count of each phrase
+        self._ids = {}         # phrase -> id
+        self._sorted = []      # sorted (lowercase phrase, id) for prefix matches
+        self._tokens = {}      # lowercase token -> set of ids
+        self._sorted_tokens = []
+        self._trigrams = {}    # character trigram -> set of ids
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def __contains__(self, phrase):
+        return phrase in self._ids
+
+    def __iter__(self):
+        return iter(self.phrases)
+
+    def add(self, phrase, usage=0):
+        """
+        Add a phrase to the index
+
+        :param phrase: Phrase to add
+        :param usage: Initial usage count
+        :return: True if the phrase was new
+        """
+        if phrase in self._ids:
+            return False
+
+        phrase_id = len(self.phrases)
+        lower = phrase.lower()
+        self.phrases.append(phrase)
+        self._lower.append(lower)
+        self._usage.append(usage)
+        self._ids[phrase] = phrase_id
+        insort(self._sorted, (lower, phrase_id))
+
+        for token in set(lower.split()):
+            ids = self._tokens.get(token)
+            if ids is None:
+                ids = self._tokens[token] = set()
+                insort(self._sorted_tokens, token)
+            ids.add(phrase_id)
+
+        for trigram in _trigrams(lower):
+            self._trigrams.setdefault(trigram, set()).add(phrase_id)
+        return True
+
+    def record_use(self, phrase, count=1):
+        """Increase a phrase's usage count, which raises its ranking"""
+        phrase_id = self._ids.get(phrase)
+        if phrase_id is not None:
+            self._usage[phrase_id] += count
+
+    def set_usage(self, phrase, count):
+        phrase_id = self._ids.get(phrase)
+        if phrase_id is not None:
+            self._usage[phrase_id] = count
+
+    def usage(self, phrase):
+        phrase_id = self._ids.get(phrase)
+        return 0 if phrase_id is None else self._usage[phrase_id]
+
+    def usage_counts(self):
+        """Return the usage count of every phrase, in insertion order"""
+        return list(self._usage)
+
+    def _rank(self, ids, count, exclude=()):
+        usage = self._usage
+        candidates = (i for i in ids if i not in exclude)
+        return heapq.nsmallest(count, candidates, key=lambda i: (-usage[i], i))
+
+    def _prefix_ids(self, text):
+        start = bisect_left(self._sorted, (text,))
+        end = bisect_left(self._sorted, (text + _MAX_CHAR,))
+        return [phrase_id for _, phrase_id in self._sorted[start:end]]
+
+    def _word_start_ids(self, text):
+        words = text.split()
+        if not words:
+            return []
+        first = words[0]
+        # Tokens starting with the query's first word locate candidates
+        start = bisect_left(self._sorted_tokens, first)
+        end = bisect_left(self._sorted_tokens, first + _MAX_CHAR)
+        candidates = set()
+        for token in self._sorted_tokens[start:end]:
+            candidates |= self._tokens[token]
+        needle = " " + text
+        return [i for i in candidates if needle in " " + self._lower[i]]
+
+    def _substring_ids(self, text):
+        if len(text) < 3:
+            return []
+        candidates = None
+        for trigram in _trigrams(text):
+            ids = self._trigrams.get(trigram)
+            if not ids:
+                return []
+            candidates = set(ids) if candidates is None else candidates & ids
+        return [i for i in candidates if text in self._lower[i]]
+
+    def search(self, partial_text, max_results):
+        """
+        Find phrases matching partial_text
+
+        Phrases starting with the text come first, then phrases with a
+        word starting with it, then phrases containing it anywhere.
+        Substring matches need at least three characters.
+
+        :return: Phrases, best match first
+        """
+        if not partial_text:
+            return [self.phrases[i] for i in self._rank(range(len(self.phrases)), max_results)]
+
+        text = partial_text.lower()
+        results = []
+        seen = set()
+        for finder in (self._prefix_ids, self._word_start_ids, self._substring_ids):
+            if len(results) >= max_results:
+                break
+            ranked = self._rank(finder(text), max_results - len(results), seen)
+            results.extend(ranked)
+            seen.update(ranked)
+        return [self.phrases[i] for i in results]
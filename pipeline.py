@@ -0,0 +1,169 @@
+import json
+import socket
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+from blink_detector import BlinkEvent
+from camera import Camera
+
+
+class FrameQueue:
+    """
+    Bounded "latest frame wins" hand-off between the capture worker and the UI.
+
+    Holds at most one pending item. Putting a new item replaces any item the
+    consumer has not picked up yet, so the consumer always sees the freshest
+    frame and the producer never blocks.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._item = None
+        self.dropped = 0
+
+    def put(self, item):
+        """
+        Store an item, replacing any unconsumed one
+
+        :param item: Item to publish
+        :return: The replaced item, or None if the slot was empty
+        """
+        with self._lock:
+            replaced = self._item
+            self._item = item
+            if replaced is not None:
+                self.dropped += 1
+            return replaced
+
+    def get(self):
+        """
+        Take the pending item, if any
+
+        :return: The latest item, or None if nothing is pending
+        """
+        with self._lock:
+            item = self._item
+            self._item = None
+            return item
+
+
+class PipelineWorker(QThread):
+    """
+    Runs frame capture and blink inference off the GUI thread.
+
+    The worker owns the Camera and its BlinkDetector. Processed frames are
+    published through a FrameQueue as (image, capture_time, buffer) tuples
+    and announced with frame_ready. The image is a view of the pooled
+    buffer, which the consumer returns with release_frame() after display;
+    frames replaced before display are returned here. BlinkEvents, which
+    carry the capture time of the frames they were seen in, are forwarded
+    through blink_detected. Both signals cross threads as queued
+    connections, so slots run on the GUI thread.
+    """
+
+    frame_ready = pyqtSignal()
+    blink_detected = pyqtSignal(object)  # BlinkEvent
+
+    def __init__(self, label, telemetry=None, capture_config=None, parent=None):
+        super().__init__(parent)
+        self.camera = Camera(label, self.forward_blink, telemetry, capture_config)
+        self.telemetry = self.camera.telemetry
+        self.frames = FrameQueue()
+
+    def forward_blink(self, event):
+        self.blink_detected.emit(event)
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            image = self.camera.read_frame()
+            if image is None:
+                self.msleep(5)
+                continue
+
+            # Only notify the UI when the slot was empty; otherwise the
+            # pending notification will pick up this newer frame.
+            replaced = self.frames.put((image, self.camera.last_capture_time, self.camera.last_buffer))
+            if replaced is None:
+                self.frame_ready.emit()
+            else:
+                self.release_frame(replaced)
+                self.telemetry.count("dropped_frames")
+
+    def release_frame(self, item):
+        """Return a frame's buffer to the pool once its image is no longer used"""
+        self.camera.buffers.release(item[2])
+
+    def stop(self):
+        """Stop the worker and release the camera"""
+        self.requestInterruption()
+        self.wait()
+        self.camera.release_camera()
+
+
+class RemoteBlinkWorker(QThread):
+    """
+    Receives BlinkEvents for one stream from a detection service.
+
+    Stands in for PipelineWorker when the camera is handled by
+    detection_service.py: it offers the same signals and frame queue, but
+    no frames are ever published. The connection is retried until the
+    worker is stopped.
+    """
+
+    frame_ready = pyqtSignal()
+    blink_detected = pyqtSignal(object)  # BlinkEvent
+    connection_changed = pyqtSignal(bool)
+
+    def __init__(self, address, stream="*", telemetry=None, parent=None):
+        """
+        :param address: (host, port) of the service's event socket
+        :param stream: Name of the stream to follow, or "*" for all
+        """
+        super().__init__(parent)
+        self.address = address
+        self.stream = stream
+        self.telemetry = telemetry
+        self.camera = None
+        self.frames = FrameQueue()
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            try:
+                with socket.create_connection(self.address, timeout=2.0) as connection:
+                    connection.sendall((json.dumps({"stream": self.stream}) + "\n").encode("utf-8"))
+                    self.connection_changed.emit(True)
+                    self.receive(connection)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error receiving from detection service {self.address}: {e}")
+            self.connection_changed.emit(False)
+            # Wait before reconnecting, staying responsive to stop()
+            for _ in range(20):
+                if self.isInterruptionRequested():
+                    return
+                self.msleep(100)
+
+    def receive(self, connection):
+        """Emit the blink events arriving on connection until it closes"""
+        connection.settimeout(0.5)
+        data = b""
+        while not self.isInterruptionRequested():
+            try:
+                chunk = connection.recv(65536)
+            except socket.timeout:
+                continue
+            if not chunk:
+                return
+            data += chunk
+            *lines, data = data.split(b"\n")
+            for line in lines:
+                message = json.loads(line)
+                if message.get("type") == "blink":
+                    self.blink_detected.emit(BlinkEvent.from_dict(message))
+                elif message.get("type") in ("error", "ended"):
+                    print(f"Stream {message['stream']} {message['type']}: {message.get('message', '')}")
+
+    def release_frame(self, item):
+        pass
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
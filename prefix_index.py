@@ -0,0 +1,128 @@
+"""
+Prefix index for word completion.
+
+A trie where every node caches the top-k words of its subtree by
+frequency. Querying a prefix walks len(prefix) nodes and reads the cached
+list, so the cost doesn't depend on vocabulary size. Frequency updates
+walk the word's path and patch each node's cache in place.
+"""
+import heapq
+from bisect import insort
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.top = []  # (-frequency, word), best first, at most top_k entries
+
+
+class PrefixIndex:
+    def __init__(self, top_k=8):
+        """
+        Initialize an empty index
+
+        :param top_k: Number of completions cached per node; larger queries
+            fall back to walking the subtree
+        """
+        self.top_k = top_k
+        self._root = _Node()
+        self._frequencies = {}
+
+    def __len__(self):
+        return len(self._frequencies)
+
+    def __contains__(self, word):
+        return word in self._frequencies
+
+    def frequency(self, word):
+        return self._frequencies.get(word, 0)
+
+    def set_frequency(self, word, frequency):
+        """
+        Insert a word or change its frequency
+
+        :param word: Word to index
+        :param frequency: New frequency
+        """
+        old = self._frequencies.get(word)
+        if old == frequency:
+            return
+        self._frequencies[word] = frequency
+
+        node = self._root
+        path = [node]
+        for char in word:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _Node()
+            node = child
+            path.append(node)
+
+        for depth, node in enumerate(path):
+            self._update_node(node, word[:depth], word, frequency, old)
+
+    def _update_node(self, node, prefix, word, frequency, old):
+        top = node.top
+        was_cached = False
+        if old is not None:
+            try:
+                top.remove((-old, word))
+                was_cached = True
+            except ValueError:
+                pass
+
+        # A cached word dropping in frequency may let an uncached word
+        # overtake it; rebuild a full cache from the subtree in that case
+        if was_cached and frequency < old and len(top) == self.top_k - 1:
+            node.top = self._collect(node, prefix, self.top_k)
+            return
+
+        entry = (-frequency, word)
+        if len(top) < self.top_k or entry < top[-1]:
+            insort(top, entry)
+            if len(top) > self.top_k:
+                top.pop()
+
+    def _collect(self, node, prefix, count):
+        """Return the best count (-frequency, word) entries under node"""
+        entries = []
+        stack = [(node, prefix)]
+        while stack:
+            current, current_prefix = stack.pop()
+            if current_prefix in self._frequencies:
+                entries.append((-self._frequencies[current_prefix], current_prefix))
+            for char, child in current.children.items():
+                stack.append((child, current_prefix + char))
+        return heapq.nsmallest(count, entries)
+
+    def _find(self, prefix):
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, prefix, count, exclude_exact=True):
+        """
+        Return the most frequent words starting with prefix
+
+        :param prefix: Prefix to complete
+        :param count: Maximum number of words to return
+        :param exclude_exact: Leave out prefix itself if it is a word
+        :return: Words, most frequent first, ties broken alphabetically
+        """
+        node = self._find(prefix)
+        if node is None or count <= 0:
+            return []
+
+        needed = count + 1 if exclude_exact else count
+        if needed <= self.top_k:
+            entries = node.top
+        else:
+            entries = self._collect(node, prefix, needed)
+
+        words = [word for _, word in entries if not (exclude_exact and word == prefix)]
+        return words[:count]
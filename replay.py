@@ -0,0 +1,239 @@
+"""
+Headless replay harness for BlinkDetector.
+
+Feeds a video file, a directory of frames or a pre-extracted landmark file
+through the blink detector as fast as the CPU allows and writes a blink
+event log as JSON lines. Landmark files skip MediaPipe entirely, which makes
+threshold sweeps over hours of footage practical.
+
+Examples:
+    python replay.py session.mp4 --out events.jsonl --save-landmarks session.npz
+    python replay.py frames/ --fps 30
+    python replay.py session.npz --sweep-threshold 0.15:0.30:0.01
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from blink_detector import BlinkDetector, EYE_INDICES, eye_aspect_ratio
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+LANDMARK_EXTENSIONS = (".npy", ".npz")
+
+
+def iter_video(path):
+    """
+    Yield (frame_index, timestamp, frame) from a video file
+
+    Timestamps come from the container when available and fall back to the
+    nominal frame rate.
+    """
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    index = 0
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            position = capture.get(cv2.CAP_PROP_POS_MSEC)
+            timestamp = position / 1000.0 if position > 0 else index / fps
+            yield index, timestamp, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def iter_frame_directory(path, fps):
+    """Yield (frame_index, timestamp, frame) from image files sorted by name"""
+    names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS))
+    for index, name in enumerate(names):
+        frame = cv2.imread(os.path.join(path, name))
+        if frame is None:
+            print(f"Skipping unreadable frame: {name}", file=sys.stderr)
+            continue
+        yield index, index / fps, frame
+
+
+def load_landmarks(path, fps):
+    """
+    Load pre-extracted eye landmarks
+
+    Accepts a .npy array of shape (N, 2, 6, 2) or a .npz archive with an
+    "eyes" array and an optional "timestamps" array, as written by
+    --save-landmarks. Frames without a face are stored as NaN.
+
+    :return: (eyes, timestamps)
+    """
+    data = np.load(path)
+    if isinstance(data, np.ndarray):
+        eyes, timestamps = data, None
+    else:
+        eyes = data["eyes"]
+        timestamps = data["timestamps"] if "timestamps" in data else None
+
+    if eyes.shape[1:] != EYE_INDICES.shape + (2,):
+        raise ValueError(f"Expected landmarks of shape (N, 2, 6, 2), got {eyes.shape}")
+    if timestamps is None:
+        timestamps = np.arange(len(eyes)) / fps
+    return eyes, timestamps
+
+
+def make_detector(on_blink, settings=None):
+    """
+    :param settings: Mapping of BlinkDetector parameter name (e.g.
+        "CLOSE_THRESHOLD", "MAX_BLINK_MS") to value; None values are ignored
+    """
+    detector = BlinkDetector(on_blink)
+    detector.verbose = False
+    for name, value in (settings or {}).items():
+        if value is not None:
+            setattr(detector, name, value)
+    return detector
+
+
+def replay_frames(frames, settings=None):
+    """
+    Run frames through BlinkDetector.process_frame
+
+    :param frames: Iterable of (frame_index, timestamp, frame)
+    :param settings: Detector parameter overrides, see make_detector
+    :return: (events, eyes, timestamps) where eyes is an (N, 2, 6, 2) array of
+        the extracted landmarks, NaN where no face was found
+    """
+    events = []
+    detector = make_detector(lambda event: events.append(event.to_dict()), settings)
+
+    eyes, timestamps = [], []
+    missing = np.full(EYE_INDICES.shape + (2,), np.nan)
+    for index, timestamp, frame in frames:
+        detector.process_frame(frame, timestamp, index)
+        eyes.append(missing if detector.last_eyes is None else detector.last_eyes)
+        timestamps.append(timestamp)
+
+    return events, np.array(eyes).reshape((-1,) + missing.shape), np.array(timestamps)
+
+
+def replay_ears(ears, timestamps, settings=None):
+    """
+    Run a precomputed EAR trace through the blink state machine
+
+    :param ears: Per-frame average EAR, NaN where no face was found
+    :param settings: Detector parameter overrides, see make_detector
+    :return: List of blink events
+    """
+    events = []
+    detector = make_detector(lambda event: events.append(event.to_dict()), settings)
+
+    for index, (ear, timestamp) in enumerate(zip(ears, timestamps)):
+        # Frames without a face leave the detector state untouched, as in process_frame
+        if np.isnan(ear):
+            continue
+        detector.update(float(ear), float(timestamp), index)
+    return events
+
+
+def sweep(ears, timestamps, settings, thresholds, min_ms, max_ms, hysteresis):
+    """
+    Count blinks for every combination of close threshold and duration limits
+
+    :param thresholds: CLOSE_THRESHOLD values, or [None] for the configured
+        thresholds; OPEN_THRESHOLD follows at close + hysteresis
+    :return: List of result dicts
+    """
+    defaults = make_detector(None, settings)
+    results = []
+    for threshold, min_blink_ms, max_blink_ms in itertools.product(thresholds, min_ms, max_ms):
+        overrides = dict(settings, MIN_BLINK_MS=min_blink_ms, MAX_BLINK_MS=max_blink_ms,
+                         CLOSE_THRESHOLD=defaults.CLOSE_THRESHOLD,
+                         OPEN_THRESHOLD=defaults.OPEN_THRESHOLD)
+        if threshold is not None:
+            overrides.update(CLOSE_THRESHOLD=threshold, OPEN_THRESHOLD=threshold + hysteresis)
+        blinks = len(replay_ears(ears, timestamps, overrides))
+        results.append({"close_threshold": overrides["CLOSE_THRESHOLD"],
+                        "open_threshold": overrides["OPEN_THRESHOLD"],
+                        "min_blink_ms": min_blink_ms, "max_blink_ms": max_blink_ms,
+                        "blinks": blinks})
+    return results
+
+
+def parse_range(text):
+    """Parse START:STOP:STEP into an inclusive list of values"""
+    start, stop, step = (float(part) for part in text.split(":"))
+    return list(np.round(np.arange(start, stop + step / 2, step), 6))
+
+
+def write_events(events, path):
+    out = open(path, "w") if path else sys.stdout
+    try:
+        for event in events:
+            out.write(json.dumps(event) + "\n")
+    finally:
+        if path:
+            out.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded footage through BlinkDetector")
+    parser.add_argument("source", help="Video file, directory of frames, or .npy/.npz landmark file")
+    parser.add_argument("--fps", type=float, default=30.0,
+                        help="Frame rate for frame directories and landmark files without timestamps")
+    parser.add_argument("--out", help="Write blink events here instead of stdout")
+    parser.add_argument("--save-landmarks", help="Save extracted eye landmarks to this .npz file")
+    parser.add_argument("--close-threshold", type=float, help="Override CLOSE_THRESHOLD")
+    parser.add_argument("--open-threshold", type=float, help="Override OPEN_THRESHOLD")
+    parser.add_argument("--min-blink-ms", type=float, help="Override MIN_BLINK_MS")
+    parser.add_argument("--max-blink-ms", type=float, help="Override MAX_BLINK_MS")
+    parser.add_argument("--filter-window", type=int, help="Override FILTER_WINDOW (1 disables filtering)")
+    parser.add_argument("--sweep-threshold", metavar="START:STOP:STEP",
+                        help="Report blink counts for a range of close thresholds")
+    parser.add_argument("--hysteresis", type=float, default=0.03,
+                        help="Open threshold minus close threshold while sweeping thresholds")
+    parser.add_argument("--sweep-min-ms", metavar="START:STOP:STEP",
+                        help="Report blink counts for a range of MIN_BLINK_MS values")
+    parser.add_argument("--sweep-max-ms", metavar="START:STOP:STEP",
+                        help="Report blink counts for a range of MAX_BLINK_MS values")
+    args = parser.parse_args(argv)
+    settings = {"CLOSE_THRESHOLD": args.close_threshold, "OPEN_THRESHOLD": args.open_threshold,
+                "MIN_BLINK_MS": args.min_blink_ms, "MAX_BLINK_MS": args.max_blink_ms,
+                "FILTER_WINDOW": args.filter_window}
+
+    started = time.perf_counter()
+    if args.source.lower().endswith(LANDMARK_EXTENSIONS):
+        eyes, timestamps = load_landmarks(args.source, args.fps)
+    else:
+        if os.path.isdir(args.source):
+            frames = iter_frame_directory(args.source, args.fps)
+        else:
+            frames = iter_video(args.source)
+        events, eyes, timestamps = replay_frames(frames, settings)
+        if args.save_landmarks:
+            np.savez_compressed(args.save_landmarks, eyes=eyes, timestamps=timestamps)
+
+    with np.errstate(invalid="ignore"):
+        ears = eye_aspect_ratio(eyes).mean(axis=-1) if len(eyes) else np.empty(0)
+
+    if args.sweep_threshold or args.sweep_min_ms or args.sweep_max_ms:
+        defaults = make_detector(None, settings)
+        thresholds = parse_range(args.sweep_threshold) if args.sweep_threshold else [None]
+        min_ms = parse_range(args.sweep_min_ms) if args.sweep_min_ms else [defaults.MIN_BLINK_MS]
+        max_ms = parse_range(args.sweep_max_ms) if args.sweep_max_ms else [defaults.MAX_BLINK_MS]
+        results = sweep(ears, timestamps, settings, thresholds, min_ms, max_ms, args.hysteresis)
+        write_events(results, args.out)
+    else:
+        if args.source.lower().endswith(LANDMARK_EXTENSIONS):
+            events = replay_ears(ears, timestamps, settings)
+        write_events(events, args.out)
+
+    elapsed = time.perf_counter() - started
+    duration = float(timestamps[-1]) if len(timestamps) else 0.0
+    print(f"Replayed {len(eyes)} frames ({duration:.1f}s of footage) in {elapsed:.2f}s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
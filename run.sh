@@ -1,4 +1,4 @@
 #!/bin/bash
 unset QT_PLUGIN_PATH
 export QT_QPA_PLATFORM_PLUGIN_PATH=/usr/lib/x86_64-linux-gnu/qt5/plugins/platforms
-python3 main.py
+python3 main.py "$@"
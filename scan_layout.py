@@ -0,0 +1,153 @@
+"""
+Keyboard layouts for row/column scanning, and an evaluator for them.
+
+CursorManager highlights rows from the top, then the keys of the chosen
+row from the left, so reaching the key in row r, column c takes r + c
+cursor moves plus two blinks. The expected number of moves per character
+is therefore the sum of p(key) * (r + c). For a given number of rows this
+is minimized by taking the cells with the smallest r + c, i.e. filling
+anti-diagonals, and giving the most frequent keys the cheapest of them
+(rearrangement inequality). Rows then have different lengths.
+frequency_layout does that for the best number of rows.
+
+Evaluate layouts on a text corpus (or the predictor's word list):
+    python scan_layout.py --corpus messages.txt
+"""
+import argparse
+import re
+import sys
+from collections import Counter, OrderedDict
+
+BACKSPACE = "⌫"
+SPACE = "␣"
+LETTERS = [chr(c) for c in range(ord("A"), ord("Z") + 1)]
+SYMBOLS = LETTERS + [BACKSPACE, SPACE]
+
+QWERTY = [
+    ['Q', 'W', 'E', 'R', 'T', 'Y', 'U', 'I', 'O', 'P'],
+    ['A', 'S', 'D', 'F', 'G', 'H', 'J', 'K', 'L'],
+    ['Z', 'X', 'C', 'V', 'B', 'N', 'M', BACKSPACE, SPACE]
+]
+
+
+def letter_frequencies(word_frequencies, backspace_rate=0.03):
+    """
+    Estimate how often each key is selected from word frequencies
+
+    :param word_frequencies: Mapping of word to frequency, e.g.
+        WordPredictor.word_frequencies
+    :param backspace_rate: Expected ⌫ selections per typed character
+    :return: Mapping of key to relative frequency, summing to 1
+    """
+    counts = Counter()
+    for word, frequency in word_frequencies.items():
+        if frequency <= 0:
+            continue
+        for char in word.upper():
+            if char in LETTERS:
+                counts[char] += frequency
+        counts[SPACE] += frequency  # Every word is followed by a space
+    return _normalize(counts, backspace_rate)
+
+
+def corpus_frequencies(text, backspace_rate=0.03):
+    """Key frequencies of a text, counting runs of whitespace as one space"""
+    counts = Counter()
+    for char in re.sub(r"\s+", " ", text.upper()):
+        if char in LETTERS:
+            counts[char] += 1
+        elif char == " ":
+            counts[SPACE] += 1
+    return _normalize(counts, backspace_rate)
+
+
+def _normalize(counts, backspace_rate):
+    total = sum(counts.values())
+    counts[BACKSPACE] += total * backspace_rate
+    # Keys never seen still get a small weight, so they are placed sensibly
+    floor = max(total, 1) * 0.0005
+    total = sum(counts.values()) + floor * len(SYMBOLS)
+    return {symbol: (counts[symbol] + floor) / total for symbol in SYMBOLS}
+
+
+def expected_moves(layout, frequencies):
+    """
+    Expected cursor moves per selected key
+
+    :param layout: Rows of key labels
+    :param frequencies: Mapping of key to probability
+    """
+    return sum(frequencies.get(key, 0.0) * (r + c)
+               for r, row in enumerate(layout) for c, key in enumerate(row))
+
+
+def frequency_layout(frequencies, max_rows=8):
+    """
+    Build the grid minimizing expected moves for these key frequencies
+
+    Every number of rows up to max_rows is tried, the fewest winning ties;
+    keys are placed along anti-diagonals, most frequent first, so each row
+    stays contiguous.
+    """
+    ranked = sorted(SYMBOLS, key=lambda key: -frequencies.get(key, 0.0))
+    best = None
+    for rows in range(1, max_rows + 1):
+        # Rows aren't cut to a common width: that would skip cheap cells
+        cells = sorted(((r, c) for r in range(rows) for c in range(len(ranked))),
+                       key=lambda cell: (cell[0] + cell[1], cell[0]))
+        layout = [[] for _ in range(rows)]
+        for key, (r, c) in zip(ranked, cells):
+            layout[r].append(key)
+        layout = [row for row in layout if row]
+        cost = expected_moves(layout, frequencies)
+        if best is None or cost < best[0]:
+            best = (cost, layout)
+    return best[1]
+
+
+def alphabetical_layout(cols=7):
+    return [SYMBOLS[i:i + cols] for i in range(0, len(SYMBOLS), cols)]
+
+
+def build_layouts(frequencies, max_rows=8):
+    """
+    Return the switchable layouts, in display order
+
+    :param frequencies: Key frequencies the optimized layout is built from
+    """
+    return OrderedDict([
+        ("QWERTY", QWERTY),
+        ("Frequency", frequency_layout(frequencies, max_rows)),
+        ("ABC", alphabetical_layout()),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report expected scan moves per character for each layout")
+    parser.add_argument("--corpus", help="Text file to evaluate on; defaults to the predictor's word list")
+    parser.add_argument("--max-rows", type=int, default=8, help="Tallest grid the optimizer may use")
+    parser.add_argument("--show", action="store_true", help="Print each layout")
+    args = parser.parse_args(argv)
+
+    # The optimized layout is always built from the predictor's statistics,
+    # so a corpus gives an honest held-out evaluation
+    from word_prediction import WordPredictor
+    model_frequencies = letter_frequencies(WordPredictor().word_frequencies)
+    if args.corpus:
+        with open(args.corpus, "r") as file:
+            frequencies = corpus_frequencies(file.read())
+    else:
+        frequencies = model_frequencies
+
+    layouts = build_layouts(model_frequencies, args.max_rows)
+    for name, layout in layouts.items():
+        moves = expected_moves(layout, frequencies)
+        print(f"{name:10s} {moves:5.2f} moves/char, {moves + 2:5.2f} steps/char including 2 blinks")
+        if args.show:
+            for row in layout:
+                print("    " + " ".join(row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Adaptive scan timing for CursorManager.
+
+Instead of one fixed timer interval, every scan step asks the scheduler how
+long to dwell. Dwell is a base time scaled per kind of step (rows, keys,
+suggestions) with a longer dwell on the first step after a selection. In
+adaptive mode the base time follows the user: it is pulled towards a
+margin above their recent reaction times (eye closure minus the moment the
+selected item lit up), and pushed back up when selections are often
+undone with ⌫.
+
+Profiles are stored per user as JSON, e.g. ~/.eyespeak/profiles/default.json.
+"""
+import json
+import os
+from collections import deque
+
+# Fixed presets shown in the UI, in seconds
+PRESETS = {"slow": 3.0, "medium": 2.0, "fast": 1.0}
+
+
+class ScanScheduler:
+    def __init__(self, profile_file=None, base_dwell=PRESETS["medium"]):
+        """
+        Initialize the scheduler, loading the profile if it exists
+
+        :param profile_file: JSON file holding this user's timing profile
+        :param base_dwell: Dwell in seconds used when there is no profile
+        """
+        self.profile_file = profile_file
+        self.base_dwell = base_dwell
+        self.adaptive = False
+
+        # Per-kind multipliers and the extra dwell on the first step after a selection
+        self.factors = {"row": 1.0, "item": 1.0, "suggestion": 1.0}
+        self.first_step_factor = 1.5
+
+        # Limits and tuning of the adaptation
+        self.min_dwell = 0.6
+        self.max_dwell = 4.0
+        self.reaction_margin = 1.3   # dwell target is this times the 90th percentile reaction
+        self.target_error_rate = 0.08
+        self.learning_rate = 0.2     # fraction of the way towards the target per selection
+
+        self.reaction_times = deque(maxlen=50)
+        self.error_rate = 0.0        # exponential average of ⌫ following a selection
+        self.selections = 0
+
+        if profile_file and os.path.exists(profile_file):
+            self.load()
+
+    def dwell_ms(self, kind="item", first=False):
+        """
+        Time to keep a step highlighted
+
+        :param kind: "row", "item" or "suggestion"
+        :param first: The step directly follows a selection
+        :return: Dwell in milliseconds
+        """
+        dwell = self.base_dwell * self.factors.get(kind, 1.0)
+        if first:
+            dwell *= self.first_step_factor
+        return int(dwell * 1000)
+
+    def set_fixed(self, seconds):
+        """Use a fixed base dwell and stop adapting"""
+        self.adaptive = False
+        self.base_dwell = seconds
+
+    def set_adaptive(self, enabled=True):
+        self.adaptive = enabled
+
+    def record_selection(self, reaction_time=None, corrected=False):
+        """
+        Record a selection and adapt the base dwell
+
+        :param reaction_time: Seconds from the selected item lighting up to the
+            eye closing, if known
+        :param corrected: The selection was ⌫, i.e. it undoes the previous one
+        """
+        self.selections += 1
+        self.error_rate += 0.1 * ((1.0 if corrected else 0.0) - self.error_rate)
+        # A reaction longer than the dwell belongs to a step the cursor had already left
+        if reaction_time is not None and 0 < reaction_time <= self.max_dwell:
+            self.reaction_times.append(reaction_time)
+
+        if self.adaptive:
+            self.base_dwell += self.learning_rate * (self.target_dwell() - self.base_dwell)
+        if self.profile_file and self.selections % 20 == 0:
+            self.save()
+
+    def target_dwell(self):
+        """Base dwell the adaptation is currently moving towards"""
+        if len(self.reaction_times) < 5:
+            return self.base_dwell
+        ordered = sorted(self.reaction_times)
+        p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+        target = p90 * self.reaction_margin
+
+        # Frequent corrections mean the cursor is too fast for the user
+        if self.error_rate > self.target_error_rate:
+            target *= 1 + (self.error_rate - self.target_error_rate) * 2
+        return min(self.max_dwell, max(self.min_dwell, target))
+
+    def profile(self):
+        return {
+            "base_dwell": round(self.base_dwell, 3),
+            "adaptive": self.adaptive,
+            "factors": self.factors,
+            "first_step_factor": self.first_step_factor,
+            "reaction_times": [round(t, 3) for t in self.reaction_times],
+            "error_rate": round(self.error_rate, 4),
+        }
+
+    def load(self):
+        try:
+            with open(self.profile_file, "r") as file:
+                profile = json.load(file)
+            self.base_dwell = profile.get("base_dwell", self.base_dwell)
+            self.adaptive = profile.get("adaptive", self.adaptive)
+            self.factors.update(profile.get("factors", {}))
+            self.first_step_factor = profile.get("first_step_factor", self.first_step_factor)
+            self.reaction_times.extend(profile.get("reaction_times", []))
+            self.error_rate = profile.get("error_rate", self.error_rate)
+        except Exception as e:
+            print(f"Error loading scan profile: {e}")
+
+    def save(self):
+        """Atomically write the profile"""
+        if not self.profile_file:
+            return
+        temp_filename = self.profile_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.profile_file) or ".", exist_ok=True)
+            with open(temp_filename, "w") as file:
+                json.dump(self.profile(), file, indent=2)
+            os.replace(temp_filename, self.profile_file)
+        except Exception as e:
+            print(f"Error saving scan profile: {e}")
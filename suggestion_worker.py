@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+
+
+class SuggestionWorker(QThread):
+    """
+    Computes WordPredictor suggestions off the GUI thread.
+
+    Every request gets a new generation number. Requests wait in a single
+    slot, so a burst of keystrokes is collapsed into the newest one after a
+    short debounce, and results for anything but the latest generation are
+    dropped. Results are delivered through suggestions_ready as a queued
+    signal, so the slot runs on the GUI thread, and never from within
+    request(). The last cache_size results are kept by query text and
+    reused while the predictor's model is unchanged.
+    """
+
+    # generation, text, (completions, next words, phrases)
+    suggestions_ready = pyqtSignal(int, str, object)
+
+    def __init__(self, word_predictor, debounce_ms=40, cache_size=64, parent=None):
+        """
+        Initialize the worker
+
+        :param word_predictor: WordPredictor to query
+        :param debounce_ms: Time to wait for a newer request before computing
+        :param cache_size: Number of query results to keep
+        """
+        super().__init__(parent)
+        self.word_predictor = word_predictor
+        self.debounce_ms = debounce_ms
+        self.cache_size = cache_size
+        self.generation = 0
+        self._pending = None  # (generation, text) of the newest request not yet taken
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._cache = OrderedDict()  # text -> (model version, suggestions)
+        self._cache_lock = threading.Lock()
+
+    def request(self, text):
+        """
+        Ask for suggestions for text; supersedes any earlier request
+
+        A cached result is emitted from the event loop right away, so
+        results always arrive after the caller has returned.
+
+        :return: Generation number of this request
+        """
+        self.generation += 1
+        cached = self._cached(text)
+        if cached is not None:
+            generation = self.generation
+            QTimer.singleShot(0, lambda: self.suggestions_ready.emit(generation, text, cached))
+        else:
+            with self._pending_lock:
+                self._pending = (self.generation, text)
+            self._wake.set()
+        return self.generation
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def stop(self):
+        self.requestInterruption()
+        self._wake.set()
+        self.wait()
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            self._wake.wait()
+            self._wake.clear()
+            if self.debounce_ms:
+                self.msleep(self.debounce_ms)
+
+            with self._pending_lock:
+                item, self._pending = self._pending, None
+            if item is None:
+                continue
+            generation, text = item
+            if not self.is_current(generation):
+                continue
+
+            try:
+                with self.word_predictor.lock:
+                    version = self.word_predictor.version
+                    suggestions = self.word_predictor.get_suggestions(text)
+            except Exception as e:
+                print(f"Suggestion error: {e}")
+                continue
+            self._store(text, version, suggestions)
+
+            if self.is_current(generation):
+                self.suggestions_ready.emit(generation, text, suggestions)
+
+    def _cached(self, text):
+        with self._cache_lock:
+            entry = self._cache.get(text)
+            if entry is None or entry[0] != self.word_predictor.version:
+                return None
+            self._cache.move_to_end(text)
+            return entry[1]
+
+    def _store(self, text, version, suggestions):
+        with self._cache_lock:
+            self._cache[text] = (version, suggestions)
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
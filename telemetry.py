@@ -0,0 +1,177 @@
+"""
+Lightweight timing hooks for the capture -> detect -> render loop.
+
+Stage timings are kept in fixed-size ring buffers, so memory stays constant
+in the field. When telemetry is disabled, start() and stop() return straight
+away and nothing is recorded.
+
+Typical use:
+    started = telemetry.start()
+    ...
+    telemetry.stop("face_mesh", started)
+"""
+import json
+import threading
+import time
+from array import array
+
+
+def summarize(samples):
+    """
+    Summarize latency samples given in seconds
+
+    :return: Dict with sample count, mean and percentile latencies in
+        milliseconds, and throughput in operations per second
+    """
+    if not samples:
+        return {"samples": 0}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+    mean = sum(ordered) / len(ordered)
+    return {
+        "samples": len(ordered),
+        "mean_ms": round(mean * 1000, 4),
+        "p50_ms": round(percentile(50) * 1000, 4),
+        "p95_ms": round(percentile(95) * 1000, 4),
+        "p99_ms": round(percentile(99) * 1000, 4),
+        "fps": round(1.0 / mean, 2) if mean > 0 else None,
+    }
+
+
+class RingBuffer:
+    """Fixed-size buffer of floats that overwrites its oldest values"""
+
+    def __init__(self, size):
+        self._values = array("d", bytes(8 * size))
+        self._size = size
+        self._next = 0
+        self.count = 0
+
+    def append(self, value):
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self._size
+        self.count = min(self.count + 1, self._size)
+
+    def values(self):
+        """Return the buffered values, oldest first"""
+        if self.count < self._size:
+            return list(self._values[:self.count])
+        return list(self._values[self._next:]) + list(self._values[:self._next])
+
+
+class Telemetry:
+    def __init__(self, enabled=False, size=512):
+        """
+        Initialize telemetry
+
+        :param enabled: Record timings; when False all hooks are no-ops
+        :param size: Number of samples kept per stage
+        """
+        self.enabled = enabled
+        self.size = size
+        self.stages = {}
+        self.counters = {}
+        self.frame_times = RingBuffer(size)
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Mark the start of a stage
+
+        :return: Start time to pass to stop(), or None when disabled
+        """
+        if not self.enabled:
+            return None
+        return time.perf_counter()
+
+    def stop(self, stage, started):
+        """
+        Record the time elapsed since start()
+
+        :param stage: Stage name
+        :param started: Value returned by start()
+        """
+        if started is None:
+            return
+        self.record(stage, time.perf_counter() - started)
+
+    def record(self, stage, seconds):
+        """Record a duration in seconds for a stage"""
+        if not self.enabled:
+            return
+        with self._lock:
+            buffer = self.stages.get(stage)
+            if buffer is None:
+                buffer = self.stages[stage] = RingBuffer(self.size)
+            buffer.append(seconds)
+
+    def count(self, name, amount=1):
+        """Increment a counter such as dropped frames"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def frame(self):
+        """Mark one frame as displayed, for the fps estimate"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.frame_times.append(time.perf_counter())
+
+    def fps(self):
+        """Displayed frames per second over the buffered window"""
+        with self._lock:
+            times = self.frame_times.values()
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def snapshot(self):
+        """
+        Summarize all stages and counters
+
+        :return: JSON-serializable dict
+        """
+        with self._lock:
+            stages = {name: buffer.values() for name, buffer in self.stages.items()}
+            counters = dict(self.counters)
+        return {
+            "time": time.time(),
+            "fps": round(self.fps(), 2),
+            "counters": counters,
+            "stages": {name: summarize(values) for name, values in stages.items()},
+        }
+
+    def dump(self, filename=None):
+        """
+        Write a snapshot as one JSON line
+
+        :param filename: Append to this file; print to stdout if not given
+        """
+        line = json.dumps(self.snapshot())
+        if filename:
+            try:
+                with open(filename, "a") as file:
+                    file.write(line + "\n")
+            except Exception as e:
+                print(f"Error writing telemetry: {e}")
+        else:
+            print(f"Telemetry: {line}")
+
+    def overlay_text(self):
+        """Short summary for the on-screen performance overlay"""
+        snapshot = self.snapshot()
+        stages = snapshot["stages"]
+
+        def p50(stage):
+            return stages.get(stage, {}).get("p50_ms", 0.0)
+
+        return (f"{snapshot['fps']:.0f} fps | "
+                f"inference {p50('inference'):.1f} ms | "
+                f"dropped {snapshot['counters'].get('dropped_frames', 0)} | "
+                f"skipped {snapshot['counters'].get('skipped_inference', 0)} | "
+                f"blink→UI {p50('blink_to_ui'):.0f} ms")
@@ -0,0 +1,81 @@
+import random
+from compiled_model import CompiledModel, compile_model
+from word_prediction import WordPredictor
+
+
+def build_predictor():
+    """A model whose n-grams mention words that are not in its vocabulary"""
+    predictor = WordPredictor()
+    predictor.ngrams.set_count(("say",), "hellozzz", 5)
+    predictor.ngrams.set_count(("say", "hellozzz"), "helloworldzzz", 2)
+    predictor.ngrams.set_count(("qxvword",), "there", 3)
+    return predictor
+
+
+def test_compiled_completions_match_json(tmp_path):
+    predictor = build_predictor()
+    json_file = str(tmp_path / "custom.json")
+    model_file = str(tmp_path / "model.eylm")
+    assert predictor.save_custom_data(json_file)
+    compile_model(predictor, model_file)
+
+    from_json = WordPredictor(json_file)
+    compiled = WordPredictor(compiled_model_file=model_file)
+    try:
+        for prefix in ("hello", "hellozz", "qxv", "he", "t", "sa"):
+            assert compiled.get_word_completions(prefix) == from_json.get_word_completions(prefix), prefix
+        assert compiled.get_word_completions("hellozz") == []
+    finally:
+        compiled.close()
+
+
+def test_ngram_only_words_are_not_offered(tmp_path):
+    model_file = str(tmp_path / "model.eylm")
+    compile_model(build_predictor(), model_file)
+
+    model = CompiledModel(model_file)
+    try:
+        assert model.find("hellozzz") is not None
+        assert model.complete("hellozz", 5) == []
+        assert model.complete("qxv", 5) == []
+        assert "hellozzz" not in [word for _, word in model.most_common()]
+        assert "hellozzz" in [word for _, word in model.continuations(("say",))]
+    finally:
+        model.close()
+
+
+def random_predictor(seed):
+    """A model with many equal n-gram counts, learned from random text"""
+    rng = random.Random(seed)
+    vocabulary = ["w%02d" % i for i in range(25)]
+    predictor = WordPredictor()
+    for _ in range(40):
+        predictor.learn_from_text(" ".join(rng.choice(vocabulary) for _ in range(12)))
+    return predictor, vocabulary
+
+
+def test_compiled_next_words_match_json(tmp_path):
+    predictor, vocabulary = random_predictor(7)
+    json_file = str(tmp_path / "custom.json")
+    model_file = str(tmp_path / "model.eylm")
+    assert predictor.save_custom_data(json_file)
+    compile_model(predictor, model_file)
+
+    from_json = WordPredictor(json_file)
+    compiled = WordPredictor(compiled_model_file=model_file)
+    rng = random.Random(11)
+    try:
+        for _ in range(2):
+            for _ in range(150):
+                current = rng.choice(vocabulary + ["", "unseen"])
+                previous = rng.choice(vocabulary + [None])
+                count = rng.randint(1, 8)
+                query = (current, count, previous)
+                assert (compiled.get_next_word_suggestions(current, count, previous)
+                        == from_json.get_next_word_suggestions(current, count, previous)), query
+            # Learning on top of the compiled model merges its counts with the base
+            text = " ".join(rng.choice(vocabulary) for _ in range(30))
+            compiled.learn_from_text(text)
+            from_json.learn_from_text(text)
+    finally:
+        compiled.close()
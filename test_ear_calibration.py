@@ -0,0 +1,93 @@
+import statistics
+from types import SimpleNamespace
+import pytest
+from ear_calibration import EarCalibration
+
+
+def feed(calibration, ear, start, seconds, fps=30):
+    """Feed constant EAR samples for seconds of frames; return the time after the last one"""
+    timestamp = start
+    for _ in range(int(seconds * fps)):
+        calibration.add(ear, timestamp)
+        timestamp += 1.0 / fps
+    return timestamp
+
+
+def test_expires_without_samples():
+    calibration = EarCalibration(timeout_seconds=10)
+    calibration.start()
+    started = calibration.started_at
+    assert not calibration.expire(started + 9.9)
+    assert calibration.active
+    assert calibration.expire(started + 10)
+    assert calibration.phase == "failed"
+    assert not calibration.active
+    assert not calibration.expire(started + 20)
+    # Samples arriving late are ignored
+    assert not calibration.add(0.1, started + 11)
+    assert calibration.phase == "failed"
+
+
+def test_expires_when_face_is_lost_while_eyes_are_closed():
+    calibration = EarCalibration(timeout_seconds=10)
+    calibration.start()
+    timestamp = feed(calibration, 0.3, 0.0, 4)
+    assert calibration.phase == "closed"
+    feed(calibration, 0.1, timestamp, 1)
+    assert calibration.active
+    assert calibration.expire(calibration.started_at + 10)
+    assert calibration.phase == "failed"
+    assert not calibration.calibrated
+
+
+def run_calibration(calibration, open_ears, closed_ears, fps=30):
+    """Feed one phase of open samples, then one of closed samples; return the end time"""
+    calibration.start()
+    timestamp = 0.0
+    open_frames = int((calibration.settle_seconds + calibration.open_seconds) * fps) + 1
+    for i in range(open_frames):
+        calibration.add(open_ears[i % len(open_ears)], timestamp)
+        timestamp += 1.0 / fps
+    closed_frames = int((calibration.settle_seconds + calibration.closed_seconds) * fps) + 2
+    for i in range(closed_frames):
+        calibration.add(closed_ears[i % len(closed_ears)], timestamp)
+        timestamp += 1.0 / fps
+    return timestamp
+
+
+def test_thresholds_sit_between_median_baselines(tmp_path):
+    profile = str(tmp_path / "profiles" / "user_ear.json")
+    calibration = EarCalibration(profile)
+    # Outliers, like a blink while the eyes should be open, don't move the medians
+    open_ears = [0.31, 0.30, 0.29, 0.05, 0.30]
+    closed_ears = [0.09, 0.10, 0.11, 0.30, 0.10]
+    run_calibration(calibration, open_ears, closed_ears)
+    assert calibration.phase == "done"
+    assert calibration.open_level == statistics.median(calibration.open_ears) == 0.30
+    assert calibration.closed_level == statistics.median(calibration.closed_ears) == 0.10
+
+    close_threshold, open_threshold = calibration.thresholds()
+    assert close_threshold == pytest.approx(0.10 + 0.35 * 0.20)
+    assert open_threshold == pytest.approx(0.10 + 0.55 * 0.20)
+    assert 0.10 < close_threshold < open_threshold < 0.30
+
+    detector = SimpleNamespace(CLOSE_THRESHOLD=0.2, OPEN_THRESHOLD=0.23)
+    EarCalibration(profile).apply(detector)
+    assert (detector.CLOSE_THRESHOLD, detector.OPEN_THRESHOLD) == pytest.approx((close_threshold, open_threshold))
+
+
+def test_settle_time_skips_samples_taken_while_following_the_prompt():
+    calibration = EarCalibration()
+    run_calibration(calibration, [0.3], [0.1])
+    # Samples from the first settle_seconds of each phase are not used
+    assert len(calibration.open_ears) == pytest.approx(30 * calibration.open_seconds, abs=1)
+    assert len(calibration.closed_ears) == pytest.approx(30 * calibration.closed_seconds, abs=1)
+
+
+def test_baselines_too_close_fail_and_keep_previous_thresholds():
+    calibration = EarCalibration()
+    run_calibration(calibration, [0.3], [0.1])
+    previous = calibration.thresholds()
+    run_calibration(calibration, [0.3], [0.28])
+    assert calibration.phase == "failed"
+    assert calibration.thresholds() == previous
@@ -0,0 +1,82 @@
+import math
+import random
+from collections import deque
+from types import SimpleNamespace
+from inference_scheduler import InferenceScheduler
+
+
+def detector(ear=0.3, eye_closed=False, history=()):
+    return SimpleNamespace(last_ear=ear, eye_closed=eye_closed, CLOSE_THRESHOLD=0.2,
+                           ear_history=deque(history, maxlen=10))
+
+
+def run(scheduler, costs, interval, state=lambda index: detector()):
+    """Feed frames at a fixed interval; return the indices of processed frames"""
+    processed = []
+    for index, cost in enumerate(costs):
+        timestamp = index * interval
+        if scheduler.should_infer(timestamp, state(index)):
+            scheduler.record(cost, timestamp)
+            processed.append(index)
+    return processed
+
+
+def test_within_budget_every_frame_is_processed():
+    scheduler = InferenceScheduler(budget=0.5, frame_interval=1 / 30)
+    assert run(scheduler, [0.01] * 100, 1 / 30) == list(range(100))
+    assert scheduler.stride == 1
+    assert scheduler.skipped == 0
+
+
+def test_stride_matches_the_cost_and_is_capped():
+    for cost, expected in ((0.02, 2), (0.04, 3), (0.06, 4), (1.0, 4)):
+        scheduler = InferenceScheduler(budget=0.5, frame_interval=1 / 30, max_stride=4, max_gap=1.0)
+        processed = run(scheduler, [cost] * 200, 1 / 30)
+        assert scheduler.stride == min(4, math.ceil(cost / (0.5 / 30)))
+        gaps = {b - a for a, b in zip(processed[20:], processed[21:])}
+        assert gaps == {expected}, cost
+
+
+def test_max_gap_limits_time_between_inferences():
+    interval = 1 / 30
+    scheduler = InferenceScheduler(budget=0.1, frame_interval=interval, max_stride=10, max_gap=0.11)
+    processed = run(scheduler, [0.05] * 300, interval)
+    assert scheduler.stride == 10
+    for a, b in zip(processed, processed[1:]):
+        assert (b - a) * interval < 0.11 + interval
+    assert max(b - a for a, b in zip(processed, processed[1:])) == 4
+
+
+def test_random_run_matches_reference_rules():
+    rng = random.Random(17)
+    interval = 1 / 60
+    scheduler = InferenceScheduler(budget=0.4, frame_interval=interval, max_stride=5, max_gap=0.12)
+    states = []
+    for _ in range(3000):
+        ear = rng.choice([0.32, 0.31, 0.3, 0.24, 0.18])
+        closed = rng.random() < 0.05
+        drop = rng.random() < 0.05
+        states.append(detector(ear, closed, [ear + 0.05, ear] if drop else [ear, ear]))
+    costs = [rng.uniform(0.001, 0.04) for _ in states]
+
+    last = None
+    skipped = 0
+    for index, (state, cost) in enumerate(zip(states, costs)):
+        timestamp = index * interval
+        urgent = (state.eye_closed or state.last_ear < 0.25
+                  or state.ear_history[-2] - state.ear_history[-1] > 0.02)
+        stride = scheduler.stride
+        inferred = scheduler.should_infer(timestamp, state)
+        if urgent or stride == 1 or last is None:
+            assert inferred, index
+        if inferred:
+            scheduler.record(cost, timestamp)
+            last = timestamp
+            skipped = 0
+        else:
+            skipped += 1
+            # Never more than stride - 1 skips in a row, nor max_gap seconds
+            assert skipped < stride
+            assert timestamp - last < 0.12
+    assert scheduler.inferred + scheduler.skipped == len(states)
+    assert scheduler.skipped > 0
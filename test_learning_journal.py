@@ -0,0 +1,109 @@
+import os
+from learning_journal import LearningJournal
+from word_prediction import WordPredictor
+
+TEXTS = ["the cat sat on the mat", "the dog sat on the log", "a cat and a dog",
+         "the cat ran", "on the mat the cat sat"]
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("journal-"))
+
+
+def test_frozen_snapshot_ignores_later_learning():
+    predictor = WordPredictor()
+    for text in TEXTS[:3]:
+        predictor.learn_from_text(text)
+    expected = predictor.custom_data()
+
+    with predictor.lock:
+        frozen = predictor.freeze()
+    for text in TEXTS[3:]:
+        predictor.learn_from_text(text)
+    predictor.add_phrase("the cat sat on the mat")
+
+    assert predictor.custom_data(frozen) == expected
+    assert predictor.custom_data() != expected
+    assert predictor.ngram_count(("the",), "cat") == 4
+
+
+def test_compaction_while_learning_restores_the_same_model(tmp_path):
+    directory = str(tmp_path)
+    journal = LearningJournal(directory, compact_every=2)
+    predictor = WordPredictor()
+    journal.restore(predictor)
+    for text in TEXTS * 3:
+        predictor.learn_from_text(text)
+    journal.close()
+
+    restored = WordPredictor()
+    LearningJournal(directory).restore(restored)
+    assert restored.custom_data() == predictor.custom_data()
+
+
+def test_restarts_without_input_reuse_the_empty_segment(tmp_path):
+    directory = str(tmp_path)
+    journal = LearningJournal(directory)
+    predictor = WordPredictor()
+    journal.restore(predictor)
+    predictor.learn_from_text(TEXTS[0])
+    journal.close()
+    assert segment_files(directory) == ["journal-000001.ndjson"]
+
+    for _ in range(3):
+        journal = LearningJournal(directory)
+        journal.restore(WordPredictor())
+        journal.close()
+    assert segment_files(directory) == ["journal-000001.ndjson", "journal-000002.ndjson"]
+
+    restored = WordPredictor()
+    LearningJournal(directory).restore(restored)
+    assert restored.ngram_count(("the",), "cat") == 1
+
+
+def test_torn_last_line_is_skipped_and_appends_continue_in_a_new_segment(tmp_path):
+    directory = str(tmp_path)
+    journal = LearningJournal(directory)
+    predictor = WordPredictor()
+    journal.restore(predictor)
+    for text in TEXTS[:2]:
+        predictor.learn_from_text(text)
+    journal.close()
+    # A crash in the middle of appending the third entry
+    with open(os.path.join(directory, "journal-000001.ndjson"), "a") as file:
+        file.write('{"op": "learn", "text": "the cat')
+
+    reference = WordPredictor()
+    for text in TEXTS[:2]:
+        reference.learn_from_text(text)
+    restored = WordPredictor()
+    journal = LearningJournal(directory)
+    journal.restore(restored)
+    assert restored.custom_data() == reference.custom_data()
+
+    restored.learn_from_text(TEXTS[2])
+    journal.close()
+    assert segment_files(directory) == ["journal-000001.ndjson", "journal-000002.ndjson"]
+    reference.learn_from_text(TEXTS[2])
+    again = WordPredictor()
+    LearningJournal(directory).restore(again)
+    assert again.custom_data() == reference.custom_data()
+
+
+def test_snapshot_and_newer_segments_replay_to_the_same_model(tmp_path):
+    directory = str(tmp_path)
+    journal = LearningJournal(directory)
+    predictor = WordPredictor()
+    journal.restore(predictor)
+    predictor.learn_from_text(TEXTS[0])
+    predictor.add_phrase("hello there")
+    journal.compact(wait=True)
+    predictor.learn_from_text(TEXTS[1])
+    predictor.add_phrase("hello there")
+    journal.close()
+    assert segment_files(directory) == ["journal-000002.ndjson"]
+
+    restored = WordPredictor()
+    LearningJournal(directory).restore(restored)
+    assert restored.custom_data() == predictor.custom_data()
+    assert restored.phrase_index.usage("hello there") == 1
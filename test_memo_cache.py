@@ -0,0 +1,81 @@
+import random
+from memo_cache import MemoCache
+from word_prediction import WordPredictor
+
+
+def test_groups_evict_least_recently_used():
+    cache = MemoCache(max_groups=2, ttl=None)
+    cache.put("a", 3, ["x"])
+    cache.put("a", 5, ["x", "y"])
+    cache.put("b", 3, ["z"])
+    assert cache.get("a", 5) == ["x", "y"]
+    cache.put("c", 3, [])
+    assert cache.get("b", 3) is None
+    assert cache.get("a", 3) == ["x"]
+    assert cache.get("c", 3) == []
+    cache.invalidate_where(lambda group: group in ("a", "b"))
+    assert list(cache) == ["c"]
+
+
+def test_groups_expire():
+    cache = MemoCache(ttl=0.0)
+    cache.put("a", 3, ["x"])
+    assert cache.get("a", 3) is None
+    assert len(cache) == 0
+
+
+class Pair:
+    """Applies every change to a memoized predictor and to one queried without memos"""
+
+    def __init__(self):
+        self.memoized = WordPredictor()
+        self.reference = WordPredictor()
+
+    def apply(self, method, *args):
+        getattr(self.memoized, method)(*args)
+        getattr(self.reference, method)(*args)
+
+    def check(self, method, *args):
+        self.reference.clear_memos()
+        expected = getattr(self.reference, method)(*args)
+        assert getattr(self.memoized, method)(*args) == expected, (method, args)
+
+
+def test_padded_next_words_follow_common_word_changes():
+    pair = Pair()
+    pair.apply("learn_from_text", "zebra crossing")
+    # One continuation; the remaining slots are padded with common words
+    pair.check("get_next_word_suggestions", "zebra", 5)
+    common = pair.memoized.get_next_word_suggestions("", 5)
+
+    # A word unrelated to "zebra" becomes the most common word
+    pair.apply("set_word_frequency", "quokka", 10 ** 9)
+    pair.check("get_next_word_suggestions", "zebra", 5)
+    assert "quokka" in pair.memoized.get_next_word_suggestions("zebra", 5)
+
+    # ...and stops being one
+    pair.apply("set_word_frequency", "quokka", 1)
+    pair.check("get_next_word_suggestions", "zebra", 5)
+    assert pair.memoized.get_next_word_suggestions("", 5) == common
+
+
+def test_random_changes_match_unmemoized_queries():
+    rng = random.Random(13)
+    words = ["i", "want", "water", "to", "go", "home", "help", "please", "warm", "hot"]
+    pair = Pair()
+    for step in range(300):
+        action = rng.random()
+        if action < 0.3:
+            pair.apply("learn_from_text", " ".join(rng.choice(words) for _ in range(rng.randint(1, 5))))
+        elif action < 0.4:
+            pair.apply("add_phrase", " ".join(rng.choice(words) for _ in range(rng.randint(2, 4))))
+        elif action < 0.45:
+            pair.apply("set_word_frequency", rng.choice(words), rng.choice([1, 10 ** 6, 10 ** 9]))
+        else:
+            word = rng.choice(words)
+            count = rng.choice([1, 3, 5])
+            pair.check("get_word_completions", word[:rng.randint(1, len(word))], count)
+            pair.check("get_next_word_suggestions", word, count, rng.choice(words + [None]))
+            pair.check("get_next_word_suggestions", "", count)
+            pair.check("get_phrase_suggestions", word[:rng.randint(0, len(word))], count)
+    assert pair.memoized.cache_stats()["next_words"]["hits"] > 0
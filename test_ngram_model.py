@@ -0,0 +1,57 @@
+import random
+from collections import Counter, defaultdict
+from ngram_model import NgramModel
+
+
+def brute_force(sequences):
+    counts = defaultdict(Counter)
+    for words in sequences:
+        for i in range(1, len(words)):
+            counts[(words[i - 1],)][words[i]] += 1
+            if i >= 2:
+                counts[(words[i - 2], words[i - 1])][words[i]] += 1
+    return counts
+
+
+def ranked(counter, count):
+    return [word for word, _ in sorted(counter.items(), key=lambda item: (-item[1], item[0]))][:count]
+
+
+def test_trigram_keys_keep_word_order():
+    model = NgramModel()
+    model.add(("b", "a"), "x")
+    model.add(("a", "b"), "y", 2)
+    model.add(("a",), "b")
+    assert model.continuations(("a", "b"), 5) == ["y"]
+    assert model.continuations(("b", "a"), 5) == ["x"]
+    assert model.count(("a", "b"), "x") == 0
+    assert model.count(("a", "b"), "y") == 2
+    assert sorted(model.items()) == [(("a",), {"b": 1}), (("a", "b"), {"y": 2}), (("b", "a"), {"x": 1})]
+
+
+def test_random_sequences_match_brute_force():
+    rng = random.Random(5)
+    vocabulary = ["w%d" % i for i in range(30)]
+    model = NgramModel(top_k=3)
+    sequences = []
+    for step in range(300):
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(1, 8))]
+        sequences.append(words)
+        model.add_sequence(words)
+        if step % 30 == 0:
+            # Read continuations so later updates have cached top-k lists to invalidate
+            expected = brute_force(sequences)
+            for context in list(expected)[:40]:
+                assert model.continuations(context, 2) == ranked(expected[context], 2)
+
+    expected = brute_force(sequences)
+    for context, counter in expected.items():
+        for count in (1, 3, 5, 50):
+            assert model.continuations(context, count) == ranked(counter, count), context
+        for word in vocabulary:
+            assert model.count(context, word) == counter[word]
+    assert {context: counts for context, counts in model.items()} == {
+        context: dict(counter) for context, counter in expected.items()}
+    assert model.continuations(("unseen",), 3) == []
+    assert model.continuations(("w1", "unseen"), 3) == []
+
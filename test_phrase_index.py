@@ -0,0 +1,59 @@
+import random
+from phrase_index import PhraseIndex
+
+
+def brute_force(phrases, usage, partial_text, max_results):
+    """Rank phrases by match kind, then usage, then insertion order"""
+    text = partial_text.lower()
+
+    def kind(phrase):
+        lower = phrase.lower()
+        if lower.startswith(text):
+            return 0
+        if (" " + text) in (" " + lower) and text.split():
+            return 1
+        if len(text) >= 3 and text in lower:
+            return 2
+        return None
+
+    ranked = []
+    for i, phrase in enumerate(phrases):
+        match = kind(phrase)
+        if match is not None:
+            ranked.append((match, -usage[phrase], i, phrase))
+    return [phrase for *_, phrase in sorted(ranked)[:max_results]]
+
+
+def test_match_kinds_rank_in_order():
+    index = PhraseIndex()
+    for phrase in ["I need water", "Water please", "Turn off the TV", "Hot water bottle"]:
+        index.add(phrase)
+    assert index.search("wat", 5) == ["Water please", "I need water", "Hot water bottle"]
+    assert index.search("ater", 5) == ["I need water", "Water please", "Hot water bottle"]
+    index.record_use("Hot water bottle", 2)
+    assert index.search("water", 2) == ["Water please", "Hot water bottle"]
+    assert index.search("", 2) == ["Hot water bottle", "I need water"]
+    assert not index.add("Water please")
+
+
+def test_random_phrases_match_brute_force():
+    rng = random.Random(9)
+    words = ["the", "then", "hot", "other", "water", "wait", "at", "a", "help", "hello"]
+    index = PhraseIndex()
+    phrases, usage = [], {}
+    for _ in range(120):
+        phrase = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.3:
+            phrase = phrase.capitalize()
+        if index.add(phrase, rng.randint(0, 3)):
+            phrases.append(phrase)
+            usage[phrase] = index.usage(phrase)
+        else:
+            index.record_use(phrase)
+            usage[phrase] += 1
+
+    queries = ["", "t", "th", "the", "then", "he", "hel", "ater", "at", "a", "t w", "hot wa",
+               "o", "other wa", "Wat", "xyz", "e h"]
+    for query in queries:
+        for max_results in (1, 3, 10, 200):
+            assert index.search(query, max_results) == brute_force(phrases, usage, query, max_results), query
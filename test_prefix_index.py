@@ -0,0 +1,46 @@
+import random
+from prefix_index import PrefixIndex
+
+
+def brute_force(frequencies, prefix, count, exclude_exact=True):
+    words = sorted((-frequency, word) for word, frequency in frequencies.items()
+                   if word.startswith(prefix) and not (exclude_exact and word == prefix))
+    return [word for _, word in words[:count]]
+
+
+def check(index, frequencies, prefixes):
+    for prefix in prefixes:
+        for count in (1, 3, index.top_k - 1, index.top_k, index.top_k + 3):
+            assert index.complete(prefix, count) == brute_force(frequencies, prefix, count), (prefix, count)
+            assert (index.complete(prefix, count, exclude_exact=False)
+                    == brute_force(frequencies, prefix, count, exclude_exact=False)), (prefix, count)
+
+
+def test_cached_word_dropping_lets_uncached_word_in():
+    index = PrefixIndex(top_k=3)
+    frequencies = {"car": 10, "cat": 9, "cap": 8, "can": 7, "cab": 6}
+    for word, frequency in frequencies.items():
+        index.set_frequency(word, frequency)
+    assert index.complete("ca", 3) == ["car", "cat", "cap"]
+
+    # "car" leaves the top 3; "can" was never cached and must take its place
+    frequencies["car"] = 1
+    index.set_frequency("car", 1)
+    assert index.complete("ca", 3) == ["cat", "cap", "can"]
+    check(index, frequencies, ["", "c", "ca", "car"])
+
+
+def test_random_updates_match_brute_force():
+    rng = random.Random(3)
+    index = PrefixIndex(top_k=4)
+    frequencies = {}
+    words = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(60)]
+    for step in range(2000):
+        word = rng.choice(words)
+        frequency = rng.randint(0, 20)
+        frequencies[word] = frequency
+        index.set_frequency(word, frequency)
+        if step % 100 == 0:
+            check(index, frequencies, ["", "a", "b", "ab", "ca", "abc", "cccc", "d"])
+    check(index, frequencies, {word[:i] for word in words for i in range(len(word) + 1)})
+    assert len(index) == len(frequencies)
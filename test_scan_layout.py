@@ -0,0 +1,65 @@
+import itertools
+import random
+import pytest
+import scan_layout
+from scan_layout import (SPACE, SYMBOLS, build_layouts, corpus_frequencies, expected_moves,
+                         frequency_layout, letter_frequencies)
+
+
+def shapes(count, max_rows):
+    """Row lengths of every layout with count keys and at most max_rows rows"""
+    for rows in range(1, max_rows + 1):
+        for cuts in itertools.combinations(range(1, count), rows - 1):
+            bounds = (0,) + cuts + (count,)
+            yield [bounds[i + 1] - bounds[i] for i in range(rows)]
+
+
+def brute_force_moves(symbols, frequencies, max_rows):
+    """Fewest expected moves over every arrangement of symbols"""
+    best = None
+    for order in itertools.permutations(symbols):
+        for lengths in shapes(len(symbols), max_rows):
+            layout, start = [], 0
+            for length in lengths:
+                layout.append(list(order[start:start + length]))
+                start += length
+            moves = expected_moves(layout, frequencies)
+            if best is None or moves < best:
+                best = moves
+    return best
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_frequency_layout_is_optimal(monkeypatch, seed):
+    rng = random.Random(seed)
+    symbols = list("ABCDEF")
+    monkeypatch.setattr(scan_layout, "SYMBOLS", symbols)
+    weights = [rng.random() ** 3 for _ in symbols]
+    frequencies = {symbol: weight / sum(weights) for symbol, weight in zip(symbols, weights)}
+    for max_rows in (1, 2, 3):
+        layout = frequency_layout(frequencies, max_rows)
+        assert sorted(key for row in layout for key in row) == symbols
+        assert len(layout) <= max_rows
+        assert expected_moves(layout, frequencies) == pytest.approx(
+            brute_force_moves(symbols, frequencies, max_rows)), max_rows
+
+
+def test_frequencies_are_normalized():
+    for frequencies in (letter_frequencies({"hello": 5, "world": 2, "zero": 0}),
+                        corpus_frequencies("Hello  world\nhello")):
+        assert set(frequencies) == set(SYMBOLS)
+        assert sum(frequencies.values()) == pytest.approx(1.0)
+        assert min(frequencies.values()) > 0
+    frequencies = corpus_frequencies("Hello  world\nhello")
+    floor = 17 * 0.0005  # 15 letters and 2 spaces
+    assert frequencies["L"] / frequencies["H"] == pytest.approx((5 + floor) / (2 + floor))
+    assert frequencies[SPACE] / frequencies["W"] == pytest.approx((2 + floor) / (1 + floor))
+
+
+def test_all_layouts_hold_every_key_once():
+    layouts = build_layouts(letter_frequencies({"the": 10, "quiz": 1}))
+    for layout in layouts.values():
+        keys = [key for row in layout for key in row]
+        assert sorted(keys) == sorted(SYMBOLS)
+    frequencies = letter_frequencies({"the": 10, "quiz": 1})
+    assert expected_moves(layouts["Frequency"], frequencies) < expected_moves(layouts["QWERTY"], frequencies)
@@ -0,0 +1,53 @@
+import time
+import pytest
+
+QtCore = pytest.importorskip("PyQt5.QtCore")
+pytest.importorskip("PyQt5.QtMultimedia")
+pytest.importorskip("pyttsx3")
+
+from audio_cache import AudioCache
+from text_to_speech import SpeechWorker, TextToSpeech
+
+
+def drain(commands):
+    items = []
+    while not commands.empty():
+        items.append(commands.get_nowait())
+    return items
+
+
+def test_corrupt_cached_audio_is_synthesized(tmp_path, monkeypatch):
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    # Commands stay in the worker's queue where the test can see them
+    monkeypatch.setattr(SpeechWorker, "start", lambda self: None)
+
+    key = AudioCache.key("hello", None, 150, 0.8)
+    (tmp_path / key).write_bytes(b"FORM\0\0\0\x04AIFF truncated")
+    tts = TextToSpeech(cache_dir=str(tmp_path))
+    started, finished = [], []
+    tts.started.connect(lambda utterance_id, text: started.append(utterance_id))
+    tts.finished.connect(lambda utterance_id, completed: finished.append((utterance_id, completed)))
+
+    first = tts.speak("hello")
+    second = tts.speak("world")
+    deadline = time.monotonic() + 5
+    while tts.worker.commands.empty() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+
+    assert drain(tts.worker.commands) == [("say", first, "hello"), ("say", second, "world")]
+    assert key not in tts.cache
+    assert not (tmp_path / key).exists()
+    assert started == [first]
+    assert finished == []
+
+    # The worker reporting the fallback doesn't announce the utterance twice
+    tts._on_started(first, "hello")
+    tts._on_finished(first, True)
+    assert started == [first]
+    assert finished == [(first, True)]
+
+    third = tts.speak("hello")
+    assert tts._playing is None
+    assert drain(tts.worker.commands) == [("say", third, "hello")]
+    tts.shutdown()
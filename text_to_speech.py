@@ -1,58 +1,353 @@
+import os
+import queue
+from collections import deque, OrderedDict
 import pyttsx3
+from PyQt5.QtCore import QObject, QThread, QUrl, pyqtSignal
+from audio_cache import AudioCache
 
-class TextToSpeech:
-    def __init__(self, rate=150, volume=0.8):
-        """
-        Initialize Text-to-Speech engine
-        
-        :param rate: Speech rate (words per minute)
-        :param volume: Volume level (0.0 to 1.0)
-        """
+try:
+    from PyQt5.QtMultimedia import QSoundEffect
+except ImportError:
+    # Without QtMultimedia cached audio can't be played; everything is synthesized
+    QSoundEffect = None
+
+# Number of cached phrases kept loaded for instant playback
+_LOADED_EFFECTS = 16
+
+
+class SpeechWorker(QThread):
+    """
+    Owns the pyttsx3 engine and speaks queued utterances one at a time.
+
+    The engine runs an external event loop (startLoop(False) + iterate), so
+    the thread stays responsive to cancel and property commands while an
+    utterance is playing. Commands arrive through a thread-safe queue.
+
+    With an AudioCache, phrases queued with 'render' are saved to WAV files
+    whenever nothing is waiting to be spoken; speech preempts a render.
+    """
+    utterance_started = pyqtSignal(int, str)
+    utterance_finished = pyqtSignal(int, bool)  # utterance id, completed
+    error = pyqtSignal(str)
+
+    def __init__(self, rate, volume, voice=None, cache=None, parent=None):
+        super().__init__(parent)
+        self.commands = queue.Queue()
+        self.properties = {'rate': rate, 'volume': volume}
+        if voice is not None:
+            self.properties['voice'] = voice
+        self.cache = cache
+        self.pending = deque()   # (utterance id, text) not yet given to the engine
+        self.current = None      # (utterance id, text) being spoken
+        self.renders = deque()   # phrases waiting to be pre-rendered
+        self.rendering = None    # (cache key, text) being rendered
+        self.engine = None
+
+    def run(self):
         try:
+            # The engine is created here, so it lives in the thread that drives it
             self.engine = pyttsx3.init()
-            
-            # Set properties
-            self.engine.setProperty('rate', rate)
-            self.engine.setProperty('volume', volume)
-            
-            # Optional: Choose a specific voice (optional, depends on system)
-            voices = self.engine.getProperty('voices')
-            # Uncomment and modify if you want a specific voice
-            # self.engine.setProperty('voice', voices[1].id)  # Typically index 1 is a female voice
+            for name, value in self.properties.items():
+                self.engine.setProperty(name, value)
+            self.engine.connect('started-utterance', self._on_started)
+            self.engine.connect('finished-utterance', self._on_finished)
+            self.engine.startLoop(False)
         except Exception as e:
             print(f"Text-to-Speech initialization error: {e}")
+            self.error.emit(str(e))
             self.engine = None
-    
-    def speak(self, text):
+            return
+
+        running = True
+        while running:
+            running = self._handle_commands()
+            try:
+                if self.pending and self.rendering is not None:
+                    self._cancel_render()
+                if self.current is None and self.pending:
+                    self.current = self.pending.popleft()
+                    utterance_id, text = self.current
+                    self.engine.say(text, str(utterance_id))
+                elif self.current is None and self.rendering is None and self.renders:
+                    self._start_render(self.renders.popleft())
+                self.engine.iterate()
+            except Exception as e:
+                print(f"Speech synthesis error: {e}")
+                self.error.emit(str(e))
+                self._finish(False)
+            self.msleep(10)
+
+        try:
+            self.engine.stop()
+            self.engine.endLoop()
+        except Exception as e:
+            print(f"Text-to-Speech shutdown error: {e}")
+
+    def _handle_commands(self):
+        """Apply queued commands; return False once asked to quit"""
+        while True:
+            try:
+                command, *args = self.commands.get_nowait()
+            except queue.Empty:
+                return True
+
+            if command == 'say':
+                self.pending.append(tuple(args))
+            elif command == 'cancel':
+                self._cancel_current()
+            elif command == 'clear':
+                while self.pending:
+                    utterance_id, _ = self.pending.popleft()
+                    self.utterance_finished.emit(utterance_id, False)
+                self._cancel_current()
+            elif command == 'render':
+                if self.cache is not None:
+                    self.renders.append(args[0])
+            elif command == 'property':
+                name, value = args
+                self.properties[name] = value
+                # Takes effect from the next utterance, no engine restart needed
+                self.engine.setProperty(name, value)
+            elif command == 'quit':
+                return False
+
+    def _cancel_current(self):
+        if self.current is not None:
+            self.engine.stop()
+            self._finish(False)
+
+    def cache_key(self, text):
+        """Cache key for text spoken with the current engine settings"""
+        return AudioCache.key(text, self.properties.get('voice'),
+                              self.properties['rate'], self.properties['volume'])
+
+    def _start_render(self, text):
+        key = self.cache_key(text)
+        if key in self.cache:
+            return
+        self.rendering = (key, text)
+        self.engine.save_to_file(text, self.cache.temp_path(key), 'render:' + key)
+
+    def _cancel_render(self):
+        # The phrase goes back to the front; its partial file is overwritten later
+        self.engine.stop()
+        self.renders.appendleft(self.rendering[1])
+        self.rendering = None
+
+    def _finish(self, completed):
+        if self.current is not None:
+            self.utterance_finished.emit(self.current[0], completed)
+            self.current = None
+
+    def _on_started(self, name):
+        if self.current is not None and str(self.current[0]) == name:
+            self.utterance_started.emit(*self.current)
+
+    def _on_finished(self, name, completed):
+        if self.rendering is not None and name == 'render:' + self.rendering[0]:
+            if completed:
+                self.cache.store(self.rendering[0])
+            self.rendering = None
+        # Utterances already reported as cancelled are ignored
+        elif self.current is not None and str(self.current[0]) == name:
+            self._finish(completed)
+
+
+class TextToSpeech(QObject):
+    started = pyqtSignal(int, str)    # utterance id, text
+    finished = pyqtSignal(int, bool)  # utterance id, completed (False if cancelled)
+
+    def __init__(self, rate=150, volume=0.8, voice=None, cache_dir=None,
+                 cache_bytes=64 * 1024 * 1024):
+        """
+        Initialize Text-to-Speech on a background thread
+
+        :param rate: Speech rate (words per minute)
+        :param volume: Volume level (0.0 to 1.0)
+        :param voice: Engine voice id, or None for the system default
+        :param cache_dir: Directory for pre-rendered phrases, or None to always synthesize
+        :param cache_bytes: Size limit of the audio cache
         """
-        Convert text to speech
-        
+        super().__init__()
+        self.rate = rate
+        self.volume = volume
+        self.voice = voice
+        self.current_utterance = None
+        self._next_id = 0
+        self._outstanding = set()  # utterance ids sent to the worker and not finished
+
+        self.cache = None
+        if cache_dir is not None and QSoundEffect is not None:
+            self.cache = AudioCache(cache_dir, cache_bytes)
+        self._effects = OrderedDict()  # WAV path -> loaded QSoundEffect, least recent first
+        self._playing = None           # (utterance id, text, QSoundEffect) of cached audio
+        self._waiting = deque()        # (utterance id, text) queued behind cached audio
+        self._restarted = set()        # ids handed to the worker after their cached audio failed
+
+        # Signals from the worker are queued onto this object's (GUI) thread
+        self.worker = SpeechWorker(rate, volume, voice, self.cache)
+        self.worker.utterance_started.connect(self._on_started)
+        self.worker.utterance_finished.connect(self._on_finished)
+        self.worker.start()
+
+    def speak(self, text, interrupt=False):
+        """
+        Queue text to be spoken; returns immediately
+
+        A pre-rendered phrase is played straight from the cache when nothing
+        else is queued ahead of it. Text queued while cached audio plays
+        waits for it to finish, so utterances never overlap.
+
         :param text: Text to be spoken
+        :param interrupt: Cancel the current and queued utterances first
+        :return: Utterance id, as passed to the started/finished signals
+        """
+        if interrupt:
+            self.clear()
+            self._outstanding.clear()
+        self._next_id += 1
+        if self._playing is not None:
+            self._waiting.append((self._next_id, text))
+        else:
+            self._dispatch(self._next_id, text)
+        return self._next_id
+
+    def _dispatch(self, utterance_id, text):
+        """Play text from the cache if the engine is idle, else queue it on the worker"""
+        if not self._outstanding:
+            path = self._cached(text)
+            if path is not None:
+                self._play(utterance_id, text, path)
+                return
+        self._outstanding.add(utterance_id)
+        self.worker.commands.put(('say', utterance_id, text))
+
+    def _play_next(self):
+        """Hand on utterances that waited for cached audio, in order"""
+        while self._waiting and self._playing is None:
+            self._dispatch(*self._waiting.popleft())
+
+    def prerender(self, phrases):
+        """
+        Render phrases into the audio cache while the engine is idle
+
+        :param phrases: Phrases to render; ones already cached are skipped
         """
-        if not self.engine:
-            print("Text-to-Speech engine not initialized.")
+        if self.cache is None:
             return
-        
-        try:
-            self.engine.say(text)
-            self.engine.runAndWait()
-        except Exception as e:
-            print(f"Speech synthesis error: {e}")
-    
+        for phrase in phrases:
+            if AudioCache.key(phrase, self.voice, self.rate, self.volume) not in self.cache:
+                self.worker.commands.put(('render', phrase))
+
+    def cancel(self):
+        """Stop the current utterance; queued ones still play"""
+        if self._playing is not None:
+            self._stop_playing()
+            self._play_next()
+        else:
+            self.worker.commands.put(('cancel',))
+
+    def clear(self):
+        """Stop the current utterance and drop all queued ones"""
+        while self._waiting:
+            self.finished.emit(self._waiting.popleft()[0], False)
+        self._stop_playing()
+        self.worker.commands.put(('clear',))
+
     def set_rate(self, rate):
         """
         Change speech rate
-        
+
         :param rate: New speech rate (words per minute)
         """
-        if self.engine:
-            self.engine.setProperty('rate', rate)
-    
+        self.rate = rate
+        self.worker.commands.put(('property', 'rate', rate))
+
     def set_volume(self, volume):
         """
         Change speech volume
-        
+
         :param volume: New volume level (0.0 to 1.0)
         """
-        if self.engine:
-            self.engine.setProperty('volume', volume)
\ No newline at end of file
+        self.volume = volume
+        self.worker.commands.put(('property', 'volume', volume))
+
+    def shutdown(self):
+        """Stop speaking and end the worker thread"""
+        self._waiting.clear()
+        self._stop_playing()
+        self.worker.commands.put(('quit',))
+        self.worker.wait(2000)
+
+    @property
+    def speaking(self):
+        return (self.current_utterance is not None or self._playing is not None
+                or bool(self._waiting))
+
+    def _cached(self, text):
+        if self.cache is None:
+            return None
+        return self.cache.get(AudioCache.key(text, self.voice, self.rate, self.volume))
+
+    def _play(self, utterance_id, text, path):
+        effect = self._effects.pop(path, None)
+        if effect is None:
+            effect = QSoundEffect(self)
+            effect.playingChanged.connect(self._on_playing_changed)
+            effect.statusChanged.connect(self._on_status_changed)
+            effect.setSource(QUrl.fromLocalFile(path))
+            if len(self._effects) >= _LOADED_EFFECTS:
+                self._effects.popitem(last=False)[1].deleteLater()
+        self._effects[path] = effect
+
+        self._playing = (utterance_id, text, effect)
+        effect.play()
+        self.started.emit(utterance_id, text)
+        # A file that failed to load before play() won't report it again
+        self._on_status_changed()
+
+    def _stop_playing(self):
+        if self._playing is not None:
+            utterance_id, _, effect = self._playing
+            self._playing = None
+            effect.stop()
+            self.finished.emit(utterance_id, False)
+
+    def _on_playing_changed(self):
+        if self._playing is not None and not self._playing[2].isPlaying():
+            utterance_id, _, _ = self._playing
+            self._playing = None
+            self.finished.emit(utterance_id, True)
+            self._play_next()
+
+    def _on_status_changed(self):
+        """Synthesize the phrase instead if its cached file can't be played"""
+        if self._playing is None or self._playing[2].status() != QSoundEffect.Error:
+            return
+        utterance_id, text, effect = self._playing
+        self._playing = None
+        path = effect.source().toLocalFile()
+        print(f"Cached speech could not be played, synthesizing instead: {path}")
+        self._effects.pop(path, None)
+        effect.deleteLater()
+        self.cache.discard(os.path.basename(path))
+
+        # started was already emitted for this utterance
+        self._restarted.add(utterance_id)
+        self._outstanding.add(utterance_id)
+        self.worker.commands.put(('say', utterance_id, text))
+        self._play_next()
+
+    def _on_started(self, utterance_id, text):
+        self.current_utterance = utterance_id
+        if utterance_id in self._restarted:
+            self._restarted.discard(utterance_id)
+        else:
+            self.started.emit(utterance_id, text)
+
+    def _on_finished(self, utterance_id, completed):
+        self._outstanding.discard(utterance_id)
+        self._restarted.discard(utterance_id)
+        if utterance_id == self.current_utterance:
+            self.current_utterance = None
+        self.finished.emit(utterance_id, completed)
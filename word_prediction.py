@@ -1,21 +1,71 @@
 import re
 import os
+import threading
 from collections import Counter
 import json
+from prefix_index import PrefixIndex
+from ngram_model import NgramModel
+from phrase_index import PhraseIndex
+from compiled_model import CompiledModel
+from memo_cache import MemoCache
 
 class WordPredictor:
-    def __init__(self, custom_phrases_file=None):
-        # Dictionary to store word frequencies
+    def __init__(self, custom_phrases_file=None, compiled_model_file=None):
+        """
+        Initialize the predictor
+
+        :param custom_phrases_file: JSON file written by save_custom_data
+        :param compiled_model_file: Compiled model (see compiled_model.py) used
+            as a read-only base instead of the built-in word lists. The
+            in-memory structures then only hold words and n-grams learned
+            on top of it.
+        """
+        # Dictionary to store word frequencies; update it through
+        # set_word_frequency so the completion index stays in sync
         self.word_frequencies = Counter()
         
-        # Dictionary to store next word predictions based on current word
-        self.next_word_predictions = {}
+        # Prefix index over word_frequencies for fast completions
+        self.completion_index = PrefixIndex()
+        
+        # Bigram/trigram counts for next word prediction
+        self.ngrams = NgramModel()
+        
+        # Indexed common phrases
+        self.phrase_index = PhraseIndex()
+        
+        # Guards the model against concurrent readers and writers, e.g.
+        # background snapshotting
+        self.lock = threading.RLock()
+        
+        # Append-only log of learned text, see learning_journal.py
+        self.journal = None
+        
+        # Incremented on every change to the model, so callers caching
+        # suggestions can tell when their results are out of date
+        self.version = 0
+        
+        # Memoized query results, invalidated precisely as the model changes:
+        # completions are grouped by prefix, next words by (previous word,
+        # current word) and phrases by the lowercase query text
+        self.completion_memo = MemoCache()
+        self.next_word_memo = MemoCache()
+        self.phrase_memo = MemoCache()
+        # Next word groups whose results were padded with the most common words
+        self._common_dependents = set()
         
-        # List of common phrases
-        self.phrases = []
+        # Memory-mapped base model, if any
+        self.base_model = None
+        if compiled_model_file:
+            try:
+                self.base_model = CompiledModel(compiled_model_file)
+                for phrase, usage in self.base_model.phrases():
+                    self.phrase_index.add(phrase, usage)
+            except Exception as e:
+                print(f"Error opening compiled model: {e}")
         
         # Load common English words and their frequencies
-        self._load_common_words()
+        if self.base_model is None:
+            self._load_common_words()
         
         # Load custom phrases if provided
         if custom_phrases_file and os.path.exists(custom_phrases_file):
@@ -85,80 +135,212 @@ class WordPredictor:
         ]
         
         # Store word frequencies
-        self.word_frequencies.update(common_words)
+        for word, freq in common_words.items():
+            self.set_word_frequency(word, freq)
         
-        # Store word pairs for next word prediction
-        self.next_word_predictions = common_pairs
+        # Store word pairs for next word prediction, keeping the listed order
+        # as the initial ranking
+        for word, predictions in common_pairs.items():
+            for rank, next_word in enumerate(predictions):
+                self.ngrams.add((word.lower(),), next_word, len(predictions) - rank)
         
         # Store common phrases
-        self.phrases = common_phrases
+        for phrase in common_phrases:
+            self.phrase_index.add(phrase)
+    
+    @property
+    def phrases(self):
+        """Known phrases in insertion order"""
+        return self.phrase_index.phrases
     
     def _load_custom_phrases(self, filename):
         try:
             with open(filename, 'r') as file:
                 custom_data = json.load(file)
-                
-                # Add custom word frequencies if present
-                if 'word_frequencies' in custom_data:
-                    for word, freq in custom_data['word_frequencies'].items():
-                        self.word_frequencies[word] = freq
-                
-                # Add custom next word predictions if present
-                if 'next_word_predictions' in custom_data:
-                    for word, predictions in custom_data['next_word_predictions'].items():
-                        if word in self.next_word_predictions:
-                            self.next_word_predictions[word].extend(predictions)
-                        else:
-                            self.next_word_predictions[word] = predictions
-                
-                # Add custom phrases if present
-                if 'phrases' in custom_data:
-                    self.phrases.extend(custom_data['phrases'])
+            self.load_custom_data(custom_data)
         except Exception as e:
             print(f"Error loading custom phrases: {e}")
     
+    def load_custom_data(self, custom_data):
+        """Merge a dict in the save_custom_data format into the model"""
+        with self.lock:
+            self.version += 1
+            self.clear_memos()
+            # Add custom word frequencies if present
+            if 'word_frequencies' in custom_data:
+                for word, freq in custom_data['word_frequencies'].items():
+                    self.set_word_frequency(word, freq)
+            
+            # Add custom n-gram counts if present
+            for key in ('bigram_counts', 'trigram_counts'):
+                for context, counts in custom_data.get(key, {}).items():
+                    for next_word, count in counts.items():
+                        self.ngrams.set_count(tuple(context.split(' ')), next_word, count)
+            
+            # Older files store plain next word lists without counts
+            if 'next_word_predictions' in custom_data:
+                for word, predictions in custom_data['next_word_predictions'].items():
+                    for next_word in predictions:
+                        self.ngrams.add((word.lower(),), next_word)
+            
+            # Add custom phrases and their usage counts if present
+            usage = custom_data.get('phrase_usage', {})
+            for phrase in custom_data.get('phrases', []):
+                if not self.phrase_index.add(phrase, usage.get(phrase, 0)) and phrase in usage:
+                    self.phrase_index.set_usage(phrase, usage[phrase])
+    
+    def close(self):
+        """Release the compiled base model, if one is open"""
+        if self.base_model is not None:
+            self.base_model.close()
+            self.base_model = None
+    
     def save_custom_data(self, filename):
-        """Save learned word frequencies, predictions and phrases to a file"""
-        data = {
-            'word_frequencies': dict(self.word_frequencies),
-            'next_word_predictions': self.next_word_predictions,
-            'phrases': self.phrases
-        }
+        """
+        Save learned word frequencies, predictions and phrases to a file
+
+        With a compiled base model, only the words and n-grams changed since
+        it was opened are saved, along with all phrases.
+        """
+        return write_custom_data(self.custom_data(), filename)
+    
+    def freeze(self):
+        """
+        Capture the model for custom_data(); call with the lock held
+
+        Only flat copies are made (see NgramModel.freeze), so this is cheap
+        enough for the GUI thread; building the dict is left to custom_data,
+        which may run on another thread.
+        """
+        return (dict(self.word_frequencies), self.ngrams.freeze(),
+                list(self.phrases), self.phrase_index.usage_counts())
+    
+    def custom_data(self, frozen=None):
+        """
+        Return the model as a JSON-serializable dict in the save_custom_data format
+
+        :param frozen: Result of freeze(); captured now if None
+        """
+        if frozen is None:
+            with self.lock:
+                frozen = self.freeze()
+        word_frequencies, ngrams, phrases, usage = frozen
         
-        try:
-            with open(filename, 'w') as file:
-                json.dump(data, file, indent=2)
-            return True
-        except Exception as e:
-            print(f"Error saving custom data: {e}")
-            return False
+        bigram_counts = {}
+        trigram_counts = {}
+        for context, counts in ngrams.items():
+            table = bigram_counts if len(context) == 1 else trigram_counts
+            table[' '.join(context)] = counts
+        
+        return {
+            'word_frequencies': word_frequencies,
+            'bigram_counts': bigram_counts,
+            'trigram_counts': trigram_counts,
+            'phrases': phrases,
+            'phrase_usage': {phrase: count for phrase, count in zip(phrases, usage) if count}
+        }
+    
+    def set_word_frequency(self, word, frequency):
+        """Set a word's frequency and update the completion index"""
+        with self.lock:
+            self.version += 1
+            was_common = self._is_common(word)
+            self.word_frequencies[word] = frequency
+            self.completion_index.set_frequency(word, frequency)
+            
+            # Only completions of the word's own prefixes can change, and next
+            # word results only if it is (or was) among the most common words
+            for i in range(1, len(word) + 1):
+                self.completion_memo.invalidate(word[:i])
+            if self._common_dependents and (was_common or self._is_common(word)):
+                self.next_word_memo.invalidate_where(lambda group: group in self._common_dependents)
+                self._common_dependents.clear()
+    
+    def _is_common(self, word):
+        top_k = self.completion_index.top_k
+        return word in self.completion_index.complete("", top_k, exclude_exact=False)
+    
+    def clear_memos(self):
+        """Drop all memoized query results"""
+        with self.lock:
+            self.completion_memo.clear()
+            self.next_word_memo.clear()
+            self.phrase_memo.clear()
+            self._common_dependents.clear()
+    
+    def cache_stats(self):
+        """Hit/miss counters and sizes of the memoized queries"""
+        with self.lock:
+            return {
+                'completions': self.completion_memo.stats(),
+                'next_words': self.next_word_memo.stats(),
+                'phrases': self.phrase_memo.stats(),
+            }
+    
+    def word_frequency(self, word):
+        """Frequency of a word, including the compiled base model"""
+        if word in self.word_frequencies or self.base_model is None:
+            return self.word_frequencies[word]
+        return self.base_model.frequency(word)
+    
+    def ngram_count(self, context, next_word):
+        """Count of next_word after a context tuple, including the base model"""
+        count = self.ngrams.count(context, next_word)
+        if count or self.base_model is None:
+            return count
+        return self.base_model.ngram_count(context, next_word)
     
     def learn_from_text(self, text):
         """Learn word frequencies and patterns from provided text"""
+        with self.lock:
+            self.version += 1
+            self._learn(text)
+            if self.journal is not None:
+                self.journal.record('learn', text)
+    
+    def _learn(self, text):
         # Tokenize the text into words
         words = re.findall(r'\b\w+\b', text.lower())
         
         # Update word frequencies
         for word in words:
-            self.word_frequencies[word] += 1
+            self.set_word_frequency(word, self.word_frequency(word) + 1)
         
-        # Update next word predictions
-        for i in range(len(words) - 1):
-            current_word = words[i]
-            next_word = words[i + 1]
-            
-            if current_word not in self.next_word_predictions:
-                self.next_word_predictions[current_word] = []
-                
-            if next_word not in self.next_word_predictions[current_word]:
-                self.next_word_predictions[current_word].append(next_word)
+        # Drop next word results for every context whose counts change
+        bigram_words = set(words[:-1])
+        trigram_contexts = set(zip(words[:-2], words[1:-1]))
+        if bigram_words:
+            self.next_word_memo.invalidate_where(
+                lambda group: group[1] in bigram_words or group in trigram_contexts)
+        
+        # Update bigram and trigram counts
+        if self.base_model is None:
+            self.ngrams.add_sequence(words)
+        else:
+            # Copy base counts into the in-memory model before bumping them
+            for i in range(1, len(words)):
+                contexts = [(words[i - 1],)]
+                if i >= 2:
+                    contexts.append((words[i - 2], words[i - 1]))
+                for context in contexts:
+                    self.ngrams.set_count(context, words[i], self.ngram_count(context, words[i]) + 1)
     
     def add_phrase(self, phrase):
-        """Add a new phrase to the suggestions"""
-        if phrase and phrase not in self.phrases:
-            self.phrases.append(phrase)
-            # Also learn from this phrase
-            self.learn_from_text(phrase)
+        """Add a new phrase to the suggestions, or count another use of a known one"""
+        if not phrase:
+            return
+        with self.lock:
+            self.version += 1
+            # Every query matching the phrase may now rank it differently
+            lower = phrase.lower()
+            self.phrase_memo.invalidate_where(lambda text: text in lower)
+            if self.phrase_index.add(phrase):
+                # Also learn from this phrase
+                self._learn(phrase)
+            else:
+                self.phrase_index.record_use(phrase)
+            if self.journal is not None:
+                self.journal.record('phrase', phrase)
     
     def get_word_completions(self, partial_word, max_suggestions=3):
         """Get word completion suggestions and return only the missing portion."""
@@ -166,58 +348,113 @@ class WordPredictor:
             return []
         
         partial_word = partial_word.lower()
+        with self.lock:
+            completions = self.completion_memo.get(partial_word, max_suggestions)
+            if completions is None:
+                completions = self._word_completions(partial_word, max_suggestions)
+                self.completion_memo.put(partial_word, max_suggestions, completions)
+            return list(completions)
+    
+    def _word_completions(self, partial_word, max_suggestions):
+        suggestions = self.completion_index.complete(partial_word, max_suggestions)
+        
+        if self.base_model is not None:
+            # In-memory counts override the base model for the words they hold
+            scored = [(self.word_frequencies[word], word) for word in suggestions]
+            scored += self.base_model.complete(
+                partial_word, max_suggestions,
+                skip=lambda word: word == partial_word or word in self.word_frequencies)
+            scored.sort(key=lambda item: (-item[0], item[1]))
+            suggestions = [word for _, word in scored[:max_suggestions]]
+        
+        # Return only the missing part of the word to avoid duplication
+        return [word[len(partial_word):] for word in suggestions]
+    
+    def get_next_word_suggestions(self, current_word, max_suggestions=3, previous_word=None):
+        """
+        Get suggestions for the next word based on the last one or two words
+
+        Backs off from trigram to bigram counts, and fills any remaining
+        slots with the most common words.
+        """
+        current_word = current_word.lower() if current_word else ""
+        previous_word = previous_word.lower() if current_word and previous_word else None
+        group = (previous_word, current_word)
+        with self.lock:
+            suggestions = self.next_word_memo.get(group, max_suggestions)
+            if suggestions is None:
+                suggestions = self._next_words(group, max_suggestions)
+                self.next_word_memo.put(group, max_suggestions, suggestions)
+            return list(suggestions)
+    
+    def _next_words(self, group, max_suggestions):
+        previous_word, current_word = group
         suggestions = []
         
-        for word in self.word_frequencies:
-            if word.startswith(partial_word) and word != partial_word:
-                suggestions.append((word, self.word_frequencies[word]))
+        def take(candidates):
+            for word in candidates:
+                if len(suggestions) >= max_suggestions:
+                    break
+                if word not in suggestions:
+                    suggestions.append(word)
         
-        suggestions.sort(key=lambda x: x[1], reverse=True)
+        if current_word:
+            if previous_word:
+                take(self._continuations((previous_word, current_word), max_suggestions))
+            take(self._continuations((current_word,), max_suggestions))
+        if len(suggestions) < max_suggestions:
+            # Padded results change whenever the most common words do
+            self._common_dependents.add(group)
+            take(self._most_common(max_suggestions))
+        return suggestions
+    
+    def _continuations(self, context, max_results):
+        """Most frequent words after a context, merged with the base model"""
+        words = self.ngrams.continuations(context, max_results)
+        if self.base_model is None:
+            return words
         
-        # Return only the missing part of the word to avoid duplication
-        return [word[len(partial_word):] for word, _ in suggestions[:max_suggestions]]
-    
-    def get_next_word_suggestions(self, current_word, max_suggestions=3):
-        """Get suggestions for the next word based on the current word"""
-        if not current_word:
-            # Return most common words if no current word
-            most_common = self.word_frequencies.most_common(max_suggestions)
-            return [word for word, _ in most_common]
-            
-        current_word = current_word.lower()
+        scored = [(self.ngrams.count(context, word), word) for word in words]
+        taken = 0
+        for count, word in self.base_model.continuations(context):
+            if taken >= max_results:
+                break
+            if not self.ngrams.count(context, word):
+                scored.append((count, word))
+                taken += 1
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [word for _, word in scored[:max_results]]
+    
+    def _most_common(self, max_results):
+        """Most common words, merged with the base model"""
+        # The root of the completion index caches the most common words
+        words = self.completion_index.complete("", max_results, exclude_exact=False)
+        if self.base_model is None:
+            return words
         
-        if current_word in self.next_word_predictions:
-            # If we have specific predictions for this word, return those
-            suggestions = self.next_word_predictions[current_word]
-            return suggestions[:max_suggestions]
-        else:
-            # Otherwise return most common words
-            most_common = self.word_frequencies.most_common(max_suggestions)
-            return [word for word, _ in most_common]
+        scored = [(self.word_frequencies[word], word) for word in words]
+        for frequency, word in self.base_model.most_common(skip=lambda w: w in self.word_frequencies):
+            if len(scored) >= 2 * max_results:
+                break
+            scored.append((frequency, word))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [word for _, word in scored[:max_results]]
     
     def get_phrase_suggestions(self, partial_text, max_suggestions=3):
-        """Get phrase suggestions based on partial text"""
-        if not partial_text:
-            # Return some default phrases if no text
-            return self.phrases[:max_suggestions]
-            
-        partial_text = partial_text.lower()
-        
-        # Find phrases that start with the partial text
-        matching_phrases = []
-        for phrase in self.phrases:
-            if phrase.lower().startswith(partial_text):
-                matching_phrases.append(phrase)
-                
-        # If we don't have enough matches, add phrases that contain the partial text
-        if len(matching_phrases) < max_suggestions:
-            for phrase in self.phrases:
-                if partial_text in phrase.lower() and phrase not in matching_phrases:
-                    matching_phrases.append(phrase)
-                    if len(matching_phrases) >= max_suggestions:
-                        break
-        
-        return matching_phrases[:max_suggestions]
+        """
+        Get phrase suggestions based on partial text
+
+        Phrases starting with the text rank first, then phrases with a word
+        starting with it, then other phrases containing it; each group is
+        ordered by usage. With no text, the most used phrases are returned.
+        """
+        text = partial_text.lower()
+        with self.lock:
+            phrases = self.phrase_memo.get(text, max_suggestions)
+            if phrases is None:
+                phrases = self.phrase_index.search(partial_text, max_suggestions)
+                self.phrase_memo.put(text, max_suggestions, phrases)
+            return list(phrases)
     
     def get_suggestions(self, text, max_suggestions=3):
         """Get combined suggestions based on current text"""
@@ -236,11 +473,32 @@ class WordPredictor:
         # Handle next word suggestions
         next_word_suggestions = []
         if not words or text.endswith(" "):
-            # Suggest based on the last word if text ends with space
+            # Suggest based on the last two words if text ends with space
             last_word = words[-1] if words else ""
-            next_word_suggestions = self.get_next_word_suggestions(last_word, max_suggestions)
+            previous_word = words[-2] if len(words) >= 2 else None
+            next_word_suggestions = self.get_next_word_suggestions(last_word, max_suggestions, previous_word)
         
         # Get phrase suggestions
         phrase_suggestions = self.get_phrase_suggestions(text, max_suggestions)
         
-        return word_completions, next_word_suggestions, phrase_suggestions
\ No newline at end of file
+        return word_completions, next_word_suggestions, phrase_suggestions
+
+
+def write_custom_data(data, filename):
+    """
+    Atomically write model data as JSON
+
+    The data goes to a temporary file that is synced and then renamed over
+    the target, so a crash never leaves a half-written file behind.
+    """
+    temp_filename = filename + '.tmp'
+    try:
+        with open(temp_filename, 'w') as file:
+            json.dump(data, file, separators=(',', ':'))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, filename)
+        return True
+    except Exception as e:
+        print(f"Error saving custom data: {e}")
+        return False
\ No newline at end of file